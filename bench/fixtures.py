@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import random
+import sqlite3
+from pathlib import Path
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Synthetic fixtures for the parser benchmarks. Everything is deterministic for a given seed
+# and written incrementally, so 1 GB HARs do not need 1 GB of memory to generate.
+#
+# Target values sit at the end of each fixture (worst case for the scanners).
+
+HOYOLAB_COOKIES = {"ltuid_v2": "123456789", "ltoken_v2": "v2_BENCHLTOKEN", "cookie_token_v2": "v2_BENCHCOOKIETOKEN"}
+ENDFIELD_HEADERS = {"cred": "BENCHCRED0123456789", "sk-game-role": "3_4722345642_1", "platform": "3", "vname": "1.0.0"}
+LEVELDB_KEY = "APP_CURRENT_ROLE_GAME_ROLE:endfield"
+LEVELDB_VALUE = "4722345642::"
+
+_FILLER_HOSTS = [
+    "https://www.example-cdn.com/static/app.js",
+    "https://api.example.com/v1/feed",
+    "https://sg-public-api.hoyolab.com/community/misc/api/langs",
+    "https://game.skport.com/assets/index.css",
+    "https://fonts.example.org/font.woff2",
+]
+
+
+def parse_size(s: str) -> int:
+    # "1MB", "512KB", "1GB" or plain bytes.
+    t = s.strip().upper()
+    for suffix, mul in (("GB", 1 << 30), ("MB", 1 << 20), ("KB", 1 << 10), ("B", 1)):
+        if t.endswith(suffix):
+            return int(float(t[: -len(suffix)]) * mul)
+    return int(t)
+
+
+def format_size(n: int) -> str:
+    for suffix, mul in (("GB", 1 << 30), ("MB", 1 << 20), ("KB", 1 << 10)):
+        if n >= mul and n % mul == 0:
+            return f"{n // mul}{suffix}"
+    return f"{n}B"
+
+
+def cookie_header(rng: random.Random, n: int = 30, extra: dict[str, str] | None = None) -> str:
+    parts = [f"_c{i}_{rng.randrange(1 << 16):x}={rng.randbytes(12).hex()}" for i in range(n)]
+    parts += [f"{k}={v}" for k, v in (extra or {}).items()]
+    rng.shuffle(parts)
+    return "; ".join(parts)
+
+
+def _headers(rng: random.Random, extra: dict[str, str] | None = None) -> list[dict[str, str]]:
+    hs = [
+        {"name": "Accept", "value": "application/json, text/plain, */*"},
+        {"name": "Accept-Language", "value": "ja,en-US;q=0.9,en;q=0.8"},
+        {"name": "User-Agent", "value": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"},
+        {"name": "sec-ch-ua-platform", "value": '"Windows"'},
+        {"name": "Referer", "value": "https://act.hoyolab.com/"},
+        {"name": "Cookie", "value": cookie_header(rng, 20)},
+    ]
+    hs += [{"name": f"x-bench-{i}", "value": rng.randbytes(8).hex()} for i in range(8)]
+    hs += [{"name": k, "value": v} for k, v in (extra or {}).items()]
+    return hs
+
+
+def _entry(rng: random.Random, url: str, body_len: int, extra_headers: dict[str, str] | None = None) -> dict:
+    # Response bodies dominate real HAR size ("Save all as HAR with content").
+    body = base64.b64encode(rng.randbytes(body_len * 3 // 4)).decode("ascii")
+    return {
+        "startedDateTime": "2026-01-01T00:00:00.000Z",
+        "time": rng.uniform(5, 500),
+        "request": {
+            "method": "GET",
+            "url": url,
+            "httpVersion": "HTTP/2",
+            "headers": _headers(rng, extra_headers),
+            "queryString": [],
+            "cookies": [],
+            "headersSize": -1,
+            "bodySize": 0,
+        },
+        "response": {
+            "status": 200,
+            "statusText": "",
+            "httpVersion": "HTTP/2",
+            "headers": [{"name": "content-type", "value": "application/json"}],
+            "content": {"size": len(body), "mimeType": "application/json", "text": body, "encoding": "base64"},
+            "redirectURL": "",
+        },
+        "cache": {},
+        "timings": {"send": 0, "wait": 1, "receive": 1},
+    }
+
+
+def write_har(path: Path, size: int, *, seed: int = 0, body_len: int = 16 * 1024) -> dict:
+    # Filler entries (including partial HoYoLAB cookies, so the extractor cannot stop early)
+    # until `size` is reached, then the complete HoYoLAB and Endfield requests.
+    rng = random.Random(seed)
+    templates: list[str] = []
+    for i in range(32):
+        url = _FILLER_HOSTS[i % len(_FILLER_HOSTS)] + f"?i={i}"
+        extra = {"Cookie": cookie_header(rng, 10, {"ltuid_v2": "1"})} if "hoyolab" in url else None
+        templates.append(json.dumps(_entry(rng, url, min(body_len, max(256, size // 64)), extra), ensure_ascii=False))
+    tail = [
+        _entry(rng, "https://sg-public-api.hoyolab.com/event/luna/hkrpg/os/sign", 256, {"Cookie": cookie_header(rng, 20, HOYOLAB_COOKIES)}),
+        _entry(rng, "https://zonai.skport.com/web/v1/game/endfield/attendance", 256, ENDFIELD_HEADERS),
+    ]
+    tail_s = ",".join(json.dumps(t, ensure_ascii=False) for t in tail)
+
+    head = '{"log":{"version":"1.2","creator":{"name":"bench","version":"1"},"pages":[],"entries":['
+    end = "]}}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    written = len(head) + len(tail_s) + len(end)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(head)
+        while written < size:
+            s = templates[n % len(templates)]
+            f.write(s)
+            f.write(",")
+            written += len(s) + 1
+            n += 1
+        f.write(tail_s)
+        f.write(end)
+    return {"path": str(path), "bytes": path.stat().st_size, "entries": n + len(tail)}
+
+
+def cookie_headers(count: int, *, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [cookie_header(rng, 30, HOYOLAB_COOKIES if i % 16 == 0 else None) for i in range(count)]
+
+
+def write_leveldb_dir(path: Path, size: int, *, seed: int = 0, file_size: int = 2 << 20) -> dict:
+    # Random .ldb/.log files; the key only appears in the oldest file, which the scanner reads last.
+    rng = random.Random(seed)
+    path.mkdir(parents=True, exist_ok=True)
+    n_files = max(1, -(-size // file_size))
+    chunk = rng.randbytes(min(file_size, 1 << 20))
+    now = 1_700_000_000
+    for i in range(n_files):
+        fp = path / (f"{i:06d}.log" if i == n_files - 1 else f"{i:06d}.ldb")
+        this = min(file_size, size - i * file_size)
+        with open(fp, "wb") as f:
+            left = this
+            if i == 0:
+                rec = b"\x00_https://game.skport.com\x00\x01" + LEVELDB_KEY.encode() + b"\x01" + LEVELDB_VALUE.encode()
+                f.write(rec)
+                left -= len(rec)
+            while left > 0:
+                f.write(chunk[: min(left, len(chunk))])
+                left -= len(chunk)
+        os.utime(fp, (now + i, now + i))
+    return {"path": str(path), "bytes": sum(p.stat().st_size for p in path.iterdir()), "files": n_files}
+
+
+def _gcm_blob(key: bytes, value: str, rng: random.Random) -> bytes:
+    # Windows Chromium v10: "v10" + 12-byte nonce + ciphertext + tag
+    nonce = rng.randbytes(12)
+    return b"v10" + nonce + AESGCM(key).encrypt(nonce, value.encode("utf-8"), None)
+
+
+def _cbc_blob(key: bytes, host: str, value: str) -> bytes:
+    # Linux Chromium v10 (meta version >= 24): AES-128-CBC over SHA256(host) + value
+    p = padding.PKCS7(128).padder()
+    pt = p.update(hashlib.sha256(host.encode()).digest() + value.encode("utf-8")) + p.finalize()
+    enc = Cipher(algorithms.AES(key), modes.CBC(b" " * 16)).encryptor()
+    return b"v10" + enc.update(pt) + enc.finalize()
+
+
+def write_cookies_db(path: Path, rows: int, *, key: bytes, scheme: str, seed: int = 0) -> dict:
+    # Chromium-shaped Cookies DB. scheme: "gcm" (Windows, 32-byte key) or "cbc" (Linux, 16-byte key).
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    con = sqlite3.connect(str(path))
+    try:
+        con.executescript(
+            """
+            CREATE TABLE meta (key TEXT NOT NULL UNIQUE PRIMARY KEY, value TEXT);
+            CREATE TABLE cookies (
+                host_key TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL,
+                path TEXT NOT NULL, expires_utc INTEGER NOT NULL, is_secure INTEGER NOT NULL,
+                is_httponly INTEGER NOT NULL, encrypted_value BLOB DEFAULT ''
+            );
+            """
+        )
+        con.execute("INSERT INTO meta VALUES ('version', '24')")
+
+        def gen():
+            targets = list(HOYOLAB_COOKIES.items())
+            for i in range(rows):
+                if i >= rows - len(targets):
+                    host, (name, value) = ".hoyolab.com", targets[rows - 1 - i]
+                else:
+                    host = f".site{i % 997}.example.com"
+                    name, value = f"c{i}", rng.randbytes(rng.randrange(8, 96)).hex()
+                blob = _gcm_blob(key, value, rng) if scheme == "gcm" else _cbc_blob(key, host, value)
+                yield host, name, "", "/", 0, 1, 1, blob
+
+        con.executemany("INSERT INTO cookies VALUES (?, ?, ?, ?, ?, ?, ?, ?)", gen())
+        con.commit()
+    finally:
+        con.close()
+    return {"path": str(path), "bytes": path.stat().st_size, "rows": rows}
+
+
+def read_encrypted_values(path: Path) -> list[tuple[str, bytes]]:
+    con = sqlite3.connect(str(path))
+    try:
+        return con.execute("SELECT host_key, encrypted_value FROM cookies").fetchall()
+    finally:
+        con.close()
@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fixtures  # noqa: E402
+
+# Micro-benchmarks for the local (non-network) parsers.
+#
+# Each case runs in a fresh child process; its memory is the peak RSS increase over the RSS after
+# the case's setup. Fixtures are generated once into --work-dir and reused. Results are JSON; --baseline compares against a previous run.
+#
+#   python bench/run_bench.py --har-sizes 1MB,64MB,1GB --out bench-results.json
+#   python bench/run_bench.py --baseline bench-baseline.json
+
+DEFAULT_HAR_SIZES = "1MB,16MB,128MB"
+DEFAULT_LEVELDB_SIZES = "4MB,64MB"
+DEFAULT_COOKIE_ROWS = "1000,50000"
+DEFAULT_COOKIE_HEADERS = "10000,100000"
+DEFAULT_THRESHOLD = 0.15
+# Timing / memory differences below these are noise for the tiny cases.
+MIN_DELTA_S = 0.002
+MIN_DELTA_MB = 1.0
+
+# Fixed keys: the fixtures are synthetic, nothing secret is involved.
+GCM_KEY = bytes(range(32))
+
+
+class BenchSkipped(Exception):
+    pass
+
+
+def _proc_status_bytes(name: str) -> Optional[int]:
+    # Linux: VmRSS (current) / VmHWM (peak) from /proc/self/status.
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(name + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    hwm = _proc_status_bytes("VmHWM")
+    if hwm is not None:
+        return hwm
+    try:
+        import resource
+    except ImportError:
+        c = _win_memory_counters()
+        return int(c.PeakWorkingSetSize) if c is not None else None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, KiB elsewhere.
+    return r if sys.platform == "darwin" else r * 1024
+
+
+def current_rss_bytes() -> Optional[int]:
+    rss = _proc_status_bytes("VmRSS")
+    if rss is not None:
+        return rss
+    c = _win_memory_counters()
+    return int(c.WorkingSetSize) if c is not None else None
+
+
+def reset_peak_rss() -> bool:
+    # Linux only: writing 5 to clear_refs resets VmHWM to the current RSS. Elsewhere the peak
+    # cannot be reset and still includes the fixture setup.
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _win_memory_counters():
+    if sys.platform != "win32":
+        return None
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        k32.GetCurrentProcess.restype = wintypes.HANDLE
+        k32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        c = PROCESS_MEMORY_COUNTERS()
+        c.cb = ctypes.sizeof(c)
+        if not k32.K32GetProcessMemoryInfo(k32.GetCurrentProcess(), ctypes.byref(c), c.cb):
+            return None
+        return c
+    except Exception:
+        return None
+
+
+# ---- cases ----------------------------------------------------------------------------------
+# A case is setup(work_dir, scale) -> (fn, bytes, items). Only fn() is timed.
+
+
+def _har_fixture(work_dir: Path, size: int) -> Path:
+    p = work_dir / f"har-{fixtures.format_size(size)}.har"
+    if not p.exists():
+        fixtures.write_har(p, size)
+    return p
+
+
+def _slim_har(work_dir: Path, size: int) -> tuple[dict, int, int]:
+    from har_stream import load_har_requests
+
+    p = _har_fixture(work_dir, size)
+    har = load_har_requests(p)
+    return har, p.stat().st_size, len(har["log"]["entries"])
+
+
+def case_load_har_requests(work_dir: Path, size: int):
+    from har_stream import load_har_requests
+
+    p = _har_fixture(work_dir, size)
+    return (lambda: load_har_requests(p)), p.stat().st_size, None
+
+
+def case_load_har_requests_full(work_dir: Path, size: int):
+    # Streaming parse of every entry (what the prefilter falls back to).
+    from har_stream import load_har_requests
+
+    p = _har_fixture(work_dir, size)
+    return (lambda: load_har_requests(p, prefilter=False)), p.stat().st_size, None
+
+
+def case_extract_hoyolab_tokens_from_har(work_dir: Path, size: int):
+    from cookiegrab import extract_hoyolab_tokens_from_har
+
+    har, nbytes, n = _slim_har(work_dir, size)
+
+    def fn():
+        v = extract_hoyolab_tokens_from_har(har)
+        assert v["LTOKEN"] == fixtures.HOYOLAB_COOKIES["ltoken_v2"], v
+
+    return fn, nbytes, n
+
+
+def case_extract_endfield_headers_from_har(work_dir: Path, size: int):
+    from endfieldgrab_har import extract_endfield_headers_from_har
+
+    har, nbytes, n = _slim_har(work_dir, size)
+
+    def fn():
+        v = extract_endfield_headers_from_har(har)
+        assert v.get("ENDFIELD_CRED") == fixtures.ENDFIELD_HEADERS["cred"], v
+
+    return fn, nbytes, n
+
+
+def case_iter_har_request_headers(work_dir: Path, size: int):
+    from endfieldgrab_har import _iter_har_request_headers
+
+    har, nbytes, n = _slim_har(work_dir, size)
+    return (lambda: _iter_har_request_headers(har)), nbytes, n
+
+
+def case_parse_cookie_header(work_dir: Path, count: int):
+    from cookiegrab import _parse_cookie_header
+
+    headers = fixtures.cookie_headers(count)
+
+    def fn():
+        for h in headers:
+            _parse_cookie_header(h)
+
+    return fn, sum(len(h) for h in headers), count
+
+
+def case_scan_leveldb_dir_for_key(work_dir: Path, size: int):
+    from browser_profile_common import _scan_leveldb_dir_for_key
+
+    d = work_dir / f"leveldb-{fixtures.format_size(size)}"
+    if not d.exists():
+        fixtures.write_leveldb_dir(d, size)
+    nbytes = sum(p.stat().st_size for p in d.iterdir())
+
+    def fn():
+        v = _scan_leveldb_dir_for_key(d, fixtures.LEVELDB_KEY)
+        assert v == fixtures.LEVELDB_VALUE, v
+
+    return fn, nbytes, None
+
+
+def case_scan_leveldb_dir_indexed(work_dir: Path, size: int):
+    # Warm index: measures a repeat grab on an unchanged profile.
+    from browser_profile_common import scan_leveldb_dir_indexed
+
+    d = work_dir / f"leveldb-{fixtures.format_size(size)}"
+    if not d.exists():
+        fixtures.write_leveldb_dir(d, size)
+    nbytes = sum(p.stat().st_size for p in d.iterdir())
+    os.environ["COOKIEGRAB_CACHE_DIR"] = str(work_dir / "cookiegrab-cache")
+    scan_leveldb_dir_indexed(d, [fixtures.LEVELDB_KEY])
+
+    def fn():
+        v = scan_leveldb_dir_indexed(d, [fixtures.LEVELDB_KEY])[fixtures.LEVELDB_KEY]
+        assert v == fixtures.LEVELDB_VALUE, v
+
+    return fn, nbytes, None
+
+
+def case_decrypt_chromium_cookie(work_dir: Path, rows: int):
+    try:
+        from browser_cookies_windows import _decrypt_chromium_cookie
+    except (ImportError, AttributeError, OSError) as e:
+        # The module binds DPAPI at import time.
+        raise BenchSkipped(f"browser_cookies_windows not importable here ({e})")
+
+    p = work_dir / f"cookies-gcm-{rows}.sqlite"
+    if not p.exists():
+        fixtures.write_cookies_db(p, rows, key=GCM_KEY, scheme="gcm")
+    blobs = [ev for _h, ev in fixtures.read_encrypted_values(p)]
+
+    def fn():
+        for ev in blobs:
+            _decrypt_chromium_cookie(ev, GCM_KEY)
+
+    return fn, sum(len(b) for b in blobs), rows
+
+
+def case_decrypt_linux_cookie(work_dir: Path, rows: int):
+    from browser_cookies_linux import LinuxCookieKeys, _decrypt_linux_cookie
+
+    keys = LinuxCookieKeys.from_password(None)
+    p = work_dir / f"cookies-cbc-{rows}.sqlite"
+    if not p.exists():
+        fixtures.write_cookies_db(p, rows, key=keys.v10, scheme="cbc")
+    blobs = fixtures.read_encrypted_values(p)
+
+    def fn():
+        for host, ev in blobs:
+            _decrypt_linux_cookie(ev, keys, True, host)
+
+    return fn, sum(len(b) for _h, b in blobs), rows
+
+
+# name -> (setup, scale option)
+CASES: dict[str, tuple[Callable, str]] = {
+    "load_har_requests": (case_load_har_requests, "har_sizes"),
+    "load_har_requests_full": (case_load_har_requests_full, "har_sizes"),
+    "extract_hoyolab_tokens_from_har": (case_extract_hoyolab_tokens_from_har, "har_sizes"),
+    "extract_endfield_headers_from_har": (case_extract_endfield_headers_from_har, "har_sizes"),
+    "_iter_har_request_headers": (case_iter_har_request_headers, "har_sizes"),
+    "_parse_cookie_header": (case_parse_cookie_header, "cookie_headers"),
+    "_scan_leveldb_dir_for_key": (case_scan_leveldb_dir_for_key, "leveldb_sizes"),
+    "scan_leveldb_dir_indexed": (case_scan_leveldb_dir_indexed, "leveldb_sizes"),
+    "_decrypt_chromium_cookie": (case_decrypt_chromium_cookie, "cookie_rows"),
+    "_decrypt_linux_cookie": (case_decrypt_linux_cookie, "cookie_rows"),
+}
+
+
+def _run_child(name: str, scale: int, work_dir: Path, repeat: int) -> dict:
+    setup, _opt = CASES[name]
+    res: dict = {"bench": name, "scale": scale}
+    try:
+        fn, nbytes, items = setup(work_dir, scale)
+    except BenchSkipped as e:
+        res["skipped"] = str(e)
+        return res
+    # Memory is reported as the peak increase over the RSS after setup, so fixture loading (e.g.
+    # the slim HAR passed to the extract_* cases) is not counted.
+    gc.collect()
+    setup_peak = peak_rss_bytes()
+    base = current_rss_bytes()
+    reset = reset_peak_rss()
+    times = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    peak = peak_rss_bytes()
+    best = min(times)
+    res.update({"seconds": best, "runs": len(times), "bytes": nbytes, "items": items})
+    if nbytes:
+        res["mb_per_s"] = nbytes / (1 << 20) / best if best > 0 else None
+    if items:
+        res["items_per_s"] = items / best if best > 0 else None
+    res["setup_rss_mb"] = base / (1 << 20) if base is not None else None
+    # Without a reset, a peak no higher than the setup's says nothing about fn(): unknown.
+    known = base is not None and peak is not None and (reset or setup_peak is None or peak > setup_peak)
+    res["peak_rss_delta_mb"] = max(0, peak - base) / (1 << 20) if known else None
+    return res
+
+
+def run_case(name: str, scale: int, work_dir: Path, repeat: int) -> dict:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", name, str(scale), "--work-dir", str(work_dir), "--repeat", str(repeat)]
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    if p.returncode != 0:
+        return {"bench": name, "scale": scale, "error": (p.stderr.strip().splitlines() or ["(no output)"])[-1]}
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+
+def _key(r: dict) -> str:
+    return f'{r["bench"]}@{r["scale"]}'
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    # Regression = slower or larger peak RSS than the baseline by more than `threshold`.
+    base = {_key(r): r for r in baseline if "seconds" in r}
+    out = []
+    for r in results:
+        b = base.get(_key(r))
+        if not b or "seconds" not in r:
+            continue
+        if r["seconds"] > b["seconds"] * (1 + threshold) and r["seconds"] - b["seconds"] > MIN_DELTA_S:
+            out.append(f'{_key(r)}: time {b["seconds"]:.4f}s -> {r["seconds"]:.4f}s ({r["seconds"] / b["seconds"] - 1:+.0%})')
+        rb, rr = b.get("peak_rss_delta_mb"), r.get("peak_rss_delta_mb")
+        if rb is not None and rr is not None and rr > rb * (1 + threshold) and rr - rb > MIN_DELTA_MB:
+            out.append(f"{_key(r)}: peak RSS increase {rb:.0f} MB -> {rr:.0f} MB ({rr / max(rb, MIN_DELTA_MB) - 1:+.0%})")
+    return out
+
+
+def _fmt_scale(opt: str, scale: int) -> str:
+    return fixtures.format_size(scale) if opt.endswith("sizes") else str(scale)
+
+
+def _print_row(r: dict, opt: str) -> None:
+    label = f'{r["bench"]} [{_fmt_scale(opt, r["scale"])}]'
+    if "skipped" in r:
+        print(f"{label:<52} skipped: {r['skipped']}")
+    elif "error" in r:
+        print(f"{label:<52} ERROR: {r['error']}")
+    else:
+        tput = f'{r["mb_per_s"]:9.1f} MB/s' if r.get("mb_per_s") else " " * 14
+        items = f'{r["items_per_s"]:12.0f} items/s' if r.get("items_per_s") else ""
+        rss = f'{r["peak_rss_delta_mb"]:+7.0f} MB RSS' if r.get("peak_rss_delta_mb") is not None else ""
+        print(f'{label:<52} {r["seconds"]:9.4f}s {tput} {rss} {items}')
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the HAR / LevelDB / cookie parsers on synthetic fixtures.")
+    ap.add_argument("--work-dir", default=str(BENCH_DIR.parent / ".bench"), help="Fixture directory (reused between runs).")
+    ap.add_argument("--har-sizes", default=DEFAULT_HAR_SIZES, help=f"HAR fixture sizes (default: {DEFAULT_HAR_SIZES}; up to 1GB).")
+    ap.add_argument("--leveldb-sizes", default=DEFAULT_LEVELDB_SIZES, help=f"LevelDB directory sizes (default: {DEFAULT_LEVELDB_SIZES}).")
+    ap.add_argument("--cookie-rows", default=DEFAULT_COOKIE_ROWS, help=f"Cookies DB row counts (default: {DEFAULT_COOKIE_ROWS}).")
+    ap.add_argument("--cookie-headers", default=DEFAULT_COOKIE_HEADERS, help=f"Cookie header counts (default: {DEFAULT_COOKIE_HEADERS}).")
+    ap.add_argument("--only", action="append", default=None, help="Run only this benchmark (repeatable).")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best is reported.")
+    ap.add_argument("--out", default=None, help="Write results JSON here.")
+    ap.add_argument("--baseline", default=None, help="Compare against this results JSON.")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown / RSS growth vs baseline (0.15 = 15%%).")
+    ap.add_argument("--child", nargs=2, metavar=("NAME", "SCALE"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    work_dir = Path(args.work_dir).expanduser()
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.child:
+        print(json.dumps(_run_child(args.child[0], int(args.child[1]), work_dir, args.repeat)))
+        return 0
+
+    names = args.only or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        print(f"ERROR: unknown benchmark(s): {', '.join(unknown)} (known: {', '.join(CASES)})")
+        return 2
+
+    results: list[dict] = []
+    for name in names:
+        opt = CASES[name][1]
+        raw = getattr(args, opt)
+        scales = [fixtures.parse_size(s) if opt.endswith("sizes") else int(s) for s in raw.split(",") if s.strip()]
+        for scale in scales:
+            r = run_case(name, scale, work_dir, args.repeat)
+            _print_row(r, opt)
+            results.append(r)
+
+    doc = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(doc, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"wrote {args.out}")
+
+    failed = any("error" in r for r in results)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")).get("results") or []
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\nvs baseline {args.baseline} (threshold {args.threshold:.0%}):")
+        for line in regressions:
+            print(f"- REGRESSION {line}")
+        if not regressions:
+            print("(no regressions)")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
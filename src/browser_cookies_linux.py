@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import quote
+
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from browser_profile_common import BrowserProfile, _cookie_db_path, read_endfield_roles_from_profile
+from cookie_jar import DEFAULT_DOMAINS, Cookie, decrypt_rows, select_cookie_rows
+
+# Linux counterpart of browser_cookies_windows for copied/archived Chromium profile directories.
+#
+# Linux Chromium encrypts cookies with AES-128-CBC:
+# - v10: key = PBKDF2-SHA1("peanuts", "saltysalt", 1 iteration)
+# - v11: same derivation, password taken from the desktop keyring (supply it with --v11-password)
+# Cookies DB schema version >= 24 prefixes the plaintext with SHA256(host_key).
+
+V10_PASSWORD = b"peanuts"
+_SALT = b"saltysalt"
+_IV = b" " * 16
+_HOST_HASH_DB_VERSION = 24
+
+
+def derive_linux_key(password: bytes) -> bytes:
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA1(), length=16, salt=_SALT, iterations=1)
+    return kdf.derive(password)
+
+
+@dataclass(frozen=True)
+class LinuxCookieKeys:
+    v10: bytes
+    v11: tuple[bytes, ...]
+
+    @classmethod
+    def from_password(cls, v11_password: Optional[str] = None) -> "LinuxCookieKeys":
+        v10 = derive_linux_key(V10_PASSWORD)
+        # Without a keyring secret Chromium falls back to "peanuts" or an empty password.
+        cands = [v11_password.encode("utf-8")] if v11_password else []
+        cands += [V10_PASSWORD, b""]
+        return cls(v10=v10, v11=tuple(derive_linux_key(p) for p in cands))
+
+
+def _aes_cbc_decrypt(ct: bytes, key: bytes) -> Optional[bytes]:
+    if not ct or len(ct) % 16:
+        return None
+    dec = Cipher(algorithms.AES(key), modes.CBC(_IV)).decryptor()
+    padded = dec.update(ct) + dec.finalize()
+    unpadder = padding.PKCS7(128).unpadder()
+    try:
+        return unpadder.update(padded) + unpadder.finalize()
+    except ValueError:
+        # Wrong key: padding check fails.
+        return None
+
+
+def _plaintext_value(pt: bytes, host: str, expect_host_hash: bool) -> Optional[str]:
+    # PKCS7 padding alone passes for about 1 in 256 wrong keys; a wrong key also has to produce
+    # the host hash prefix (required when the DB version says it is there) and a printable
+    # UTF-8 value before it is accepted.
+    if host and len(pt) >= 32 and pt[:32] == hashlib.sha256(host.encode("utf-8")).digest():
+        pt = pt[32:]
+    elif expect_host_hash:
+        return None
+    try:
+        value = pt.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    if any(ord(ch) < 0x20 or ord(ch) == 0x7F for ch in value):
+        return None
+    return value
+
+
+def _decrypt_candidates(ev: bytes, keys: LinuxCookieKeys, host: str, expect_host_hash: bool) -> Optional[str]:
+    if ev.startswith(b"v10"):
+        candidates: tuple[bytes, ...] = (keys.v10,)
+    elif ev.startswith(b"v11"):
+        candidates = keys.v11
+    else:
+        return None
+    for key in candidates:
+        pt = _aes_cbc_decrypt(ev[3:], key)
+        if pt is None:
+            continue
+        value = _plaintext_value(pt, host, expect_host_hash)
+        if value is not None:
+            return value
+    return None
+
+
+def _decrypt_linux_cookie(encrypted_value: bytes, keys: LinuxCookieKeys, strip_host_hash: bool, host: str = "") -> str:
+    if not encrypted_value:
+        return ""
+    return _decrypt_candidates(encrypted_value, keys, host, strip_host_hash) or ""
+
+
+def _connect_readonly(db: Path) -> sqlite3.Connection:
+    # Profiles are copies, not live browsers: open in place instead of copying to temp.
+    return sqlite3.connect(f"file:{quote(str(db))}?mode=ro&immutable=1", uri=True)
+
+
+def _has_host_hash(con: sqlite3.Connection) -> bool:
+    try:
+        row = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        db_version = int(row[0]) if row else 0
+    except (sqlite3.Error, ValueError):
+        db_version = 0
+    return db_version >= _HOST_HASH_DB_VERSION
+
+
+def read_cookie_values_from_profile(
+    profile: BrowserProfile,
+    *,
+    host_like: str,
+    names: list[str],
+    keys: Optional[LinuxCookieKeys] = None,
+) -> dict[str, str]:
+    keys = keys or LinuxCookieKeys.from_password(os.getenv("CHROMIUM_V11_PASSWORD"))
+    cookies_db = _cookie_db_path(profile.profile_path)
+    if not cookies_db:
+        raise FileNotFoundError(f"Cookies DB not found under: {profile.profile_path}")
+
+    placeholders = ",".join(["?"] * len(names))
+    con = _connect_readonly(cookies_db)
+    try:
+        strip = _has_host_hash(con)
+        cur = con.cursor()
+        cur.execute(
+            f"""
+            SELECT host_key, name, value, encrypted_value
+            FROM cookies
+            WHERE host_key LIKE ?
+              AND name IN ({placeholders})
+            """,
+            [host_like, *names],
+        )
+        rows = cur.fetchall()
+    finally:
+        con.close()
+
+    out: dict[str, str] = {n: "" for n in names}
+    for host, name, value, ev in rows:
+        if name in out:
+            out[name] = value or _decrypt_linux_cookie(ev, keys, strip, host)
+    return out
+
+
+def _linux_batch_decrypt(keys: LinuxCookieKeys, expect_host_hash: bool):
+    def run(items: list[tuple[str, bytes]]) -> list[Optional[str]]:
+        return [_decrypt_candidates(ev, keys, host, expect_host_hash) for host, ev in items]
+
+    return run
+
+
+def export_cookies_from_profile(
+    profile: BrowserProfile,
+    *,
+    domains: Optional[list[str]] = DEFAULT_DOMAINS,
+    keys: Optional[LinuxCookieKeys] = None,
+    workers: Optional[int] = None,
+) -> tuple[list[Cookie], int]:
+    keys = keys or LinuxCookieKeys.from_password(os.getenv("CHROMIUM_V11_PASSWORD"))
+    cookies_db = _cookie_db_path(profile.profile_path)
+    if not cookies_db:
+        raise FileNotFoundError(f"Cookies DB not found under: {profile.profile_path}")
+    con = _connect_readonly(cookies_db)
+    try:
+        expect_host_hash = _has_host_hash(con)
+        rows = select_cookie_rows(con, domains)
+    finally:
+        con.close()
+    return decrypt_rows(rows, _linux_batch_decrypt(keys, expect_host_hash), workers=workers)
+
+
+def read_hoyolab_tokens_from_profile(profile: BrowserProfile, keys: Optional[LinuxCookieKeys] = None) -> dict[str, str]:
+    m = read_cookie_values_from_profile(
+        profile,
+        host_like="%hoyolab.com%",
+        names=["ltuid_v2", "ltoken_v2", "cookie_token_v2"],
+        keys=keys,
+    )
+    return {
+        "LTUID": m.get("ltuid_v2", ""),
+        "LTOKEN": m.get("ltoken_v2", ""),
+        "COOKIE_TOKEN_V2": m.get("cookie_token_v2", ""),
+    }
+
+
+def read_endfield_cred_from_profile(profile: BrowserProfile, keys: Optional[LinuxCookieKeys] = None) -> dict[str, str]:
+    m = read_cookie_values_from_profile(profile, host_like="%skport.com%", names=["SK_OAUTH_CRED_KEY"], keys=keys)
+    return {"ENDFIELD_CRED": m.get("SK_OAUTH_CRED_KEY", "")}
+
+
+def find_profiles(root: Path) -> list[BrowserProfile]:
+    # A profile is any directory holding a Cookies DB (or Network/Cookies); we do not descend into it.
+    out: list[BrowserProfile] = []
+    for dirpath, dirnames, _filenames in os.walk(root):
+        d = Path(dirpath)
+        if d.name != "Network" and _cookie_db_path(d):
+            out.append(BrowserProfile("chromium", d.parent, d.name))
+            dirnames[:] = []
+            continue
+        dirnames.sort()
+    return out
+
+
+def read_profile(profile: BrowserProfile, keys: LinuxCookieKeys) -> dict:
+    res: dict = {"profile": str(profile.profile_path)}
+    try:
+        res["hoyolab"] = read_hoyolab_tokens_from_profile(profile, keys)
+        endfield = read_endfield_cred_from_profile(profile, keys)
+        endfield.update(read_endfield_roles_from_profile(profile))
+        res["endfield"] = endfield
+    except Exception as e:
+        res["error"] = str(e)
+    return res
+
+
+def scan_profile_tree(roots: list[Path], *, keys: LinuxCookieKeys, workers: int = 8) -> Iterator[dict]:
+    # sqlite3 and AES (cryptography) release the GIL, so threads scale across profiles.
+    profiles = [p for r in roots for p in find_profiles(r)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = [ex.submit(read_profile, p, keys) for p in profiles]
+        for fut in as_completed(futs):
+            yield fut.result()
+
+
+def _mask(v: str) -> str:
+    if not v:
+        return "(empty)"
+    if len(v) <= 8:
+        return "*" * len(v)
+    return f"{v[:4]}...{v[-4:]}"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description="Extract HoYoLAB cookies and Endfield cred/roles from copied Linux Chromium profile directories."
+    )
+    ap.add_argument("roots", nargs="+", help="Directories to scan for Chromium profiles (searched recursively).")
+    ap.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4))
+    ap.add_argument("--v11-password", default=os.getenv("CHROMIUM_V11_PASSWORD"), help="Keyring password for v11 cookies.")
+    ap.add_argument("--out", default=None, help="Write JSONL results to this file (default: stdout).")
+    ap.add_argument("--raw", action="store_true", help="Output raw values instead of masked ones.")
+    args = ap.parse_args()
+
+    keys = LinuxCookieKeys.from_password(args.v11_password)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    n = failed = 0
+    try:
+        for res in scan_profile_tree([Path(r).expanduser() for r in args.roots], keys=keys, workers=args.workers):
+            n += 1
+            if "error" in res:
+                failed += 1
+            if not args.raw:
+                for section in ("hoyolab", "endfield"):
+                    if section in res:
+                        res[section] = {k: _mask(v) for k, v in res[section].items()}
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"profiles: {n}, failed: {failed}", file=sys.stderr)
+    return 0 if n and not failed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
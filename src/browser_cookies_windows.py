@@ -3,31 +3,28 @@ from __future__ import annotations
 import base64
 import json
 import os
-import re
 import shutil
 import sqlite3
 import subprocess
 import tempfile
 import time
-from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 import ctypes
 from ctypes import wintypes
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-
-@dataclass(frozen=True)
-class BrowserProfile:
-    name: str
-    user_data_dir: Path
-    profile_dir: str
-
-    @property
-    def profile_path(self) -> Path:
-        return self.user_data_dir / self.profile_dir
+from browser_profile_common import (
+    BrowserProfile,
+    _cookie_db_path,
+    _list_profile_dirs,
+    _local_storage_leveldb_dir,
+    _scan_leveldb_dir_for_key,
+    read_endfield_roles_from_profile,
+)
+from cookie_jar import DEFAULT_DOMAINS, Cookie, decrypt_rows, select_cookie_rows, strip_host_hash
 
 
 class _DATA_BLOB(ctypes.Structure):
@@ -53,6 +50,65 @@ LocalFree = kernel32.LocalFree
 LocalFree.argtypes = [ctypes.c_void_p]
 LocalFree.restype = ctypes.c_void_p
 
+# Process / file-lock waiting (used by --kill-browser and the cookie DB snapshot).
+SYNCHRONIZE = 0x00100000
+TH32CS_SNAPPROCESS = 0x00000002
+MAXIMUM_WAIT_OBJECTS = 64
+WAIT_TIMEOUT = 0x00000102
+WAIT_FAILED = 0xFFFFFFFF
+GENERIC_READ = 0x80000000
+FILE_SHARE_READ = 0x00000001
+OPEN_EXISTING = 3
+ERROR_SHARING_VIOLATION = 32
+ERROR_LOCK_VIOLATION = 33
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+
+class _PROCESSENTRY32W(ctypes.Structure):
+    _fields_ = [
+        ("dwSize", wintypes.DWORD),
+        ("cntUsage", wintypes.DWORD),
+        ("th32ProcessID", wintypes.DWORD),
+        ("th32DefaultHeapID", ctypes.c_size_t),
+        ("th32ModuleID", wintypes.DWORD),
+        ("cntThreads", wintypes.DWORD),
+        ("th32ParentProcessID", wintypes.DWORD),
+        ("pcPriClassBase", ctypes.c_long),
+        ("dwFlags", wintypes.DWORD),
+        ("szExeFile", ctypes.c_wchar * 260),
+    ]
+
+
+CreateToolhelp32Snapshot = kernel32.CreateToolhelp32Snapshot
+CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+Process32FirstW = kernel32.Process32FirstW
+Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(_PROCESSENTRY32W)]
+Process32FirstW.restype = wintypes.BOOL
+Process32NextW = kernel32.Process32NextW
+Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(_PROCESSENTRY32W)]
+Process32NextW.restype = wintypes.BOOL
+OpenProcess = kernel32.OpenProcess
+OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+OpenProcess.restype = wintypes.HANDLE
+WaitForMultipleObjects = kernel32.WaitForMultipleObjects
+WaitForMultipleObjects.argtypes = [wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE), wintypes.BOOL, wintypes.DWORD]
+WaitForMultipleObjects.restype = wintypes.DWORD
+CreateFileW = kernel32.CreateFileW
+CreateFileW.argtypes = [
+    wintypes.LPCWSTR,
+    wintypes.DWORD,
+    wintypes.DWORD,
+    ctypes.c_void_p,
+    wintypes.DWORD,
+    wintypes.DWORD,
+    wintypes.HANDLE,
+]
+CreateFileW.restype = wintypes.HANDLE
+CloseHandle = kernel32.CloseHandle
+CloseHandle.argtypes = [wintypes.HANDLE]
+CloseHandle.restype = wintypes.BOOL
+
 
 def _dpapi_decrypt(encrypted: bytes) -> bytes:
     in_blob = _DATA_BLOB(cbData=len(encrypted), pbData=ctypes.cast(ctypes.create_string_buffer(encrypted), ctypes.POINTER(ctypes.c_byte)))
@@ -104,22 +160,85 @@ def _decrypt_chromium_cookie(encrypted_value: bytes, aes_key: bytes) -> str:
         return ""
 
 
-def _copy_sqlite(src: Path, retries: int = 8, base_delay_s: float = 0.15) -> Path:
+def _process_ids(image: str) -> list[int]:
+    # PIDs of every running process with this image name (e.g. "chrome.exe").
+    snap = CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if not snap or snap == INVALID_HANDLE_VALUE:
+        return []
+    out: list[int] = []
+    try:
+        e = _PROCESSENTRY32W()
+        e.dwSize = ctypes.sizeof(_PROCESSENTRY32W)
+        ok = Process32FirstW(snap, ctypes.byref(e))
+        while ok:
+            if e.szExeFile.lower() == image.lower():
+                out.append(int(e.th32ProcessID))
+            ok = Process32NextW(snap, ctypes.byref(e))
+    finally:
+        CloseHandle(snap)
+    return out
+
+
+def _wait_processes_exit(pids: list[int], timeout_s: float) -> bool:
+    # Blocks on the process handles themselves (no polling); True once all of them have exited.
+    handles = [h for h in (OpenProcess(SYNCHRONIZE, False, pid) for pid in pids) if h]
+    deadline = time.monotonic() + timeout_s
+    try:
+        for i in range(0, len(handles), MAXIMUM_WAIT_OBJECTS):
+            chunk = handles[i : i + MAXIMUM_WAIT_OBJECTS]
+            arr = (wintypes.HANDLE * len(chunk))(*chunk)
+            ms = max(0, int((deadline - time.monotonic()) * 1000))
+            r = WaitForMultipleObjects(len(chunk), arr, True, ms)
+            if r in (WAIT_TIMEOUT, WAIT_FAILED):
+                return False
+        return True
+    finally:
+        for h in handles:
+            CloseHandle(h)
+
+
+def _file_shareable(path: Path) -> bool:
+    # Can we open the file while allowing others to read it? Fails with a sharing violation while
+    # the browser still holds its exclusive handle on the cookie DB.
+    h = CreateFileW(str(path), GENERIC_READ, FILE_SHARE_READ, None, OPEN_EXISTING, 0, None)
+    if h and h != INVALID_HANDLE_VALUE:
+        CloseHandle(h)
+        return True
+    return ctypes.get_last_error() not in (ERROR_SHARING_VIOLATION, ERROR_LOCK_VIOLATION)
+
+
+def _wait_file_shareable(path: Path, timeout_s: float) -> bool:
+    deadline = time.monotonic() + timeout_s
+    delay = 0.01
+    while True:
+        if _file_shareable(path):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.2)
+
+
+def _copy_sqlite(src: Path, timeout_s: float = 5.0) -> Path:
     # Copy to temp so we can read even if the browser is running/locking the DB.
-    # If the profile is locked hard, this may still fail; callers should surface a helpful message.
+    # Waits (up to timeout_s) for the lock to clear and copies as soon as it does; if the profile
+    # stays locked, callers should surface a helpful message.
     td = Path(tempfile.mkdtemp(prefix="cookie_db_"))
     dst = td / "Cookies"
+    deadline = time.monotonic() + timeout_s
     try:
-        last_exc: Exception | None = None
-        for i in range(max(1, retries)):
+        while True:
             try:
                 shutil.copy2(src, dst)
                 return dst
-            except Exception as e:
-                last_exc = e
-                # Windows sharing violation often clears quickly after the browser closes.
-                time.sleep(base_delay_s * (i + 1))
-        raise last_exc or RuntimeError("copy failed")
+            except OSError as e:
+                # Only a lock is worth waiting for; anything else fails right away.
+                if getattr(e, "winerror", None) not in (ERROR_SHARING_VIOLATION, ERROR_LOCK_VIOLATION):
+                    raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not _wait_file_shareable(src, remaining):
+                    raise
     except Exception:
         try:
             shutil.rmtree(td, ignore_errors=True)
@@ -128,27 +247,6 @@ def _copy_sqlite(src: Path, retries: int = 8, base_delay_s: float = 0.15) -> Pat
         raise
 
 
-def _list_profile_dirs(user_data_dir: Path) -> list[str]:
-    out: list[str] = []
-    default = user_data_dir / "Default"
-    if default.exists():
-        out.append("Default")
-    for p in sorted(user_data_dir.glob("Profile *")):
-        if p.is_dir():
-            out.append(p.name)
-    return out
-
-
-def _cookie_db_path(profile_path: Path) -> Optional[Path]:
-    p1 = profile_path / "Network" / "Cookies"
-    if p1.exists():
-        return p1
-    p2 = profile_path / "Cookies"
-    if p2.exists():
-        return p2
-    return None
-
-
 def list_available_profiles(browser: str) -> list[BrowserProfile]:
     lad = Path(os.environ.get("LOCALAPPDATA", ""))
     if not lad.exists():
@@ -222,6 +320,58 @@ def read_cookie_values_from_profile(profile: BrowserProfile, *, host_like: str,
     return out
 
 
+def _chromium_batch_decryptor(aes_key: bytes) -> Callable[[list[tuple[str, bytes]]], list[Optional[str]]]:
+    gcm = AESGCM(aes_key)
+
+    def run(items: list[tuple[str, bytes]]) -> list[Optional[str]]:
+        out: list[Optional[str]] = []
+        for host, ev in items:
+            try:
+                if ev.startswith(b"v10") or ev.startswith(b"v11"):
+                    pt = gcm.decrypt(ev[3:15], ev[15:], None)
+                elif ev.startswith(b"v20"):
+                    # app-bound: not decryptable offline (see _decrypt_chromium_cookie)
+                    out.append(None)
+                    continue
+                else:
+                    pt = _dpapi_decrypt(ev)
+            except Exception:
+                out.append(None)
+                continue
+            out.append(strip_host_hash(pt, host).decode("utf-8", errors="replace"))
+        return out
+
+    return run
+
+
+def export_cookies_from_profile(
+    profile: BrowserProfile, *, domains: Optional[list[str]] = DEFAULT_DOMAINS, workers: Optional[int] = None
+) -> tuple[list[Cookie], int]:
+    # All cookies for `domains` (None = every domain). Returns (cookies, undecryptable count).
+    aes_key = _get_chromium_key(profile.user_data_dir)
+    cookies_db = _cookie_db_path(profile.profile_path)
+    if not cookies_db:
+        raise FileNotFoundError(f"Cookies DB not found under: {profile.profile_path}")
+    try:
+        copied = _copy_sqlite(cookies_db)
+    except Exception as e:
+        raise RuntimeError(
+            "Failed to copy Cookies DB (maybe the browser/profile is locked).\n"
+            f"Path: {cookies_db}\n"
+            "Close Chrome/Edge and retry, or run with --kill-browser.\n"
+            f"Original error: {e}"
+        )
+    try:
+        con = sqlite3.connect(str(copied))
+        try:
+            rows = select_cookie_rows(con, domains)
+        finally:
+            con.close()
+    finally:
+        shutil.rmtree(copied.parent, ignore_errors=True)
+    return decrypt_rows(rows, _chromium_batch_decryptor(aes_key), workers=workers)
+
+
 def find_default_profile(browser: str, profile_directory: Optional[str]) -> BrowserProfile:
     lad = Path(os.environ.get("LOCALAPPDATA", ""))
     if not lad.exists():
@@ -278,81 +428,13 @@ def read_endfield_cred_from_profile(profile: BrowserProfile) -> dict[str, str]:
     return {"ENDFIELD_CRED": m.get("SK_OAUTH_CRED_KEY", "")}
 
 
-def _local_storage_leveldb_dir(profile_path: Path) -> Optional[Path]:
-    p = profile_path / "Local Storage" / "leveldb"
-    return p if p.exists() else None
-
-
-def _scan_leveldb_dir_for_key(leveldb_dir: Path, key_fragment: str) -> Optional[str]:
-    # Best-effort "string scrape" from LevelDB files.
-    #
-    # Chromium stores Local Storage in a LevelDB. We avoid heavy dependencies by scanning for the key string
-    # and extracting a nearby numeric value. This works for simple cases like APP_CURRENT_ROLE_GAME_ROLE:endfield.
-    key_b = key_fragment.encode("utf-8", errors="ignore")
-    # Prefer values that look like large numeric IDs with trailing "::" (as shown in DevTools).
-    value_re = re.compile(rb"([0-9]{7,})(::)")
-
-    files = list(leveldb_dir.glob("*.log")) + list(leveldb_dir.glob("*.ldb")) + list(leveldb_dir.glob("*.sst"))
-    files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-
-    for fp in files:
-        try:
-            data = fp.read_bytes()
-        except Exception:
-            continue
-
-        # The LevelDB key may include origin/prefix bytes; we search by fragment.
-        idx = data.rfind(key_b)
-        if idx < 0:
-            continue
-
-        # Look around for a plausible numeric value (allow wider window).
-        window = data[idx : idx + 4096]
-        start = min(len(window), len(key_b))  # local index offset from window start
-        # Search only AFTER the key fragment to avoid accidentally picking an earlier numeric field.
-        tail = window[start:]
-        m = value_re.search(tail)
-        if not m:
-            continue
-
-        try:
-            return m.group(0).decode("utf-8", errors="replace")
-        except Exception:
-            return None
-
-    return None
-
-
-def read_endfield_roles_from_profile(profile: BrowserProfile) -> dict[str, str]:
-    # From DevTools screenshot (Application -> Local storage https://game.skport.com):
-    # - APP_CURRENT_ROLE:endfield -> e.g. "372802296::"
-    # - APP_CURRENT_ROLE_GAME_ROLE:endfield -> e.g. "4722345642::"
-    ldb = _local_storage_leveldb_dir(profile.profile_path)
-    if not ldb:
-        return {"ENDFIELD_ROLE_ID": "", "ENDFIELD_GAME_ROLE_ID": ""}
-
-    # Search by fragments (LevelDB key contains origin/prefix bytes).
-    role = _scan_leveldb_dir_for_key(ldb, "APP_CURRENT_ROLE:endfield") or _scan_leveldb_dir_for_key(ldb, "APP_CURRENT_ROLE") or ""
-    game_role = (
-        _scan_leveldb_dir_for_key(ldb, "APP_CURRENT_ROLE_GAME_ROLE:endfield")
-        or _scan_leveldb_dir_for_key(ldb, "APP_CURRENT_ROLE_GAME_ROLE")
-        or ""
-    )
-
-    # Normalize: keep raw too? Caller can decide; we strip trailing :: for convenience.
-    def _strip(v: str) -> str:
-        return v[:-2] if v.endswith("::") else v
-
-    return {
-        "ENDFIELD_ROLE_ID": _strip(role),
-        "ENDFIELD_GAME_ROLE_ID": _strip(game_role),
-    }
-
-
-def taskkill_browser(browser_name: str) -> None:
+def taskkill_browser(browser_name: str, wait_s: float = 10.0) -> None:
     # Best-effort. This is intentionally forceful to avoid cookie DB locks.
+    # Returns once every process of the browser has exited (or wait_s has passed), so the cookie
+    # DB can be snapshotted right away instead of after a fixed sleep.
     b = (browser_name or "").lower()
     img = "msedge.exe" if b == "edge" else "chrome.exe"
+    pids = _process_ids(img)
 
     def _run(cmd: list[str]) -> tuple[int, str]:
         try:
@@ -362,10 +444,22 @@ def taskkill_browser(browser_name: str) -> None:
         except Exception as e:
             return 999, str(e)
 
+    def _wait_exit() -> None:
+        started = time.monotonic()
+        if _wait_processes_exit(pids, wait_s):
+            print(f"{img}: {len(pids)} process(es) exited in {time.monotonic() - started:.2f}s")
+        else:
+            left = len(set(pids) & set(_process_ids(img)))
+            print(f"{img}: {left} process(es) still running after {wait_s:.0f}s")
+
+    if not pids:
+        print(f"{img} is not running")
+        return
+
     code, out = _run(["taskkill", "/IM", img, "/F", "/T"])
     if code == 0:
         print(f"taskkill ok: {img}")
-        time.sleep(0.5)
+        _wait_exit()
         return
 
     # taskkill can fail if process is elevated or already closed.
@@ -386,7 +480,7 @@ def taskkill_browser(browser_name: str) -> None:
     )
     if code2 == 0:
         print(f"Stop-Process ok: {name_no_ext}")
-        time.sleep(0.5)
+        _wait_exit()
         return
     if out2:
         print(f"Stop-Process failed ({code2}) for {name_no_ext}: {out2}")
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# Platform-neutral Chromium profile helpers shared by the Windows and Linux cookie readers.
+
+
+@dataclass(frozen=True)
+class BrowserProfile:
+    name: str
+    user_data_dir: Path
+    profile_dir: str
+
+    @property
+    def profile_path(self) -> Path:
+        return self.user_data_dir / self.profile_dir
+
+
+def _list_profile_dirs(user_data_dir: Path) -> list[str]:
+    out: list[str] = []
+    default = user_data_dir / "Default"
+    if default.exists():
+        out.append("Default")
+    for p in sorted(user_data_dir.glob("Profile *")):
+        if p.is_dir():
+            out.append(p.name)
+    return out
+
+
+def _cookie_db_path(profile_path: Path) -> Optional[Path]:
+    p1 = profile_path / "Network" / "Cookies"
+    if p1.exists():
+        return p1
+    p2 = profile_path / "Cookies"
+    if p2.exists():
+        return p2
+    return None
+
+
+def _local_storage_leveldb_dir(profile_path: Path) -> Optional[Path]:
+    p = profile_path / "Local Storage" / "leveldb"
+    return p if p.exists() else None
+
+
+# Prefer values that look like large numeric IDs with trailing "::" (as shown in DevTools).
+_VALUE_RE = re.compile(rb"([0-9]{7,})(::)")
+
+
+def _leveldb_files(leveldb_dir: Path) -> list[Path]:
+    # Newest first: the latest write of a key wins.
+    files = list(leveldb_dir.glob("*.log")) + list(leveldb_dir.glob("*.ldb")) + list(leveldb_dir.glob("*.sst"))
+    files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    return files
+
+
+def _value_after_key(data: bytes, key_b: bytes) -> Optional[str]:
+    # The LevelDB key may include origin/prefix bytes; we search by fragment.
+    idx = data.rfind(key_b)
+    if idx < 0:
+        return None
+
+    # Look around for a plausible numeric value (allow wider window).
+    window = data[idx : idx + 4096]
+    start = min(len(window), len(key_b))  # local index offset from window start
+    # Search only AFTER the key fragment to avoid accidentally picking an earlier numeric field.
+    m = _VALUE_RE.search(window[start:])
+    if not m:
+        return None
+    return m.group(0).decode("utf-8", errors="replace")
+
+
+def _scan_leveldb_dir_for_key(leveldb_dir: Path, key_fragment: str) -> Optional[str]:
+    # Best-effort "string scrape" from LevelDB files.
+    #
+    # Chromium stores Local Storage in a LevelDB. We avoid heavy dependencies by scanning for the key string
+    # and extracting a nearby numeric value. This works for simple cases like APP_CURRENT_ROLE_GAME_ROLE:endfield.
+    key_b = key_fragment.encode("utf-8", errors="ignore")
+    for fp in _leveldb_files(leveldb_dir):
+        try:
+            data = fp.read_bytes()
+        except Exception:
+            continue
+        v = _value_after_key(data, key_b)
+        if v is not None:
+            return v
+    return None
+
+
+# Persistent per-profile index of the Local Storage keys we look up.
+#
+# For every LevelDB file it stores (size, mtime_ns) and the value found after each key fragment
+# in that file. On the next run only new or changed files are read; the answer for a fragment is
+# then the newest file with a hit, exactly as _scan_leveldb_dir_for_key would find it.
+# COOKIEGRAB_LS_INDEX=0 disables the index.
+
+LS_INDEX_VERSION = 1
+
+
+def _ls_index_dir() -> Path:
+    override = os.getenv("COOKIEGRAB_CACHE_DIR", "").strip()
+    if override:
+        return Path(override).expanduser() / "ls_index"
+    if sys.platform == "win32" and os.getenv("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "cookiegrab" / "ls_index"
+    base = os.getenv("XDG_CACHE_HOME", "").strip() or str(Path.home() / ".cache")
+    return Path(base) / "cookiegrab" / "ls_index"
+
+
+def _ls_index_path(leveldb_dir: Path) -> Path:
+    ident = str(leveldb_dir.resolve()).encode("utf-8", errors="replace")
+    return _ls_index_dir() / (hashlib.blake2b(ident, digest_size=16).hexdigest() + ".json")
+
+
+def scan_leveldb_dir_indexed(leveldb_dir: Path, fragments: list[str]) -> dict[str, Optional[str]]:
+    # {fragment: value or None}, re-reading only files that changed since the last call.
+    if os.getenv("COOKIEGRAB_LS_INDEX", "").strip() == "0":
+        return {f: _scan_leveldb_dir_for_key(leveldb_dir, f) for f in fragments}
+
+    index_path = _ls_index_path(leveldb_dir)
+    try:
+        idx = json.loads(index_path.read_text(encoding="utf-8"))
+        if idx.get("version") != LS_INDEX_VERSION:
+            idx = {}
+    except (OSError, ValueError, AttributeError):
+        idx = {}
+    old_files: dict = idx.get("files") or {}
+
+    files: dict[str, dict] = {}
+    order: list[str] = []
+    changed = False
+    for fp in _leveldb_files(leveldb_dir):
+        try:
+            st = fp.stat()
+        except OSError:
+            continue
+        ent = old_files.get(fp.name)
+        hits = dict(ent.get("hits") or {}) if isinstance(ent, dict) else {}
+        fresh = isinstance(ent, dict) and ent.get("size") == st.st_size and ent.get("mtime_ns") == st.st_mtime_ns
+        if not fresh:
+            hits = {}
+        missing = [f for f in fragments if f not in hits]
+        if missing:
+            try:
+                data = fp.read_bytes()
+            except OSError:
+                continue
+            for f in missing:
+                hits[f] = _value_after_key(data, f.encode("utf-8", errors="ignore"))
+            changed = True
+        files[fp.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hits": hits}
+        order.append(fp.name)
+    changed = changed or set(files) != set(old_files)
+
+    if changed:
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": LS_INDEX_VERSION, "files": files}), encoding="utf-8")
+            tmp.replace(index_path)
+        except OSError:
+            pass
+
+    return {f: next((files[n]["hits"][f] for n in order if files[n]["hits"].get(f) is not None), None) for f in fragments}
+
+
+ENDFIELD_LS_KEYS = [
+    "APP_CURRENT_ROLE:endfield",
+    "APP_CURRENT_ROLE",
+    "APP_CURRENT_ROLE_GAME_ROLE:endfield",
+    "APP_CURRENT_ROLE_GAME_ROLE",
+]
+
+
+def read_endfield_roles_from_profile(profile: BrowserProfile) -> dict[str, str]:
+    # From DevTools screenshot (Application -> Local storage https://game.skport.com):
+    # - APP_CURRENT_ROLE:endfield -> e.g. "372802296::"
+    # - APP_CURRENT_ROLE_GAME_ROLE:endfield -> e.g. "4722345642::"
+    ldb = _local_storage_leveldb_dir(profile.profile_path)
+    if not ldb:
+        return {"ENDFIELD_ROLE_ID": "", "ENDFIELD_GAME_ROLE_ID": ""}
+
+    # Search by fragments (LevelDB key contains origin/prefix bytes).
+    found = scan_leveldb_dir_indexed(ldb, ENDFIELD_LS_KEYS)
+    role = found["APP_CURRENT_ROLE:endfield"] or found["APP_CURRENT_ROLE"] or ""
+    game_role = found["APP_CURRENT_ROLE_GAME_ROLE:endfield"] or found["APP_CURRENT_ROLE_GAME_ROLE"] or ""
+
+    # Normalize: keep raw too? Caller can decide; we strip trailing :: for convenience.
+    def _strip(v: str) -> str:
+        return v[:-2] if v.endswith("::") else v
+
+    return {
+        "ENDFIELD_ROLE_ID": _strip(role),
+        "ENDFIELD_GAME_ROLE_ID": _strip(game_role),
+    }
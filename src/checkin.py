@@ -1,65 +1,170 @@
+import argparse
 import json
 import os
 import time
-import uuid
-import random
-import string
-import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 from dotenv import load_dotenv
 
+from checkin_client import HoyolabClient, HoyolabCredentials, HoyolabGame, hoyolab_games
+from egress import account_context
+from game_ownership import OwnershipCache, ownership_enabled
+from job_queue import JobQueue, RetryPolicy, is_transient_result, workers_from_env
+from metrics import emit_metrics
+from profiling import add_profile_args, profile_run
+from run_deadline import Deadline
+from reward_catalog import shared_catalog
+from run_history import HistoryStore
+
 load_dotenv()
 
 
-def generate_ds(body: dict | None = None, query: str = "") -> str:
-    """Generate DS header using body and query (required for some luna endpoints)."""
-    t = str(int(time.time()))
-    r = "".join(random.sample(string.ascii_lowercase + string.digits, 6))
-    salt = os.getenv("HOYOLAB_DS_SALT", "h8w582wxwgqvahcdkpvdhbh2w9casgfl")
-    body_str = json.dumps(body or {}, separators=(",", ":"), ensure_ascii=False)
-    sign_str = f"salt={salt}&t={t}&r={r}&b={body_str}&q={query}"
-    c = hashlib.md5(sign_str.encode()).hexdigest()
-    return f"{t},{r},{c}"
-
-
-def checkin(game_name: str, act_id: str, url: str, signgame: str) -> None:
-    payload = {"act_id": act_id}
-    query = f"act_id={act_id}"
-
-    device_id = os.getenv("HOYOLAB_DEVICE_ID") or str(uuid.uuid4())
-    ltuid = os.getenv("LTUID") or ""
-    ltoken = os.getenv("LTOKEN") or ""
-    cookie_token = os.getenv("COOKIE_TOKEN_V2") or ""
-
-    headers = {
-        # include account_id_v2 for luna endpoints that validate account id explicitly
-        "Cookie": f"ltuid_v2={ltuid}; account_id_v2={ltuid}; ltoken_v2={ltoken}; cookie_token_v2={cookie_token};",
-        "DS": generate_ds(payload, query),
-        "x-rpc-client_type": "5",
-        "x-rpc-app_version": "2.70.1",
-        "x-rpc-language": "ja-jp",
-        "x-rpc-signgame": signgame,
-        "x-rpc-device_id": device_id,
-        "User-Agent": "okhttp/4.8.0",
-        "Referer": "https://act.hoyolab.com",
-        "Origin": "https://act.hoyolab.com",
-        "Content-Type": "application/json",
-    }
-
-    print(f"\n== {game_name} チェックイン中...")
-    response = requests.post(url, headers=headers, json=payload)
-    print(f"Status: {response.status_code}")
-    print(response.text)
+def load_accounts() -> list[dict]:
+    # 1) 複数アカ対応（JSON）: [{"accountName": ..., "ltuid": ..., "ltoken": ..., "cookieToken": ...}, ...]
+    pj = os.getenv("HOYOLAB_PROFILES_JSON", "").strip()
+    if pj:
+        accounts = json.loads(pj)
+        if not isinstance(accounts, list) or not accounts:
+            raise RuntimeError("HOYOLAB_PROFILES_JSON must be a non-empty JSON array")
+        return accounts
+
+    # 2) 単一アカ
+    return [{
+        "accountName": os.getenv("HOYOLAB_ACCOUNT_NAME", ""),
+        "ltuid": os.getenv("LTUID") or "",
+        "ltoken": os.getenv("LTOKEN") or "",
+        "cookieToken": os.getenv("COOKIE_TOKEN_V2") or "",
+    }]
+
+
+def account_key(acc: dict) -> str:
+    # 履歴DBなどで使うアカウント識別子（秘密情報は含めない）
+    return HoyolabCredentials.from_profile(acc).key
+
+
+def checkin(
+    game_name: str,
+    act_id: str,
+    url: str,
+    signgame: str,
+    deadline: Deadline | None = None,
+    account: dict | None = None,
+) -> dict:
+    creds = HoyolabCredentials.from_profile(account or load_accounts()[0])
+    res = HoyolabClient(creds, deadline=deadline).sign(HoyolabGame(game_name, act_id, url, signgame))
+
+    # 並列実行時に出力が混ざらないよう、まとめて1回で print する
+    title = f"[{creds.account_name}] {game_name}" if creds.account_name else game_name
+    body = res.pop("body", None)
+    if res.get("shared"):
+        print(f"\n== {title} スキップ: 同じ ltuid のアカウントの結果を共有 ({res.get('status') or res.get('error')})")
+    elif body is None:
+        print(f"\n== {title} チェックイン中...\nERROR: {res.get('error')}")
+    else:
+        print(f"\n== {title} チェックイン中...\nStatus: {res.get('http')}\n{body}")
+    return res
 
 
 # 各ゲームごとのact_idとURL
-games = [
-    ("原神", "e202102251931481", "https://sg-hk4e-api.hoyolab.com/event/sol/sign", "hk4e"),  # Genshin
-    ("崩壊スターレイル", "e202303301540311", "https://sg-public-api.hoyolab.com/event/luna/hkrpg/os/sign", "hkrpg"),  # Star Rail
-    ("崩壊3rd", os.getenv("BH3_ACT_ID", "e202110291205111"), "https://sg-public-api.hoyolab.com/event/mani/sign", "bh3"),  # Honkai Impact 3rd
-    ("ゼンレスゾーンゼロ", "e202406031448091", "https://sg-public-api.hoyolab.com/event/luna/zzz/os/sign", "zzz"),  # Zenless Zone Zero
-]
-
-for game_name, act_id, url, signgame in games:
-    checkin(game_name, act_id, url, signgame)
+games = [(g.name, g.act_id, g.url, g.signgame) for g in hoyolab_games()]
+
+
+def record_results(history: HistoryStore, run_id: str, done: list[tuple[dict, tuple[str, str, str, str], dict]], deadline: Deadline) -> None:
+    # 今月の取得日数（履歴）から、月間報酬カタログ上の今日の報酬を引く。
+    # 履歴が月初から揃っていない（途中から記録・記録のない日がある）場合、日数は推定なのでそう表示する
+    catalog = shared_catalog()
+    for acc, (game_name, act_id, _url, signgame), res in done:
+        if res.get("status") == "claimed":
+            day = history.done_days_this_month(account_key(acc), signgame) + 1
+            award = catalog.resolve_hoyolab(signgame, act_id, day, deadline)
+            if award:
+                if not history.covers_month(account_key(acc), signgame):
+                    award += " (推定)"
+                res["awards"] = [award]
+                print(f"[{account_key(acc)}] {game_name} 報酬: {award}")
+        history.record(run_id, account_key(acc), signgame, res)
+
+
+def run_all() -> list[dict]:
+    # 実行全体の期限（CHECKIN_DEADLINE_AT / CHECKIN_DEADLINE_S）。未設定なら無制限。
+    deadline = Deadline.from_env()
+    accounts = load_accounts()
+    jobs = [(acc, g) for acc in accounts for g in games]
+
+    # 保有ゲーム（戦績カード）のキャッシュで、署名できない (アカウント, ゲーム) を除外（CHECKIN_OWNERSHIP=0 で無効）
+    ownership = OwnershipCache() if ownership_enabled() else None
+    if ownership:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(accounts), workers_from_env()))) as ex:
+            found = ex.map(lambda a: ownership.owned(HoyolabCredentials.from_profile(a), deadline), accounts)
+            owned = dict(zip((account_key(a) for a in accounts), found))
+        keep = []
+        for acc, g in jobs:
+            have = owned.get(account_key(acc))
+            # None は取得できなかった（不明）→ 従来どおり全ゲームを試す
+            if have is not None and g[3] not in have:
+                print(f"\n== {g[0]} スキップ: 未所持 ({account_key(acc)})")
+                continue
+            keep.append((acc, g))
+        jobs = keep
+
+    # 実行履歴（CHECKIN_HISTORY_DB）。前回失敗したジョブを先に、取得済みのジョブは任意でスキップ
+    history = HistoryStore.from_env()
+    run_id = history.start_run("hoyolab") if history else ""
+    if history:
+        if os.getenv("CHECKIN_SKIP_DONE", "").strip() == "1":
+            done = history.done_today()
+            for acc, g in jobs:
+                if (account_key(acc), g[3]) in done:
+                    print(f"\n== {g[0]} スキップ: 本日分は取得済み ({account_key(acc)})")
+            jobs = [(acc, g) for acc, g in jobs if (account_key(acc), g[3]) not in done]
+        failed = history.failed_last_time()
+        jobs.sort(key=lambda j: (account_key(j[0]), j[1][3]) not in failed)
+
+    def _run(job: tuple[dict, tuple[str, str, str, str]], attempt: int) -> dict:
+        acc, (game_name, act_id, url, signgame) = job
+        started = time.monotonic()
+        # 同じアカウントの通信は同じ egress から出す（CHECKIN_EGRESS）
+        with account_context(account_key(acc)):
+            res = checkin(game_name, act_id, url, signgame, deadline, acc)
+        res.update({"latency_ms": round((time.monotonic() - started) * 1000, 1), "endpoint": url})
+        return res
+
+    def _skip(job: tuple[dict, tuple[str, str, str, str]]) -> dict:
+        acc, (game_name, _act_id, _url, signgame) = job
+        print(f"\n== {game_name} スキップ: 実行期限まで残り {max(deadline.remaining(), 0):.1f}s")
+        return {"name": str(acc.get("accountName") or ""), "game": signgame, "ok": False, "error": "skipped: run deadline reached"}
+
+    # 一時的な失敗は遅延キューの後ろに回し、その間ワーカーは次のジョブを処理する
+    queue = JobQueue(jobs, _run, is_transient=is_transient_result, on_skip=_skip, deadline=deadline, policy=RetryPolicy.from_env())
+    results = queue.run(workers_from_env())
+    if history:
+        try:
+            record_results(history, run_id, [(acc, g, res) for (acc, g), res in zip(jobs, results)], deadline)
+        finally:
+            history.close()
+    if ownership:
+        ownership.wait(min(5.0, max(deadline.remaining(), 0)))
+    return results
+
+
+def main() -> None:
+    # process_runner は本モジュールを import するので、ここで読み込む
+    from process_runner import process_count, run_hoyolab
+
+    ap = argparse.ArgumentParser(description="HoYoLAB daily check-in.")
+    add_profile_args(ap)
+    ap.add_argument("--procs", type=int, default=None, help="Worker processes (default: CHECKIN_PROCS or 1; 0 = one per CPU).")
+    args = ap.parse_args()
+
+    procs = process_count(args.procs)
+    with profile_run("checkin" if args.profile else None, args.profile_out):
+        if procs > 1:
+            # 複数プロセスで実行（メトリクスは process_runner がワーカー分を集計して出力）
+            run_hoyolab(procs)
+        else:
+            run_all()
+            emit_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import string
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import requests
+
+import http_transport
+from http_cassette import CassetteMiss
+from json_cache import cache_at
+from reward_catalog import RewardCatalog, cache_dir, shared_catalog
+from run_deadline import Deadline, DeadlineExceeded, request_timeout
+from run_history import checkin_day
+from server_clock import server_time
+from single_flight import SingleFlight
+
+# Importable HoYoLAB / Endfield check-in client.
+#
+# No side effects on import and no credentials from the environment: callers pass credential
+# objects explicitly. checkin.py and endfield_checkin.py are CLI wrappers over this module.
+#
+#   client = HoyolabClient(HoyolabCredentials(ltuid="...", ltoken="...", cookie_token="..."))
+#   res = client.sign("hkrpg")
+#   res = await AsyncEndfieldClient(EndfieldCredentials(cred="...")).sign()
+#
+# Results are dicts: {"name", "ok", "status" ("claimed" / "already-claimed"), "http", ...}.
+
+
+# Duplicate accounts (same ltuid / cred from several sources) share one sign call per game/role
+# and check-in day; a successful result is handed to the duplicates instead of signing again.
+SIGN_DEDUP_TTL_S = 26 * 3600
+_sign_flights: SingleFlight[dict] = SingleFlight(ttl_s=SIGN_DEDUP_TTL_S)
+
+
+def _shared_sign(key: tuple, name: str, fn: Callable[[], dict]) -> dict:
+    res, shared = _sign_flights.do(key + (checkin_day(),), fn, keep=lambda r: bool(r.get("ok")))
+    # 呼び出し側が結果を書き換えても共有分に影響しないよう、常にコピーを返す
+    if not shared:
+        return dict(res)
+    # 重複アカウント: 同じ資格情報の結果をそのまま使う（名前だけ自分のものにする）
+    return {**res, "name": name, "shared": True}
+
+
+# ---- HoYoLAB --------------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class HoyolabGame:
+    name: str
+    act_id: str
+    url: str
+    signgame: str
+
+
+def hoyolab_games() -> list[HoyolabGame]:
+    # 各ゲームごとのact_idとURL
+    return [
+        HoyolabGame("原神", "e202102251931481", "https://sg-hk4e-api.hoyolab.com/event/sol/sign", "hk4e"),  # Genshin
+        HoyolabGame("崩壊スターレイル", "e202303301540311", "https://sg-public-api.hoyolab.com/event/luna/hkrpg/os/sign", "hkrpg"),  # Star Rail
+        HoyolabGame("崩壊3rd", os.getenv("BH3_ACT_ID", "e202110291205111"), "https://sg-public-api.hoyolab.com/event/mani/sign", "bh3"),  # Honkai Impact 3rd
+        HoyolabGame("ゼンレスゾーンゼロ", "e202406031448091", "https://sg-public-api.hoyolab.com/event/luna/zzz/os/sign", "zzz"),  # Zenless Zone Zero
+    ]
+
+
+# game_id in the game record card -> signgame
+GAME_RECORD_CARD_URL = "https://bbs-api-os.hoyolab.com/game_record/card/wapi/getGameRecordCard"
+GAME_RECORD_IDS = {1: "bh3", 2: "hk4e", 6: "hkrpg", 8: "zzz"}
+
+
+def generate_ds(body: dict | None = None, query: str = "", url: str = "") -> str:
+    """Generate DS header using body and query (required for some luna endpoints)."""
+    t = str(int(server_time(url)))
+    r = "".join(random.sample(string.ascii_lowercase + string.digits, 6))
+    salt = os.getenv("HOYOLAB_DS_SALT", "h8w582wxwgqvahcdkpvdhbh2w9casgfl")
+    body_str = json.dumps(body or {}, separators=(",", ":"), ensure_ascii=False)
+    sign_str = f"salt={salt}&t={t}&r={r}&b={body_str}&q={query}"
+    c = hashlib.md5(sign_str.encode()).hexdigest()
+    return f"{t},{r},{c}"
+
+
+@dataclass(frozen=True)
+class HoyolabCredentials:
+    ltuid: str
+    ltoken: str
+    cookie_token: str = ""
+    account_name: str = ""
+    device_id: str = ""
+
+    @classmethod
+    def from_profile(cls, p: dict) -> "HoyolabCredentials":
+        # HOYOLAB_PROFILES_JSON の 1 要素: {"accountName", "ltuid", "ltoken", "cookieToken", "deviceId"}
+        return cls(
+            ltuid=str(p.get("ltuid") or ""),
+            ltoken=str(p.get("ltoken") or ""),
+            cookie_token=str(p.get("cookieToken") or ""),
+            account_name=str(p.get("accountName") or ""),
+            device_id=str(p.get("deviceId") or ""),
+        )
+
+    @property
+    def key(self) -> str:
+        # 履歴DBなどで使うアカウント識別子（秘密情報は含めない）
+        return self.account_name or f"ltuid:{self.ltuid}"
+
+    def cookie_header(self) -> str:
+        # include account_id_v2 for luna endpoints that validate account id explicitly
+        return f"ltuid_v2={self.ltuid}; account_id_v2={self.ltuid}; ltoken_v2={self.ltoken}; cookie_token_v2={self.cookie_token};"
+
+
+class HoyolabClient:
+    def __init__(self, creds: HoyolabCredentials, *, deadline: Optional[Deadline] = None) -> None:
+        self.creds = creds
+        self.deadline = deadline
+
+    def _game(self, game: HoyolabGame | str) -> HoyolabGame:
+        if isinstance(game, HoyolabGame):
+            return game
+        for g in hoyolab_games():
+            if game in (g.signgame, g.name):
+                return g
+        raise RuntimeError(f"Unknown HoYoLAB game: {game}")
+
+    def sign(self, game: HoyolabGame | str) -> dict:
+        # "body" holds the raw response text for logging; "shared" marks a duplicate account's result.
+        g = self._game(game)
+        return _shared_sign(("hoyolab", self.creds.ltuid, g.signgame), self.creds.account_name, lambda: self._sign(g))
+
+    def _sign(self, g: HoyolabGame) -> dict:
+        payload = {"act_id": g.act_id}
+        device_id = self.creds.device_id or os.getenv("HOYOLAB_DEVICE_ID") or str(uuid.uuid4())
+        headers = {
+            "Cookie": self.creds.cookie_header(),
+            "DS": generate_ds(payload, f"act_id={g.act_id}", g.url),
+            "x-rpc-client_type": "5",
+            "x-rpc-app_version": "2.70.1",
+            "x-rpc-language": "ja-jp",
+            "x-rpc-signgame": g.signgame,
+            "x-rpc-device_id": device_id,
+            "User-Agent": "okhttp/4.8.0",
+            "Referer": "https://act.hoyolab.com",
+            "Origin": "https://act.hoyolab.com",
+            "Content-Type": "application/json",
+        }
+
+        res: dict = {"name": self.creds.account_name, "game": g.signgame}
+        try:
+            response = http_transport.request("POST", g.url, headers=headers, json_body=payload, timeout=request_timeout(self.deadline))
+        except (requests.RequestException, DeadlineExceeded, CassetteMiss) as e:
+            res.update({"ok": False, "error": str(e), "transient": isinstance(e, requests.RequestException)})
+            return res
+
+        retcode = None
+        try:
+            retcode = int(response.json().get("retcode"))
+        except (ValueError, TypeError, AttributeError):
+            pass
+        # retcode -5003 は「本日分取得済み」
+        status = {0: "claimed", -5003: "already-claimed"}.get(retcode) if retcode is not None else None
+        res.update({"ok": status is not None, "http": response.status, "retcode": retcode, "status": status, "body": response.text})
+        if status is None:
+            res["error"] = response.text[:200]
+        return res
+
+    def sign_all(self) -> list[dict]:
+        return [self.sign(g) for g in hoyolab_games()]
+
+    def owned_games(self) -> Optional[set[str]]:
+        # signgames with a role on this account, from the game record card; None = unknown.
+        query = f"uid={self.creds.ltuid}"
+        headers = {
+            "Cookie": self.creds.cookie_header(),
+            "DS": generate_ds(None, query, GAME_RECORD_CARD_URL),
+            "x-rpc-client_type": "5",
+            "x-rpc-app_version": "2.70.1",
+            "x-rpc-language": "ja-jp",
+            "User-Agent": "okhttp/4.8.0",
+            "Referer": "https://act.hoyolab.com",
+            "Origin": "https://act.hoyolab.com",
+        }
+        try:
+            r = http_transport.request(
+                "GET", GAME_RECORD_CARD_URL, headers=headers, params={"uid": self.creds.ltuid}, timeout=request_timeout(self.deadline)
+            )
+            j = r.json()
+        except (requests.RequestException, DeadlineExceeded, CassetteMiss, ValueError):
+            return None
+        if not isinstance(j, dict) or j.get("retcode") != 0:
+            return None
+        games = {GAME_RECORD_IDS.get(x.get("game_id")) for x in (j.get("data") or {}).get("list") or [] if isinstance(x, dict)}
+        games.discard(None)
+        # An empty card (e.g. record not activated) says nothing about ownership.
+        return games or None
+
+
+# ---- Endfield (SKPort) ----------------------------------------------------------------------
+
+ZONAI_ORIGIN = "https://game.skport.com"
+REFRESH_URL = "https://zonai.skport.com/web/v1/auth/refresh"
+ATTEND_PATH = "/web/v1/game/endfield/attendance"
+ATTEND_URL = "https://zonai.skport.com" + ATTEND_PATH
+BINDING_PATH = "/api/v1/game/player/binding"
+BINDING_URL = "https://zonai.skport.com" + BINDING_PATH
+
+ROLE_CACHE_TTL_S = 7 * 24 * 3600
+# refresh で得た token の再利用期限。常駐ワーカーで期限切れの token を使い続けないよう、token の寿命より短くする
+TOKEN_CACHE_TTL_S = 30 * 60
+
+
+def _http(method: str, url: str, headers: dict, body: bytes | None = None, timeout: float = 20, hedge: bool = False) -> tuple[int, str]:
+    # HTTP errorでもボディは返ってくるので、ステータスに関わらず本文を返す
+    r = http_transport.request(method, url, headers=headers, data=body, timeout=timeout, hedge=hedge)
+    return r.status, r.text
+
+
+def refresh_token(cred: str, platform: str, vname: str, deadline: Deadline | None = None) -> str:
+    headers = {
+        "User-Agent": "Mozilla/5.0",
+        "Accept": "application/json, text/plain, */*",
+        "cred": cred,
+        "platform": platform,
+        "vName": vname,
+        "Origin": ZONAI_ORIGIN,
+        "Referer": ZONAI_ORIGIN + "/",
+    }
+    # 冪等な GET なので、遅いときは CHECKIN_HEDGE で 2 本目を送ってよい
+    status, text = _http("GET", REFRESH_URL, headers, body=None, timeout=request_timeout(deadline), hedge=True)
+    try:
+        j = json.loads(text)
+    except json.JSONDecodeError:
+        raise RuntimeError(f"refresh: non-json (HTTP {status}): {text[:200]}")
+
+    if j.get("code") == 0 and isinstance(j.get("data"), dict) and j["data"].get("token"):
+        return str(j["data"]["token"])
+
+    raise RuntimeError(f"refresh failed: HTTP {status}, code={j.get('code')}, msg={j.get('message')}")
+
+
+class _TokenCache:
+    # 同じ cred の refresh は TTL 内で 1 回だけにし、全ロール・重複プロファイルで token を共有する
+    def __init__(self, ttl_s: Optional[float] = None) -> None:
+        if ttl_s is None:
+            ttl_s = float(os.getenv("ENDFIELD_TOKEN_TTL_S", "") or TOKEN_CACHE_TTL_S)
+        self._flight: SingleFlight[str] = SingleFlight(ttl_s=ttl_s)
+
+    def get(self, cred: str, platform: str, vname: str, deadline: Deadline | None = None, force: bool = False) -> str:
+        if force:
+            self._flight.forget(cred)
+        token, _shared = self._flight.do(cred, lambda: refresh_token(cred, platform, vname, deadline), keep=bool)
+        return token
+
+
+_tokens = _TokenCache()
+
+
+def generate_sign(path: str, body_str: str, timestamp: str, token: str, platform: str, vname: str) -> str:
+    # gistの文字列形式に合わせる（スペース無し）
+    header_json = f'{{"platform":"{platform}","timestamp":"{timestamp}","dId":"","vName":"{vname}"}}'
+    msg = path + body_str + timestamp + header_json
+
+    h = hmac.new(token.encode("utf-8"), msg.encode("utf-8"), hashlib.sha256).hexdigest()
+    return hashlib.md5(h.encode("utf-8")).hexdigest()
+
+
+def claim_once(
+    name: str,
+    cred: str,
+    sk_game_role: str,
+    platform: str = "3",
+    vname: str = "1.0.0",
+    deadline: Deadline | None = None,
+    token: str | None = None,
+    catalog: RewardCatalog | None = None,
+) -> dict:
+    if token is None:
+        token = refresh_token(cred, platform, vname, deadline)
+    # ローカル時計がずれていても署名が通るよう、サーバー時刻（Date ヘッダから推定）を使う
+    ts = str(int(server_time(ATTEND_URL)))
+    sign = generate_sign(ATTEND_PATH, "", ts, token, platform, vname)
+
+    headers = {
+        "User-Agent": "Mozilla/5.0",
+        "Accept": "*/*",
+        "Referer": ZONAI_ORIGIN + "/",
+        "Origin": ZONAI_ORIGIN,
+        "Content-Type": "application/json",
+        "sk-language": os.getenv("ENDFIELD_LANG", "en"),
+        "sk-game-role": sk_game_role,
+        "cred": cred,
+        "platform": platform,
+        "vName": vname,
+        "timestamp": ts,
+        "sign": sign,
+    }
+
+    # gist側はbody無しで叩いている（UrlFetchApp.fetchでpayload未指定）流れに合わせる
+    status, text = _http("POST", ATTEND_URL, headers, body=None, timeout=request_timeout(deadline))
+
+    try:
+        j = json.loads(text)
+    except json.JSONDecodeError:
+        return {"name": name, "ok": False, "http": status, "error": f"non-json: {text[:200]}"}
+
+    code = j.get("code")
+    if code == 0:
+        # 報酬の整形（あれば）
+        awards = []
+        data = j.get("data") or {}
+        award_ids = data.get("awardIds") or []
+        rim = data.get("resourceInfoMap") or {}
+        # 報酬名はアカウント間で共通なので、カタログに覚えておき map が無い応答でも名前を引く
+        catalog = catalog or shared_catalog()
+        catalog.learn_endfield(rim)
+        for a in award_ids:
+            _id = a.get("id") if isinstance(a, dict) else a
+            r = rim.get(str(_id)) or rim.get(_id)
+            if isinstance(r, dict) and r.get("name") is not None:
+                awards.append(f'{r.get("name")} x{r.get("count")}')
+            elif (known := catalog.resolve_endfield(_id)):
+                awards.append(known)
+        return {"name": name, "ok": True, "http": status, "code": code, "status": "claimed", "awards": awards}
+
+    if code == 10001:
+        return {"name": name, "ok": True, "http": status, "code": code, "status": "already-claimed"}
+
+    return {"name": name, "ok": False, "http": status, "code": code, "error": j.get("message")}
+
+
+def discover_roles(cred: str, platform: str = "3", vname: str = "1.0.0", deadline: Deadline | None = None) -> list[str]:
+    # バインド済みロール一覧から sk-game-role（"{platform}_{roleId}_{serverId}"）を組み立てる
+    token = _tokens.get(cred, platform, vname, deadline)
+    ts = str(int(server_time(BINDING_URL)))
+    headers = {
+        "User-Agent": "Mozilla/5.0",
+        "Accept": "application/json, text/plain, */*",
+        "Referer": ZONAI_ORIGIN + "/",
+        "Origin": ZONAI_ORIGIN,
+        "cred": cred,
+        "platform": platform,
+        "vName": vname,
+        "timestamp": ts,
+        "sign": generate_sign(BINDING_PATH, "", ts, token, platform, vname),
+    }
+    status, text = _http("GET", BINDING_URL, headers, body=None, timeout=request_timeout(deadline))
+    try:
+        j = json.loads(text)
+    except json.JSONDecodeError:
+        raise RuntimeError(f"binding: non-json (HTTP {status}): {text[:200]}")
+    if j.get("code") != 0:
+        raise RuntimeError(f"binding failed: HTTP {status}, code={j.get('code')}, msg={j.get('message')}")
+
+    roles: list[str] = []
+    for app in (j.get("data") or {}).get("list") or []:
+        if not isinstance(app, dict) or app.get("appCode") != "endfield":
+            continue
+        for b in app.get("bindingList") or []:
+            for r in (b or {}).get("roles") or []:
+                if isinstance(r, dict) and r.get("roleId") and r.get("serverId") is not None:
+                    roles.append(f"{platform}_{r['roleId']}_{r['serverId']}")
+    return roles
+
+
+def _role_cache_path():
+    return cache_dir() / "endfield_roles.json"
+
+
+_role_flights: SingleFlight[list[str]] = SingleFlight()
+
+
+def cached_roles(cred: str, platform: str, vname: str, deadline: Deadline | None = None) -> list[str]:
+    # ロール一覧はめったに変わらないので cred ごとにディスクへキャッシュする（cred 自体は保存しない）
+    key = hashlib.sha256(cred.encode("utf-8")).hexdigest()[:32]
+    cache = cache_at(_role_cache_path())
+    ent = cache.get(key)
+    ttl = float(os.getenv("ENDFIELD_ROLE_CACHE_TTL_S", "") or ROLE_CACHE_TTL_S)
+    if isinstance(ent, dict) and ent.get("roles") and time.time() - float(ent.get("at", 0)) < ttl:
+        return list(ent["roles"])
+
+    roles, shared = _role_flights.do(key, lambda: discover_roles(cred, platform, vname, deadline))
+    if roles and not shared:
+        cache.put(key, {"roles": roles, "at": time.time()})
+    return roles
+
+
+def profile_roles(p: dict) -> list[str] | None:
+    # skGameRoles: [...] / skGameRole: "a,b" / 未指定 or "auto" -> None（自動検出）
+    roles = p.get("skGameRoles")
+    if isinstance(roles, list):
+        return [str(r) for r in roles if str(r).strip()] or None
+    role = str(p.get("skGameRole") or "").strip()
+    if not role or role.lower() == "auto":
+        return None
+    return [r.strip() for r in role.split(",") if r.strip()]
+
+
+@dataclass(frozen=True)
+class EndfieldCredentials:
+    cred: str
+    # Empty = discover every role bound to the cred.
+    roles: tuple[str, ...] = field(default_factory=tuple)
+    platform: str = "3"
+    vname: str = "1.0.0"
+    account_name: str = "account"
+
+    @classmethod
+    def from_profile(cls, p: dict) -> "EndfieldCredentials":
+        # ENDFIELD_PROFILES_JSON の 1 要素
+        return cls(
+            cred=str(p.get("cred") or ""),
+            roles=tuple(profile_roles(p) or ()),
+            platform=str(p.get("platform", "3")),
+            vname=str(p.get("vName", "1.0.0")),
+            account_name=str(p.get("accountName", "account")),
+        )
+
+    @property
+    def key(self) -> str:
+        # Egress / dedupe identity: profiles often keep the default "account" name, so use the
+        # cred (hashed; it is a secret) rather than the name.
+        return "cred:" + hashlib.sha256(self.cred.encode("utf-8")).hexdigest()[:16]
+
+
+class EndfieldClient:
+    def __init__(self, creds: EndfieldCredentials, *, deadline: Optional[Deadline] = None, catalog: Optional[RewardCatalog] = None) -> None:
+        self.creds = creds
+        self.deadline = deadline
+        self.catalog = catalog
+
+    def token(self, force: bool = False) -> str:
+        c = self.creds
+        return _tokens.get(c.cred, c.platform, c.vname, self.deadline, force=force)
+
+    def roles(self) -> list[str]:
+        c = self.creds
+        return list(c.roles) or cached_roles(c.cred, c.platform, c.vname, self.deadline)
+
+    def sign(self, role: Optional[str] = None, *, name: Optional[str] = None, refresh: bool = False) -> dict:
+        # One role (default: the only/first role). refresh=True forces a new token (e.g. on retry).
+        role = role or self.roles()[0]
+        name = name or self.creds.account_name
+        res = self._sign(role, name, refresh)
+        if not refresh and not res.get("ok") and res.get("code") not in (None, 0):
+            # 期限切れ token による拒否は一時的な失敗扱いにならず再試行されないので、
+            # 共有 token を捨てて（force で forget）取り直し、1 回だけやり直す
+            res = self._sign(role, name, True)
+        return res
+
+    def _sign(self, role: str, name: str, refresh: bool) -> dict:
+        c = self.creds
+        return _shared_sign(
+            ("endfield", c.cred, role),
+            name,
+            lambda: claim_once(
+                name=name,
+                cred=c.cred,
+                sk_game_role=role,
+                platform=c.platform,
+                vname=c.vname,
+                deadline=self.deadline,
+                token=self.token(force=refresh),
+                catalog=self.catalog,
+            ),
+        )
+
+    def sign_all(self) -> list[dict]:
+        roles = self.roles()
+        if not roles:
+            return [{"name": self.creds.account_name, "ok": False, "error": "role discovery: no Endfield role bound to this cred"}]
+        out = []
+        for k, role in enumerate(roles):
+            # ロールIDはログに出さないよう、複数ロールは番号で区別する
+            name = self.creds.account_name if len(roles) == 1 else f"{self.creds.account_name}#{k + 1}"
+            try:
+                out.append(self.sign(role, name=name))
+            except Exception as e:
+                out.append({"name": name, "ok": False, "error": str(e), "transient": isinstance(e, requests.RequestException)})
+        return out
+
+
+# ---- async ----------------------------------------------------------------------------------
+# The transport is synchronous (pooled sessions / HTTP/2 clients); calls run in the default
+# executor so an event loop can drive many accounts. Context variables (e.g. the egress account)
+# carry over into the worker thread.
+
+
+class AsyncHoyolabClient:
+    def __init__(self, creds: HoyolabCredentials, *, deadline: Optional[Deadline] = None) -> None:
+        self._sync = HoyolabClient(creds, deadline=deadline)
+
+    @property
+    def creds(self) -> HoyolabCredentials:
+        return self._sync.creds
+
+    async def sign(self, game: HoyolabGame | str) -> dict:
+        return await asyncio.to_thread(self._sync.sign, game)
+
+    async def sign_all(self) -> list[dict]:
+        return list(await asyncio.gather(*(self.sign(g) for g in hoyolab_games())))
+
+
+class AsyncEndfieldClient:
+    def __init__(self, creds: EndfieldCredentials, *, deadline: Optional[Deadline] = None, catalog: Optional[RewardCatalog] = None) -> None:
+        self._sync = EndfieldClient(creds, deadline=deadline, catalog=catalog)
+
+    @property
+    def creds(self) -> EndfieldCredentials:
+        return self._sync.creds
+
+    async def roles(self) -> list[str]:
+        return await asyncio.to_thread(self._sync.roles)
+
+    async def sign(self, role: Optional[str] = None, *, name: Optional[str] = None, refresh: bool = False) -> dict:
+        return await asyncio.to_thread(self._sync.sign, role, name=name, refresh=refresh)
+
+    async def sign_all(self) -> list[dict]:
+        return await asyncio.to_thread(self._sync.sign_all)
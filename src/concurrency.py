@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+# Adaptive per-host concurrency (AIMD), so CHECKIN_WORKERS does not have to be tuned by hand.
+#
+#   CHECKIN_AIMD=1                   enable; CHECKIN_WORKERS then defaults to CHECKIN_AIMD_MAX
+#   CHECKIN_AIMD_INITIAL=2           starting in-flight limit per host
+#   CHECKIN_AIMD_MIN=1 / _MAX=32     bounds
+#   CHECKIN_AIMD_BACKOFF=0.7         multiplicative decrease factor
+#   CHECKIN_AIMD_LATENCY_FACTOR=2.0  a response slower than factor x baseline latency is congestion
+#
+# The limits are reported by metrics.emit_metrics() at the end of a run.
+#
+# Each response that is fast and not throttled raises the limit by 1/limit (about +1 per round
+# trip); a throttle (429/503), 5xx, transport error or slow response multiplies it by BACKOFF, at
+# most once per round trip so one burst of failures is not counted many times.
+
+DEFAULT_INITIAL = 2
+DEFAULT_MIN = 1
+DEFAULT_MAX = 32
+DEFAULT_BACKOFF = 0.7
+DEFAULT_LATENCY_FACTOR = 2.0
+
+_THROTTLE_STATUSES = {429, 503}
+
+
+def aimd_enabled() -> bool:
+    return os.getenv("CHECKIN_AIMD", "").strip() == "1"
+
+
+def aimd_max() -> int:
+    return max(1, int(os.getenv("CHECKIN_AIMD_MAX", "") or DEFAULT_MAX))
+
+
+class AimdLimiter:
+    def __init__(
+        self,
+        host: str,
+        *,
+        initial: float = DEFAULT_INITIAL,
+        min_limit: float = DEFAULT_MIN,
+        max_limit: float = DEFAULT_MAX,
+        backoff: float = DEFAULT_BACKOFF,
+        latency_factor: float = DEFAULT_LATENCY_FACTOR,
+    ) -> None:
+        self.host = host
+        self.min_limit = max(1.0, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.backoff = backoff
+        self.latency_factor = latency_factor
+        self.inflight = 0
+        self.baseline_s: Optional[float] = None
+        self.ok = 0
+        self.throttled = 0
+        self.errors = 0
+        self.slow = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.inflight += 1
+            return True
+
+    def release(self, latency_s: float, outcome: str) -> None:
+        # outcome: "ok", "throttled" or "error"
+        with self._cond:
+            self.inflight -= 1
+            slow = False
+            if outcome == "ok":
+                self.ok += 1
+                b = self.baseline_s
+                if b is None or latency_s < b:
+                    self.baseline_s = latency_s
+                else:
+                    # Drift up slowly so a permanently slower upstream becomes the new baseline.
+                    self.baseline_s = b + (latency_s - b) * 0.02
+                    slow = latency_s > b * self.latency_factor
+                    self.slow += slow
+            elif outcome == "throttled":
+                self.throttled += 1
+            else:
+                self.errors += 1
+
+            if outcome == "ok" and not slow:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                now = time.monotonic()
+                if now - self._last_decrease >= max(latency_s, self.baseline_s or 0.0):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.decreases += 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "host": self.host,
+                "limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "baseline_ms": round(self.baseline_s * 1000, 1) if self.baseline_s is not None else None,
+                "ok": self.ok,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "slow": self.slow,
+                "decreases": self.decreases,
+            }
+
+
+_limiters: dict[str, AimdLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(host: str) -> AimdLimiter:
+    with _limiters_lock:
+        lim = _limiters.get(host)
+        if lim is None:
+            lim = AimdLimiter(
+                host,
+                initial=float(os.getenv("CHECKIN_AIMD_INITIAL", "") or DEFAULT_INITIAL),
+                min_limit=float(os.getenv("CHECKIN_AIMD_MIN", "") or DEFAULT_MIN),
+                max_limit=float(aimd_max()),
+                backoff=float(os.getenv("CHECKIN_AIMD_BACKOFF", "") or DEFAULT_BACKOFF),
+                latency_factor=float(os.getenv("CHECKIN_AIMD_LATENCY_FACTOR", "") or DEFAULT_LATENCY_FACTOR),
+            )
+            _limiters[host] = lim
+        return lim
+
+
+class _Slot:
+    status: Optional[int] = None
+
+
+@contextmanager
+def host_slot(url: str, timeout: float) -> Iterator[_Slot]:
+    # Holds one in-flight slot for url's host; set slot.status to the HTTP status before leaving.
+    slot = _Slot()
+    if not aimd_enabled():
+        yield slot
+        return
+    lim = limiter_for(urlsplit(url).netloc)
+    if not lim.acquire(timeout):
+        raise requests.Timeout(f"{lim.host}: concurrency limit wait exceeds the request timeout")
+    started = time.monotonic()
+    outcome = "error"
+    try:
+        yield slot
+        if slot.status in _THROTTLE_STATUSES:
+            outcome = "throttled"
+        elif slot.status is not None and slot.status < 500:
+            outcome = "ok"
+    finally:
+        lim.release(time.monotonic() - started, outcome)
+
+
+def metrics() -> list[dict]:
+    with _limiters_lock:
+        lims = list(_limiters.values())
+    return [lim.snapshot() for lim in sorted(lims, key=lambda x: x.host)]
+
+
+def prometheus_text(rows: list[dict]) -> str:
+    out = [
+        "# HELP checkin_concurrency_limit Current AIMD in-flight limit per host.",
+        "# TYPE checkin_concurrency_limit gauge",
+    ]
+    out += [f'checkin_concurrency_limit{{host="{r["host"]}"}} {r["limit"]}' for r in rows]
+    for name in ("ok", "throttled", "errors", "slow", "decreases"):
+        out.append(f"# TYPE checkin_concurrency_{name}_total counter")
+        out += [f'checkin_concurrency_{name}_total{{host="{r["host"]}"}} {r[name]}' for r in rows]
+    return "\n".join(out) + "\n"
@@ -1,15 +1,17 @@
 import json
 import os
 import sys
-import time
 import uuid
 import random
 import string
 import hashlib
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
-import requests
+import http_transport
+from run_deadline import Deadline, request_timeout
+from server_clock import server_time
+from single_flight import SingleFlight
 
 
 def _find_env_file() -> str:
@@ -53,7 +55,7 @@ def mask(v: str) -> str:
 
 
 def generate_ds(body: dict | None = None, query: str = "") -> str:
-    t = str(int(time.time()))
+    t = str(int(server_time("hoyolab.com")))
     r = "".join(random.sample(string.ascii_lowercase + string.digits, 6))
     salt = os.getenv("HOYOLAB_DS_SALT", "h8w582wxwgqvahcdkpvdhbh2w9casgfl")
     body_str = json.dumps(body or {}, separators=(",", ":"), ensure_ascii=False)
@@ -83,21 +85,35 @@ def make_headers(signgame: str, query: str) -> Dict[str, str]:
     }
 
 
-def check_hoyolab_info(game_name: str, act_id: str, info_url: str, signgame: str) -> Tuple[int, str]:
+_info_flights: SingleFlight[Tuple[int, str]] = SingleFlight()
+
+
+def check_hoyolab_info(
+    game_name: str,
+    act_id: str,
+    info_url: str,
+    signgame: str,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[int, str]:
     load_env()
 
-    query = f"act_id={act_id}"
-    headers = make_headers(signgame, query=query)
-    r = requests.get(info_url, headers=headers, params={"act_id": act_id}, timeout=20)
+    def _fetch() -> Tuple[int, str]:
+        query = f"act_id={act_id}"
+        headers = make_headers(signgame, query=query)
+        r = http_transport.request("GET", info_url, headers=headers, params={"act_id": act_id}, timeout=request_timeout(deadline), hedge=True)
 
-    try:
-        j = r.json()
-    except Exception:
-        return r.status_code, (r.text[:400] if r.text else "")
+        try:
+            j = r.json()
+        except Exception:
+            return r.status, (r.text[:400] if r.text else "")
+
+        retcode = int(j.get("retcode", 0) or 0)
+        msg = str(j.get("message", ""))
+        return retcode, msg
 
-    retcode = int(j.get("retcode", 0) or 0)
-    msg = str(j.get("message", ""))
-    return retcode, msg
+    # Concurrent checks of the same account and game share one request.
+    out, _shared = _info_flights.do((os.getenv("LTUID") or "", info_url, act_id), _fetch)
+    return out
 
 
 def print_cookie_summary() -> None:
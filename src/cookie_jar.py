@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional, TextIO
+
+# Full cookie-jar export shared by the Windows and Linux readers.
+#
+# Rows are decrypted in batches on a thread pool; AES in `cryptography` releases the GIL, so
+# batches decrypt in parallel. Output is Netscape cookies.txt or HAR-style cookie JSON.
+
+DEFAULT_DOMAINS = ["hoyolab.com", "skport.com"]
+BATCH_SIZE = 1024
+
+# Chromium stores times as microseconds since 1601-01-01 UTC.
+_CHROME_EPOCH_OFFSET_S = 11644473600
+
+_SAMESITE = {-1: None, 0: "None", 1: "Lax", 2: "Strict"}
+
+COOKIE_COLUMNS = "host_key, name, value, path, expires_utc, is_secure, is_httponly, samesite, encrypted_value"
+
+
+@dataclass
+class Cookie:
+    host_key: str
+    name: str
+    value: str
+    path: str
+    expires_utc: int
+    is_secure: bool
+    is_httponly: bool
+    samesite: Optional[str] = None
+
+    @property
+    def expires_unix(self) -> int:
+        # 0 = session cookie
+        if not self.expires_utc:
+            return 0
+        return max(0, self.expires_utc // 1_000_000 - _CHROME_EPOCH_OFFSET_S)
+
+
+def host_filter_sql(domains: Optional[list[str]]) -> tuple[str, list[str]]:
+    # WHERE fragment matching the domains and their subdomains; None = every domain.
+    if not domains:
+        return "1=1", []
+    parts, params = [], []
+    for d in domains:
+        d = d.strip().lstrip(".")
+        parts.append("(host_key = ? OR host_key = ? OR host_key LIKE ?)")
+        params += [d, "." + d, "%." + d]
+    return " OR ".join(parts), params
+
+
+def select_cookie_rows(con: sqlite3.Connection, domains: Optional[list[str]]) -> list[tuple]:
+    where, params = host_filter_sql(domains)
+    try:
+        return con.execute(f"SELECT {COOKIE_COLUMNS} FROM cookies WHERE {where}", params).fetchall()
+    except sqlite3.OperationalError:
+        # Old schema without samesite.
+        cols = COOKIE_COLUMNS.replace("samesite", "-1 AS samesite")
+        return con.execute(f"SELECT {cols} FROM cookies WHERE {where}", params).fetchall()
+
+
+def strip_host_hash(pt: bytes, host_key: str) -> bytes:
+    # Cookies DB meta version >= 24 prefixes the plaintext with SHA256(host_key).
+    if len(pt) >= 32 and pt[:32] == hashlib.sha256(host_key.encode("utf-8")).digest():
+        return pt[32:]
+    return pt
+
+
+def decrypt_rows(
+    rows: list[tuple],
+    decrypt_batch: Callable[[list[tuple[str, bytes]]], list[Optional[str]]],
+    *,
+    workers: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> tuple[list[Cookie], int]:
+    # rows: COOKIE_COLUMNS tuples. decrypt_batch gets [(host_key, encrypted_value)] and returns
+    # plaintexts (None = could not decrypt). Returns (cookies, undecryptable count).
+    need = [i for i, r in enumerate(rows) if not r[2] and r[8]]
+    batches = [need[i : i + batch_size] for i in range(0, len(need), batch_size)]
+    plain: dict[int, Optional[str]] = {}
+
+    def _one(idx: list[int]) -> list[tuple[int, Optional[str]]]:
+        return list(zip(idx, decrypt_batch([(rows[i][0], rows[i][8]) for i in idx])))
+
+    if len(batches) <= 1:
+        for b in batches:
+            plain.update(_one(b))
+    else:
+        n = workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=max(1, n)) as ex:
+            for part in ex.map(_one, batches):
+                plain.update(part)
+
+    out: list[Cookie] = []
+    failed = 0
+    for i, (host, name, value, path, expires, secure, httponly, samesite, _ev) in enumerate(rows):
+        if i in plain:
+            v = plain[i]
+            if v is None:
+                failed += 1
+                continue
+            value = v
+        out.append(Cookie(host, name, value or "", path or "/", int(expires or 0), bool(secure), bool(httponly), _SAMESITE.get(samesite)))
+    return out, failed
+
+
+def write_netscape(cookies: Iterable[Cookie], fp: TextIO) -> None:
+    fp.write("# Netscape HTTP Cookie File\n")
+    for c in cookies:
+        domain = c.host_key
+        if c.is_httponly:
+            domain = "#HttpOnly_" + domain
+        flag = "TRUE" if c.host_key.startswith(".") else "FALSE"
+        fp.write(
+            "\t".join([domain, flag, c.path, "TRUE" if c.is_secure else "FALSE", str(c.expires_unix), c.name, c.value]) + "\n"
+        )
+
+
+def har_cookies(cookies: Iterable[Cookie]) -> list[dict]:
+    out = []
+    for c in cookies:
+        d = {
+            "name": c.name,
+            "value": c.value,
+            "path": c.path,
+            "domain": c.host_key,
+            "httpOnly": c.is_httponly,
+            "secure": c.is_secure,
+        }
+        if c.expires_unix:
+            d["expires"] = datetime.fromtimestamp(c.expires_unix, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        if c.samesite:
+            d["sameSite"] = c.samesite
+        out.append(d)
+    return out
+
+
+def write_jar(cookies: list[Cookie], fp: TextIO, fmt: str) -> None:
+    if fmt == "netscape":
+        write_netscape(cookies, fp)
+    elif fmt == "har":
+        json.dump({"cookies": har_cookies(cookies)}, fp, ensure_ascii=False, indent=2)
+        fp.write("\n")
+    else:
+        raise RuntimeError(f"Unknown cookie jar format: {fmt}")
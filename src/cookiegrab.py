@@ -1,13 +1,14 @@
 import argparse
-import json
 import sys
+import time
 from pathlib import Path
 from urllib.parse import urlparse
 
+import har_cache
+from har_stream import load_har_requests
 from endfieldgrab_har import extract_endfield_headers_from_har
-from grab_hoyolab_cookies_lib import run_cookie_grab
 from grab_urls import HOYOLAB_GI_URL, HOYOLAB_HSR_URL, HOYOLAB_HI3_URL, HOYOLAB_ZZZ_URL, SKPORT_ENDFIELD_URL
-from grab_endfield_cred_lib import run_endfield_cred_grab
+from profiling import add_profile_args, profile_run
 
 
 GAME_MENU = [
@@ -136,54 +137,144 @@ def _normalize_path(s: str) -> str:
     return t.strip()
 
 
-def run_from_har(*, target: str, har_path: str, raw: bool, pause: bool) -> int:
+def extract_all_from_har(har: dict) -> dict[str, dict[str, str]]:
+    # Extract both targets at once so a cached result serves either --target.
+    return {
+        "hoyolab": extract_hoyolab_tokens_from_har(har),
+        "endfield": extract_endfield_headers_from_har(har),
+    }
+
+
+def _secrets_note(raw: bool, use_cache: bool) -> str:
+    if raw and use_cache:
+        return f"NOTE: Raw values are cached encrypted under {har_cache.cache_dir()} (use --no-cache to disable)."
+    return "NOTE: This tool does not save secrets to disk; it only prints them."
+
+
+def run_from_har(*, target: str, har_path: str, raw: bool, pause: bool, use_cache: bool = True) -> int:
     hp = Path(har_path).expanduser()
     if not hp.exists():
         print(f"ERROR: HAR not found: {hp}")
         pause_exit(pause)
         return 1
 
-    try:
-        har = json.loads(hp.read_text(encoding="utf-8"))
-    except Exception as e:
-        print(f"ERROR: Failed to parse HAR: {e}")
+    if target not in ("hoyolab", "endfield"):
+        print(f"ERROR: Unknown target: {target}")
         pause_exit(pause)
         return 1
 
+    cached = har_cache.lookup(hp, raw=raw) if use_cache else None
+    if cached is not None:
+        all_values, masked = cached
+    else:
+        try:
+            har = load_har_requests(hp)
+        except Exception as e:
+            print(f"ERROR: Failed to parse HAR: {e}")
+            pause_exit(pause)
+            return 1
+        all_values, masked = extract_all_from_har(har), False
+        if use_cache:
+            har_cache.store(hp, all_values, raw=raw)
+
+    def show(v: str) -> str:
+        if masked:
+            return v or "(empty)"
+        return v if raw else mask(v)
+
+    values = all_values.get(target) or {}
+
     if target == "hoyolab":
-        values = extract_hoyolab_tokens_from_har(har)
         print("== HoYoLAB cookie grabber (HAR) ==")
-        print(f"har: {hp}")
+        print(f"har: {hp}{' (cached)' if cached is not None else ''}")
         print("\nCookie values:")
         for k in ["LTUID", "LTOKEN", "COOKIE_TOKEN_V2"]:
             v = values.get(k, "") or ""
-            print(f"- {k}: {v if raw else mask(v)}")
+            print(f"- {k}: {show(v)}")
         if any(not values.get(k) for k in ["LTUID", "LTOKEN", "COOKIE_TOKEN_V2"]):
             print("\nNOTE: Some cookie values were not found in this HAR.")
             print("Tips: In DevTools Network tab, enable 'Preserve log', reload the page, then export HAR.")
-        print("\nNOTE: This tool does not save secrets to disk; it only prints them.")
+        print("\n" + _secrets_note(raw, use_cache))
         pause_exit(pause)
         return 0 if any(values.get(k) for k in values) else 1
 
-    if target == "endfield":
-        values = extract_endfield_headers_from_har(har)
-        print("== Endfield (SKPort) grabber (HAR) ==")
-        print(f"har: {hp}")
-        print("\nExtracted values:")
-        for k in ["ENDFIELD_CRED", "ENDFIELD_SK_GAME_ROLE", "ENDFIELD_PLATFORM", "ENDFIELD_VNAME"]:
-            v = values.get(k, "") or ""
-            print(f"- {k}: {v if raw else mask(v)}")
-        if not values.get("ENDFIELD_CRED") or not values.get("ENDFIELD_SK_GAME_ROLE"):
-            print("\nNOTE: cred / sk-game-role not found in this HAR.")
-            print("Tips: In DevTools Network tab, enable 'Preserve log'.")
-            print("      Open Endfield sign-in page and click the sign-in button once, then export HAR.")
-        print("\nNOTE: This tool does not save secrets to disk; it only prints them.")
+    print("== Endfield (SKPort) grabber (HAR) ==")
+    print(f"har: {hp}{' (cached)' if cached is not None else ''}")
+    print("\nExtracted values:")
+    for k in ["ENDFIELD_CRED", "ENDFIELD_SK_GAME_ROLE", "ENDFIELD_PLATFORM", "ENDFIELD_VNAME"]:
+        v = values.get(k, "") or ""
+        print(f"- {k}: {show(v)}")
+    if not values.get("ENDFIELD_CRED") or not values.get("ENDFIELD_SK_GAME_ROLE"):
+        print("\nNOTE: cred / sk-game-role not found in this HAR.")
+        print("Tips: In DevTools Network tab, enable 'Preserve log'.")
+        print("      Open Endfield sign-in page and click the sign-in button once, then export HAR.")
+    print("\n" + _secrets_note(raw, use_cache))
+    pause_exit(pause)
+    return 0 if values.get("ENDFIELD_CRED") and values.get("ENDFIELD_SK_GAME_ROLE") else 1
+
+
+def watch_hars(args: argparse.Namespace) -> int:
+    from har_watch import watch_dir
+
+    directory = Path(_normalize_path(args.watch)).expanduser()
+    if not directory.is_dir():
+        print(f"ERROR: Not a directory: {directory}")
+        return 1
+    out = Path(args.watch_out).expanduser() if args.watch_out else directory / "cookiegrab-watch.jsonl"
+
+    def on_record(rec: dict) -> None:
+        if "error" in rec:
+            print(f"- {rec['file']}: ERROR {rec['error']}")
+            return
+        found = [t for t in ("hoyolab", "endfield") if any((rec.get(t) or {}).get(k) for k in ("LTOKEN", "ENDFIELD_CRED"))]
+        print(f"- {rec['file']}: {', '.join(found) if found else 'nothing found'} ({rec.get('elapsed_s')}s)")
+
+    print(f"Watching {directory} for .har files -> {out}{'' if args.raw else ' (masked; use --raw for raw values)'}")
+    try:
+        n = watch_dir(
+            directory,
+            out,
+            extract=extract_all_from_har,
+            show=(lambda v: v) if args.raw else mask,
+            interval_s=max(0.1, args.watch_interval),
+            once=args.watch_once,
+            on_record=on_record,
+        )
+    except KeyboardInterrupt:
+        return 0
+    print(f"processed: {n}")
+    return 0
+
+
+def export_jar(args: argparse.Namespace) -> int:
+    from browser_cookies_windows import export_cookies_from_profile, find_default_profile, taskkill_browser
+    from cookie_jar import DEFAULT_DOMAINS, write_jar
+
+    pause = not args.no_pause
+    out = Path(args.export_jar).expanduser()
+    fmt = args.export_format
+    if fmt == "auto":
+        fmt = "har" if out.suffix.lower() == ".json" else "netscape"
+    try:
+        profile = find_default_profile(args.browser, args.profile_directory)
+        if args.kill_browser:
+            taskkill_browser(profile.name)
+        started = time.monotonic()
+        cookies, failed = export_cookies_from_profile(profile, domains=None if args.all_domains else DEFAULT_DOMAINS)
+        elapsed = time.monotonic() - started
+    except Exception as e:
+        print(f"ERROR: {e}")
         pause_exit(pause)
-        return 0 if values.get("ENDFIELD_CRED") and values.get("ENDFIELD_SK_GAME_ROLE") else 1
+        return 1
 
-    print(f"ERROR: Unknown target: {target}")
+    with open(out, "w", encoding="utf-8", newline="\n") as f:
+        write_jar(cookies, f, fmt)
+    print(f"Exported {len(cookies)} cookies ({fmt}) from {profile.name}/{profile.profile_dir} in {elapsed:.2f}s: {out}")
+    if failed:
+        print(f"NOTE: {failed} cookies could not be decrypted (v20 app-bound encryption?) and were skipped.")
+    print("NOTE: The file contains raw session cookies. Keep it private.")
     pause_exit(pause)
-    return 1
+    return 0
 
 
 def main() -> int:
@@ -204,7 +295,11 @@ def main() -> int:
     ap.add_argument("--url", default=None, help="Target URL. If set, overrides --preset.")
     ap.add_argument("--target", choices=["auto", "hoyolab", "endfield"], default="auto", help="Override auto detection by URL host.")
     ap.add_argument("--source", choices=["har", "browser"], default="har", help="Where to read values from (default: har).")
-    ap.add_argument("--har", default=None, help="Path to HAR file exported from browser DevTools (required for --source har).")
+    ap.add_argument(
+        "--har",
+        default=None,
+        help="Path to HAR file exported from browser DevTools (required for --source har). .har.gz/.har.zst/.zip are also accepted.",
+    )
     ap.add_argument("--list-games", action="store_true", help="List game numbers/URLs and exit.")
 
     # Browser options (only used with --source browser)
@@ -215,11 +310,25 @@ def main() -> int:
     kill_group.add_argument("--kill-browser", dest="kill_browser", action="store_true", help="Taskkill the target browser before reading cookie DB.")
     kill_group.add_argument("--no-kill-browser", dest="kill_browser", action="store_false", help=argparse.SUPPRESS)  # backward compat
     ap.set_defaults(kill_browser=False)
+    ap.add_argument("--watch", default=None, metavar="DIR", help="Watch DIR for new .har files and append extracted values to JSONL.")
+    ap.add_argument("--watch-out", default=None, help="JSONL output for --watch (default: DIR/cookiegrab-watch.jsonl).")
+    ap.add_argument("--watch-interval", type=float, default=1.0, help="Polling interval in seconds for --watch.")
+    ap.add_argument("--watch-once", action="store_true", help="Process new files once and exit instead of watching.")
+    ap.add_argument("--export-jar", default=None, help="Export the browser cookie jar to this file and exit.")
+    ap.add_argument("--export-format", choices=["auto", "netscape", "har"], default="auto", help="Jar format (auto: .json -> har, else netscape).")
+    ap.add_argument("--all-domains", action="store_true", help="Export cookies for every domain, not only HoYoLAB/SKPort.")
 
     ap.add_argument("--raw", action="store_true", help="Print raw values to console.")
+    ap.add_argument("--no-cache", action="store_true", help="Do not read or write the local HAR extraction cache.")
     ap.add_argument("--no-pause", action="store_true", help="Do not wait for Enter before exit.")
+    add_profile_args(ap)
     args = ap.parse_args()
 
+    with profile_run("cookiegrab" if args.profile else None, args.profile_out):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
     pause = not args.no_pause
 
     if args.list_games:
@@ -238,6 +347,12 @@ def main() -> int:
             print(f"- {p.name}: {p.profile_dir} ({p.user_data_dir})")
         return 0
 
+    if args.export_jar:
+        return export_jar(args)
+
+    if args.watch:
+        return watch_hars(args)
+
     # Resolve selector in this order:
     # 1) --url
     # 2) positional select (URL or id/name)
@@ -294,10 +409,12 @@ def main() -> int:
                 print("ERROR: HAR file path is required (use --har or pass as 2nd argument).")
                 pause_exit(pause)
                 return 1
-        return run_from_har(target=target, har_path=str(har_path), raw=args.raw, pause=pause)
+        return run_from_har(target=target, har_path=str(har_path), raw=args.raw, pause=pause, use_cache=not args.no_cache)
 
     # --source browser (best-effort; may fail on v20 app-bound cookie encryption)
     if target == "hoyolab":
+        from grab_hoyolab_cookies_lib import run_cookie_grab
+
         return run_cookie_grab(
             url=url,
             browser=args.browser,
@@ -312,6 +429,8 @@ def main() -> int:
     if target == "endfield":
         print("NOTE: Endfield requires ENDFIELD_SK_GAME_ROLE (request header).")
         print("      Offline mode can show cred and role ids, but HAR mode is recommended for exact header values.")
+        from grab_endfield_cred_lib import run_endfield_cred_grab
+
         return run_endfield_cred_grab(
             browser=args.browser,
             profile_directory=args.profile_directory,
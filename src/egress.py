@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+# Egress pool: spread accounts over several proxies / source addresses.
+#
+#   CHECKIN_EGRESS=http://10.0.0.1:3128,http://10.0.0.2:3128,source:192.0.2.10,direct
+#   CHECKIN_EGRESS_RPS=2        requests per second per egress (0 = unlimited)
+#   CHECKIN_EGRESS_BURST=2      token bucket size
+#
+# Each account sticks to one egress by rendezvous hashing, so adding or losing an egress only
+# moves the accounts that were on it. An egress that fails CHECKIN_EGRESS_MAX_FAILS times in a row
+# is taken out for CHECKIN_EGRESS_COOLDOWN_S seconds; its accounts move to their next choice.
+
+DEFAULT_RPS = 2.0
+DEFAULT_MAX_FAILS = 3
+DEFAULT_COOLDOWN_S = 60.0
+
+_account: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("egress_account", default=None)
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        # Blocks until a token is available; False if that would take longer than timeout.
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Reserve the token now (tokens may go negative) so waiters queue fairly.
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if timeout is not None and wait > timeout:
+                return False
+            self._tokens -= 1
+        if wait > 0:
+            self._sleep(wait)
+        return True
+
+
+@dataclass
+class Egress:
+    name: str
+    proxy: Optional[str] = None
+    source_address: Optional[str] = None
+    limiter: TokenBucket = field(default_factory=lambda: TokenBucket(0, 1))
+    max_fails: int = DEFAULT_MAX_FAILS
+    cooldown_s: float = DEFAULT_COOLDOWN_S
+    fails: int = 0
+    down_until: float = 0.0
+    requests: int = 0
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def healthy(self, now: Optional[float] = None) -> bool:
+        return (self.clock() if now is None else now) >= self.down_until
+
+    def report(self, ok: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.fails = 0
+                return
+            self.fails += 1
+            if self.fails >= self.max_fails:
+                self.down_until = self.clock() + self.cooldown_s
+                self.fails = 0
+
+
+def parse_egress(spec: str) -> Egress:
+    s = spec.strip()
+    if s == "direct":
+        return Egress(name="direct")
+    if s.startswith("source:"):
+        return Egress(name=s, source_address=s[len("source:") :])
+    if "://" not in s:
+        raise RuntimeError(f"CHECKIN_EGRESS: expected proxy URL, source:<ip> or direct, got {spec!r}")
+    return Egress(name=s, proxy=s)
+
+
+def _score(account: str, egress: Egress) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{egress.name}|{account}".encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class EgressPool:
+    def __init__(self, egresses: list[Egress]) -> None:
+        if not egresses:
+            raise RuntimeError("EgressPool needs at least one egress")
+        self.egresses = egresses
+
+    @classmethod
+    def from_env(cls, clock: Callable[[], float] = time.monotonic) -> Optional["EgressPool"]:
+        raw = os.getenv("CHECKIN_EGRESS", "").strip()
+        if not raw:
+            return None
+        rps = float(os.getenv("CHECKIN_EGRESS_RPS", "") or DEFAULT_RPS)
+        burst = float(os.getenv("CHECKIN_EGRESS_BURST", "") or max(1.0, rps))
+        max_fails = int(os.getenv("CHECKIN_EGRESS_MAX_FAILS", "") or DEFAULT_MAX_FAILS)
+        cooldown = float(os.getenv("CHECKIN_EGRESS_COOLDOWN_S", "") or DEFAULT_COOLDOWN_S)
+        out = []
+        for spec in raw.split(","):
+            if not spec.strip():
+                continue
+            e = parse_egress(spec)
+            e.limiter = TokenBucket(rps, burst, clock)
+            e.max_fails = max(1, max_fails)
+            e.cooldown_s = cooldown
+            e.clock = clock
+            out.append(e)
+        return cls(out)
+
+    def pick(self, account: Optional[str]) -> Egress:
+        # Highest-score healthy egress for this account; if all are down, the one back soonest.
+        key = account or ""
+        ranked = sorted(self.egresses, key=lambda e: _score(key, e), reverse=True)
+        for e in ranked:
+            if e.healthy():
+                return e
+        return min(ranked, key=lambda e: e.down_until)
+
+
+_pool: Optional[EgressPool] = None
+_pool_loaded = False
+_pool_lock = threading.Lock()
+
+
+def active_pool() -> Optional[EgressPool]:
+    global _pool, _pool_loaded
+    with _pool_lock:
+        if not _pool_loaded:
+            _pool = EgressPool.from_env()
+            _pool_loaded = True
+        return _pool
+
+
+@contextmanager
+def account_context(account: str) -> Iterator[None]:
+    # Requests made inside this block (same thread / task) use the account's egress.
+    token = _account.set(account)
+    try:
+        yield
+    finally:
+        _account.reset(token)
+
+
+def current_egress() -> Optional[Egress]:
+    pool = active_pool()
+    if pool is None:
+        return None
+    return pool.pick(_account.get())
@@ -1,112 +1,17 @@
+import argparse
 import os
 import json
 import time
-import hmac
-import hashlib
-import urllib.request
-import urllib.error
-
-
-ZONAI_ORIGIN = "https://game.skport.com"
-REFRESH_URL = "https://zonai.skport.com/web/v1/auth/refresh"
-ATTEND_PATH = "/web/v1/game/endfield/attendance"
-ATTEND_URL = "https://zonai.skport.com" + ATTEND_PATH
-
-
-def _http(method: str, url: str, headers: dict, body: bytes | None = None, timeout: int = 20) -> tuple[int, str]:
-    req = urllib.request.Request(url, data=body, method=method.upper())
-    for k, v in headers.items():
-        req.add_header(k, v)
-
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            status = getattr(resp, "status", 200)
-            text = resp.read().decode("utf-8", errors="replace")
-            return status, text
-    except urllib.error.HTTPError as e:
-        # HTTP errorでもボディは返ってくることがある
-        text = e.read().decode("utf-8", errors="replace")
-        return e.code, text
-
-
-def refresh_token(cred: str, platform: str, vname: str) -> str:
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "application/json, text/plain, */*",
-        "cred": cred,
-        "platform": platform,
-        "vName": vname,
-        "Origin": ZONAI_ORIGIN,
-        "Referer": ZONAI_ORIGIN + "/",
-    }
-    status, text = _http("GET", REFRESH_URL, headers, body=None)
-    try:
-        j = json.loads(text)
-    except json.JSONDecodeError:
-        raise RuntimeError(f"refresh: non-json (HTTP {status}): {text[:200]}")
-
-    if j.get("code") == 0 and isinstance(j.get("data"), dict) and j["data"].get("token"):
-        return str(j["data"]["token"])
-
-    raise RuntimeError(f"refresh failed: HTTP {status}, code={j.get('code')}, msg={j.get('message')}")
-
-
-def generate_sign(path: str, body_str: str, timestamp: str, token: str, platform: str, vname: str) -> str:
-    # gistの文字列形式に合わせる（スペース無し）
-    header_json = f'{{"platform":"{platform}","timestamp":"{timestamp}","dId":"","vName":"{vname}"}}'
-    msg = path + body_str + timestamp + header_json
-
-    h = hmac.new(token.encode("utf-8"), msg.encode("utf-8"), hashlib.sha256).hexdigest()
-    return hashlib.md5(h.encode("utf-8")).hexdigest()
-
-
-def claim_once(name: str, cred: str, sk_game_role: str, platform: str = "3", vname: str = "1.0.0") -> dict:
-    ts = str(int(time.time()))
-
-    token = refresh_token(cred, platform, vname)
-    sign = generate_sign(ATTEND_PATH, "", ts, token, platform, vname)
-
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "*/*",
-        "Referer": ZONAI_ORIGIN + "/",
-        "Origin": ZONAI_ORIGIN,
-        "Content-Type": "application/json",
-        "sk-language": os.getenv("ENDFIELD_LANG", "en"),
-        "sk-game-role": sk_game_role,
-        "cred": cred,
-        "platform": platform,
-        "vName": vname,
-        "timestamp": ts,
-        "sign": sign,
-    }
-
-    # gist側はbody無しで叩いている（UrlFetchApp.fetchでpayload未指定）流れに合わせる
-    status, text = _http("POST", ATTEND_URL, headers, body=None)
-
-    try:
-        j = json.loads(text)
-    except json.JSONDecodeError:
-        return {"name": name, "ok": False, "http": status, "error": f"non-json: {text[:200]}"}
-
-    code = j.get("code")
-    if code == 0:
-        # 報酬の整形（あれば）
-        awards = []
-        data = j.get("data") or {}
-        award_ids = data.get("awardIds") or []
-        rim = data.get("resourceInfoMap") or {}
-        for a in award_ids:
-            _id = a.get("id") if isinstance(a, dict) else a
-            r = rim.get(str(_id)) or rim.get(_id)
-            if isinstance(r, dict) and r.get("name") is not None:
-                awards.append(f'{r.get("name")} x{r.get("count")}')
-        return {"name": name, "ok": True, "http": status, "code": code, "status": "claimed", "awards": awards}
-
-    if code == 10001:
-        return {"name": name, "ok": True, "http": status, "code": code, "status": "already-claimed"}
-
-    return {"name": name, "ok": False, "http": status, "code": code, "error": j.get("message")}
+
+import requests
+
+from checkin_client import ATTEND_URL, EndfieldClient, EndfieldCredentials
+from egress import account_context
+from job_queue import JobQueue, RetryPolicy, is_transient_result, workers_from_env
+from metrics import emit_metrics
+from profiling import add_profile_args, profile_run
+from run_deadline import Deadline
+from run_history import HistoryStore
 
 
 def load_profiles() -> list[dict]:
@@ -121,8 +26,8 @@ def load_profiles() -> list[dict]:
     # 2) 単一アカ
     cred = os.getenv("ENDFIELD_CRED", "").strip()
     role = os.getenv("ENDFIELD_SK_GAME_ROLE", "").strip()
-    if not cred or not role:
-        raise RuntimeError("ENDFIELD_CRED / ENDFIELD_SK_GAME_ROLE is required (or ENDFIELD_PROFILES_JSON)")
+    if not cred:
+        raise RuntimeError("ENDFIELD_CRED is required (or ENDFIELD_PROFILES_JSON)")
     return [{
         "accountName": os.getenv("ENDFIELD_ACCOUNT_NAME", "account"),
         "cred": cred,
@@ -132,22 +37,89 @@ def load_profiles() -> list[dict]:
     }]
 
 
-def main():
+def role_key(creds: EndfieldCredentials, index: int) -> str:
+    # 履歴DBなどで使うロール識別子（秘密情報は含めない）。accountName は既定値のままのことが多いので cred から作る
+    return f"{creds.key}#{index + 1}"
+
+
+def run_all() -> list[dict]:
     profiles = load_profiles()
-    results = []
+    # 実行全体の期限（CHECKIN_DEADLINE_AT / CHECKIN_DEADLINE_S）。未設定なら無制限。
+    deadline = Deadline.from_env()
+    # 実行履歴（CHECKIN_HISTORY_DB）
+    history = HistoryStore.from_env()
+    run_id = history.start_run("endfield") if history else ""
+    done = history.done_today() if history and os.getenv("CHECKIN_SKIP_DONE", "").strip() == "1" else set()
+    # プロファイルを (プロファイル, ロール) のジョブに展開する。ロール未指定なら自動検出
+    results: list[dict] = []
+    jobs: list[tuple[EndfieldClient, str, str, str]] = []
     for p in profiles:
-        name = p.get("accountName", "account")
+        client = EndfieldClient(EndfieldCredentials.from_profile(p), deadline=deadline)
+        name = client.creds.account_name
         try:
-            res = claim_once(
-                name=name,
-                cred=str(p["cred"]),
-                sk_game_role=str(p["skGameRole"]),
-                platform=str(p.get("platform", "3")),
-                vname=str(p.get("vName", "1.0.0")),
-            )
+            with account_context(client.creds.key):
+                roles = client.roles()
         except Exception as e:
-            res = {"name": name, "ok": False, "error": str(e)}
+            results.append({"name": name, "ok": False, "error": f"role discovery: {e}"})
+            continue
+        if not roles:
+            results.append({"name": name, "ok": False, "error": "role discovery: no Endfield role bound to this cred"})
+            continue
+        for k, role in enumerate(roles):
+            # ロールIDはログに出さないよう、複数ロールは番号で区別する
+            # 表示名は重複しうるので、履歴とスキップ判定は role_key で行う
+            label = name if len(roles) == 1 else f"{name}#{k + 1}"
+            key = role_key(client.creds, k)
+            if (key, "endfield") in done:
+                results.append({"name": label, "account": key, "ok": True, "status": "already-claimed", "note": "skipped: claimed earlier today"})
+            else:
+                jobs.append((client, role, label, key))
+
+    def _run(job: tuple[EndfieldClient, str, str, str], attempt: int) -> dict:
+        client, role, label, key = job
+        started = time.monotonic()
+        try:
+            # 同じアカウントの通信は同じ egress から出す（CHECKIN_EGRESS）
+            with account_context(client.creds.key):
+                # 同じ cred の全ロールで refresh 済み token を共有（再試行時は取り直す）
+                res = client.sign(role, name=label, refresh=attempt > 1)
+        except Exception as e:
+            res = {"name": label, "ok": False, "error": str(e), "transient": isinstance(e, requests.RequestException)}
+        res["account"] = key
+        res["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return res
+
+    def _skip(job: tuple[EndfieldClient, str, str, str]) -> dict:
+        return {"name": job[2], "account": job[3], "ok": False, "error": "skipped: run deadline reached"}
+
+    # 一時的な失敗は遅延キューの後ろに回し、その間ワーカーは次のジョブを処理する
+    queue = JobQueue(jobs, _run, is_transient=is_transient_result, on_skip=_skip, deadline=deadline, policy=RetryPolicy.from_env())
+    for res in queue.run(workers_from_env()):
         results.append(res)
+        if history:
+            history.record(run_id, res["account"], "endfield", {**res, "endpoint": ATTEND_URL})
+    if history:
+        history.close()
+    return results
+
+
+def main():
+    # process_runner は本モジュールを import するので、ここで読み込む
+    from process_runner import process_count, run_endfield
+
+    ap = argparse.ArgumentParser(description="Endfield (SKPort) daily check-in.")
+    add_profile_args(ap)
+    ap.add_argument("--procs", type=int, default=None, help="Worker processes (default: CHECKIN_PROCS or 1; 0 = one per CPU).")
+    args = ap.parse_args()
+
+    procs = process_count(args.procs)
+    with profile_run("endfield_checkin" if args.profile else None, args.profile_out):
+        if procs > 1:
+            # 複数プロセスで実行（メトリクスは process_runner がワーカー分を集計して出力）
+            results = run_endfield(procs)
+        else:
+            results = run_all()
+            emit_metrics()
 
     print("== Endfield daily check-in results ==")
     print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -1,8 +1,10 @@
 import argparse
-import json
 import sys
 from pathlib import Path
 
+from har_stream import load_har_requests
+from profiling import add_profile_args, profile_run
+
 
 def mask(v: str) -> str:
     if not v:
@@ -106,11 +108,21 @@ def main() -> int:
     ap = argparse.ArgumentParser(
         description="Extract Endfield (SKPort) headers from a DevTools-exported HAR file (no WebDriver)."
     )
-    ap.add_argument("--har", required=True, help="Path to HAR file exported from browser DevTools Network tab.")
+    ap.add_argument(
+        "--har",
+        required=True,
+        help="Path to HAR file exported from browser DevTools Network tab (.har, .har.gz, .har.zst or .zip).",
+    )
     ap.add_argument("--raw", action="store_true", help="Print raw values to console.")
     ap.add_argument("--no-pause", action="store_true", help="Do not wait for Enter before exit.")
+    add_profile_args(ap)
     args = ap.parse_args()
 
+    with profile_run("endfieldgrab_har" if args.profile else None, args.profile_out):
+        return _run(args)
+
+
+def _run(args: argparse.Namespace) -> int:
     har_path = Path(args.har).expanduser()
     if not har_path.exists():
         print(f"ERROR: HAR not found: {har_path}")
@@ -118,7 +130,7 @@ def main() -> int:
         return 1
 
     try:
-        har = json.loads(har_path.read_text(encoding="utf-8"))
+        har = load_har_requests(har_path)
     except Exception as e:
         print(f"ERROR: Failed to parse HAR: {e}")
         pause_exit(not args.no_pause)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from checkin_client import HoyolabClient, HoyolabCredentials
+from egress import account_context
+from json_cache import cache_at
+from reward_catalog import cache_dir
+from run_deadline import Deadline
+from single_flight import SingleFlight
+
+# Per-account HoYoLAB game ownership, so the planner only emits (account, game) jobs that can
+# succeed.
+#
+#   CHECKIN_OWNERSHIP=0               disable (sign every game)
+#   CHECKIN_OWNERSHIP_TTL_S=2592000   entries older than this are rediscovered before planning
+#   CHECKIN_OWNERSHIP_REFRESH_S=86400 entries older than this are used, and refreshed in background
+#
+# Unknown ownership (lookup failed, empty record card) means "sign every game".
+
+DEFAULT_TTL_S = 30 * 24 * 3600
+DEFAULT_REFRESH_S = 24 * 3600
+
+
+def ownership_enabled() -> bool:
+    return os.getenv("CHECKIN_OWNERSHIP", "").strip() != "0"
+
+
+def _key(creds: HoyolabCredentials) -> str:
+    # ltuid is not a secret, but there is no need to keep it in the cache either.
+    return hashlib.sha256(creds.ltuid.encode("utf-8")).hexdigest()[:32]
+
+
+class OwnershipCache:
+    def __init__(self, path: Optional[Path] = None, ttl_s: Optional[float] = None, refresh_s: Optional[float] = None) -> None:
+        self.path = path or (cache_dir() / "game_ownership.json")
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("CHECKIN_OWNERSHIP_TTL_S", "") or DEFAULT_TTL_S)
+        self.refresh_s = refresh_s if refresh_s is not None else float(os.getenv("CHECKIN_OWNERSHIP_REFRESH_S", "") or DEFAULT_REFRESH_S)
+        self._cache = cache_at(self.path)
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._threads: list[threading.Thread] = []
+        self._flight: SingleFlight[Optional[set[str]]] = SingleFlight()
+
+    def _store(self, key: str, games: set[str]) -> None:
+        self._cache.put(key, {"games": sorted(games), "at": time.time()})
+
+    def _discover(self, creds: HoyolabCredentials, deadline: Optional[Deadline]) -> Optional[set[str]]:
+        # Duplicate accounts (same ltuid) share one lookup.
+        def _fetch() -> Optional[set[str]]:
+            with account_context(creds.key):
+                return HoyolabClient(creds, deadline=deadline).owned_games()
+
+        games, shared = self._flight.do(_key(creds), _fetch)
+        if games and not shared:
+            self._store(_key(creds), games)
+        return games
+
+    def _refresh_in_background(self, creds: HoyolabCredentials, deadline: Optional[Deadline]) -> None:
+        key = _key(creds)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        ctx = contextvars.copy_context()
+        t = threading.Thread(target=ctx.run, args=(self._discover, creds, deadline), name="ownership-refresh", daemon=True)
+        self._threads.append(t)
+        t.start()
+
+    def owned(self, creds: HoyolabCredentials, deadline: Optional[Deadline] = None) -> Optional[set[str]]:
+        ent = self._cache.get(_key(creds))
+        if isinstance(ent, dict) and ent.get("games"):
+            age = time.time() - float(ent.get("at", 0))
+            if age < self.ttl_s:
+                if age >= self.refresh_s:
+                    self._refresh_in_background(creds, deadline)
+                return set(ent["games"])
+        return self._discover(creds, deadline)
+
+    def wait(self, timeout: float) -> None:
+        # Give background refreshes a chance to land before a short-lived process exits.
+        end = time.monotonic() + max(0.0, timeout)
+        for t in self._threads:
+            t.join(max(0.0, end - time.monotonic()))
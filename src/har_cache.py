@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+# Local cache of HAR extraction results, so re-running cookiegrab on the same HAR
+# (with another target or --raw) does not parse the whole file again.
+#
+# Entries are keyed by file size, mtime and a sampled content hash. Values are stored
+# encrypted (Fernet, key file next to the cache) only when --raw was used; otherwise
+# only masked values are kept.
+
+CACHE_VERSION = 1
+MAX_ENTRIES = 64
+SAMPLE_BLOCK = 64 * 1024
+SAMPLE_COUNT = 16
+
+
+def cache_dir() -> Path:
+    override = os.getenv("COOKIEGRAB_CACHE_DIR", "").strip()
+    if override:
+        return Path(override).expanduser()
+    if sys.platform == "win32" and os.getenv("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "cookiegrab" / "har_cache"
+    base = os.getenv("XDG_CACHE_HOME", "").strip() or str(Path.home() / ".cache")
+    return Path(base) / "cookiegrab" / "har_cache"
+
+
+def _fast_hash(path: Path, size: int) -> str:
+    # Hash the head, tail and evenly spaced blocks instead of the whole file.
+    h = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as f:
+        if size <= SAMPLE_BLOCK * (SAMPLE_COUNT + 2):
+            h.update(f.read())
+        else:
+            step = (size - SAMPLE_BLOCK) // (SAMPLE_COUNT + 1)
+            for i in range(SAMPLE_COUNT + 2):
+                f.seek(min(i * step, size - SAMPLE_BLOCK))
+                h.update(f.read(SAMPLE_BLOCK))
+    return h.hexdigest()
+
+
+def cache_key(path: Path) -> str:
+    st = path.stat()
+    ident = f"{st.st_size}:{st.st_mtime_ns}:{_fast_hash(path, st.st_size)}"
+    return hashlib.blake2b(ident.encode("ascii"), digest_size=20).hexdigest()
+
+
+def _fernet(create: bool) -> Optional[Fernet]:
+    kp = cache_dir() / "key"
+    if kp.exists():
+        return Fernet(kp.read_bytes().strip())
+    if not create:
+        return None
+    kp.parent.mkdir(parents=True, exist_ok=True)
+    key = Fernet.generate_key()
+    fd = os.open(str(kp), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return Fernet(key)
+
+
+def _mask(v: str) -> str:
+    if not v:
+        return ""
+    if len(v) <= 8:
+        return "*" * len(v)
+    return f"{v[:4]}...{v[-4:]}"
+
+
+def lookup(path: Path, *, raw: bool) -> Optional[tuple[dict[str, dict[str, str]], bool]]:
+    # Returns ({target: values}, masked) or None on a miss.
+    # A masked-only entry cannot serve a --raw request and counts as a miss.
+    try:
+        entry = json.loads((cache_dir() / f"{cache_key(path)}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if entry.get("version") != CACHE_VERSION:
+        return None
+
+    if entry.get("encrypted"):
+        try:
+            f = _fernet(create=False)
+            if f is None:
+                return None
+            return json.loads(f.decrypt(entry["values"].encode("ascii"))), False
+        except (InvalidToken, ValueError, KeyError):
+            return None
+
+    if raw:
+        return None
+    return entry.get("values") or {}, True
+
+
+def store(path: Path, values: dict[str, dict[str, str]], *, raw: bool) -> None:
+    d = cache_dir()
+    try:
+        d.mkdir(parents=True, exist_ok=True)
+        entry: dict = {"version": CACHE_VERSION, "encrypted": raw}
+        if raw:
+            f = _fernet(create=True)
+            entry["values"] = f.encrypt(json.dumps(values).encode("utf-8")).decode("ascii")
+        else:
+            entry["values"] = {t: {k: _mask(v) for k, v in vs.items()} for t, vs in values.items()}
+        (d / f"{cache_key(path)}.json").write_text(json.dumps(entry), encoding="utf-8")
+        _prune(d)
+    except OSError:
+        # Cache is an optimization only.
+        pass
+
+
+def _prune(d: Path) -> None:
+    entries = sorted(d.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in entries[MAX_ENTRIES:]:
+        try:
+            p.unlink()
+        except OSError:
+            pass
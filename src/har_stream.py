@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import codecs
+import gzip
+import json
+import mmap
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+# Streaming HAR reader.
+#
+# Accepts plain .har as well as gzip (.har.gz), zstd (.har.zst) and .zip archives, detected by
+# magic bytes. Entries are decoded one at a time from the decompressed stream, so neither the
+# inflated file nor the full JSON document is ever held in memory.
+
+CHUNK_SIZE = 1024 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_ZIP_MAGIC = b"PK\x03\x04"
+
+_ENTRIES_RE = re.compile(r'"entries"\s*:\s*\[')
+
+
+@contextmanager
+def open_har_binary(path: Path) -> Iterator[BinaryIO]:
+    with path.open("rb") as raw:
+        magic = raw.read(4)
+        raw.seek(0)
+
+        if magic.startswith(_GZIP_MAGIC):
+            with gzip.GzipFile(fileobj=raw) as f:
+                yield f
+            return
+
+        if magic == _ZSTD_MAGIC:
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("Reading .har.zst requires the 'zstandard' package (pip install zstandard).")
+            with zstandard.ZstdDecompressor().stream_reader(raw) as f:
+                yield f
+            return
+
+        if magic == _ZIP_MAGIC:
+            with zipfile.ZipFile(raw) as zf:
+                names = [n for n in zf.namelist() if not n.endswith("/")]
+                hars = [n for n in names if n.lower().endswith(".har")]
+                if not hars and len(names) != 1:
+                    raise RuntimeError(f"No .har file found in zip: {path}")
+                with zf.open((hars or names)[0]) as f:
+                    yield f
+            return
+
+        yield raw
+
+
+def iter_har_entries(fp: BinaryIO) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buf = ""
+    eof = False
+
+    def _fill(min_chars: int) -> None:
+        nonlocal buf, eof
+        want = len(buf) + max(min_chars, 1)
+        while not eof and len(buf) < want:
+            chunk = fp.read(CHUNK_SIZE)
+            if not chunk:
+                buf += text.decode(b"", final=True)
+                eof = True
+                break
+            buf += text.decode(chunk)
+
+    # Find the start of log.entries.
+    pos = -1
+    while True:
+        m = _ENTRIES_RE.search(buf)
+        if m:
+            pos = m.end()
+            break
+        if eof:
+            return
+        # Keep a small tail in case the key spans two chunks.
+        buf = buf[-64:]
+        _fill(CHUNK_SIZE)
+
+    buf = buf[pos:]
+    pos = 0
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            _fill(CHUNK_SIZE)
+        if pos >= len(buf) or buf[pos] == "]":
+            return
+
+        try:
+            ent, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Entry not complete yet: at least double the buffered text before retrying,
+            # so a large entry costs O(size) in total rather than O(size^2).
+            buf = buf[pos:]
+            pos = 0
+            _fill(max(len(buf), CHUNK_SIZE))
+            continue
+
+        if isinstance(ent, dict):
+            yield ent
+        pos = end
+        if pos > CHUNK_SIZE:
+            buf = buf[pos:]
+            pos = 0
+
+
+# Byte patterns that every request the extractors can use contains (cookie / Endfield headers,
+# HoYoLAB / SKPort URLs). Header names appear both lowercased (HTTP/2) and capitalized.
+PREFILTER_NEEDLES = (b'"cookie"', b'"Cookie"', b'"cred"', b'"sk-game-role"', b"hoyolab.com", b"skport.com")
+# Inside a JSON string every quote is escaped, so this byte sequence only occurs as a real key.
+_REQUEST_KEY = b'"request"'
+_WINDOW = 8 * 1024
+
+
+def _decode_request_at(mm: mmap.mmap, key_pos: int, decoder: json.JSONDecoder) -> Optional[tuple[dict, int, int]]:
+    # Decode the object following '"request":' at key_pos; (request, start, end) in bytes.
+    start = key_pos + len(_REQUEST_KEY)
+    while start < len(mm) and mm[start : start + 1] in b" \t\r\n:":
+        start += 1
+    if mm[start : start + 1] != b"{":
+        return None
+    size = _WINDOW
+    while True:
+        text = mm[start : start + size].decode("utf-8", errors="replace")
+        try:
+            obj, end = decoder.raw_decode(text)
+        except json.JSONDecodeError:
+            if start + size >= len(mm):
+                return None
+            size *= 4
+            continue
+        if not isinstance(obj, dict):
+            return None
+        return obj, start, start + len(text[:end].encode("utf-8"))
+
+
+def _prefiltered_requests(path: Path, needles: tuple[bytes, ...]) -> Optional[list[dict]]:
+    # None = not applicable (compressed or empty file); callers then parse the whole HAR.
+    # Only the request objects are decoded (response bodies, usually most of the file, are
+    # skipped by byte search), and only those containing a needle are kept.
+    with path.open("rb") as f:
+        magic = f.read(4)
+        if not magic or magic.startswith(_GZIP_MAGIC) or magic in (_ZSTD_MAGIC, _ZIP_MAGIC):
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            decoder = json.JSONDecoder()
+            found: list[dict] = []
+            pos = mm.find(_REQUEST_KEY)
+            while pos >= 0:
+                dec = _decode_request_at(mm, pos, decoder)
+                if dec is None:
+                    pos = mm.find(_REQUEST_KEY, pos + 1)
+                    continue
+                req, start, end = dec
+                span = mm[start:end]
+                if isinstance(req.get("headers"), list) and "url" in req and any(n in span for n in needles):
+                    found.append({"request": {"url": req.get("url", ""), "headers": req.get("headers") or []}})
+                pos = mm.find(_REQUEST_KEY, end)
+            return found
+
+
+def load_har_requests(path: Path, *, prefilter: bool = True) -> dict:
+    # HAR-shaped dict holding only request url/headers; response bodies are dropped while streaming.
+    #
+    # With prefilter (default; COOKIEGRAB_HAR_PREFILTER=0 disables) an uncompressed HAR is
+    # memory-mapped and only its request objects are decoded; requests without any of
+    # PREFILTER_NEEDLES are dropped. If that finds nothing, the whole file is parsed.
+    if prefilter and os.getenv("COOKIEGRAB_HAR_PREFILTER", "").strip() != "0":
+        try:
+            found = _prefiltered_requests(path, PREFILTER_NEEDLES)
+        except (OSError, ValueError):
+            found = None
+        if found:
+            return {"log": {"entries": found}}
+
+    entries: list[dict] = []
+    with open_har_binary(path) as f:
+        for ent in iter_har_entries(f):
+            req = ent.get("request") or {}
+            if not isinstance(req, dict):
+                continue
+            entries.append({"request": {"url": req.get("url", ""), "headers": req.get("headers") or []}})
+    return {"log": {"entries": entries}}
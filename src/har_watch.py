@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from har_stream import load_har_requests
+
+# Watch a directory (e.g. Downloads) for exported HARs and append extracted values to JSONL.
+#
+# Polls with os.scandir (one syscall batch per interval, no extra dependencies). A file is parsed
+# once its size and mtime stay unchanged for one interval, i.e. the browser has finished writing
+# it. Seen files are remembered in <out>.state.json by (size, mtime_ns), so restarts do not
+# re-parse them; a file that changes is processed again.
+
+# Same formats as har_stream.open_har_binary (a .zip is read from its .har member).
+HAR_SUFFIXES = (".har", ".har.gz", ".har.zst", ".zip")
+DEFAULT_INTERVAL_S = 1.0
+
+
+def is_har_name(name: str) -> bool:
+    n = name.lower()
+    return n.endswith(HAR_SUFFIXES)
+
+
+@dataclass(frozen=True)
+class FileSig:
+    size: int
+    mtime_ns: int
+
+
+def _scan(directory: Path) -> dict[str, FileSig]:
+    out: dict[str, FileSig] = {}
+    try:
+        with os.scandir(directory) as it:
+            for e in it:
+                if not is_har_name(e.name):
+                    continue
+                try:
+                    if not e.is_file():
+                        continue
+                    st = e.stat()
+                except OSError:
+                    continue
+                out[e.name] = FileSig(st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return out
+
+
+class SeenState:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.seen: dict[str, FileSig] = {}
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+            self.seen = {k: FileSig(int(v[0]), int(v[1])) for k, v in raw.items()}
+        except (OSError, ValueError, TypeError, IndexError):
+            pass
+
+    def is_new(self, name: str, sig: FileSig) -> bool:
+        return self.seen.get(name) != sig
+
+    def mark(self, name: str, sig: FileSig) -> None:
+        self.seen[name] = sig
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({k: [v.size, v.mtime_ns] for k, v in self.seen.items()}), encoding="utf-8")
+        tmp.replace(self.path)
+
+
+def process_file(path: Path, extract: Callable[[dict], dict], show: Callable[[str], str]) -> dict:
+    rec: dict = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "file": str(path)}
+    started = time.monotonic()
+    try:
+        values = extract(load_har_requests(path))
+    except Exception as e:
+        rec["error"] = str(e)
+        return rec
+    rec["elapsed_s"] = round(time.monotonic() - started, 3)
+    for target, vals in values.items():
+        rec[target] = {k: show(v) if v else "" for k, v in vals.items()}
+    return rec
+
+
+def watch_dir(
+    directory: Path,
+    out_path: Path,
+    *,
+    extract: Callable[[dict], dict],
+    show: Callable[[str], str],
+    interval_s: float = DEFAULT_INTERVAL_S,
+    once: bool = False,
+    on_record: Optional[Callable[[dict], None]] = None,
+) -> int:
+    # Returns the number of files processed (loops forever unless once=True).
+    state = SeenState(out_path.with_name(out_path.name + ".state.json"))
+    pending: dict[str, FileSig] = {}
+    processed = 0
+    while True:
+        current = _scan(directory)
+        ready: list[tuple[str, FileSig]] = []
+        for name, sig in current.items():
+            if not state.is_new(name, sig):
+                pending.pop(name, None)
+                continue
+            # Stable for one interval (or --once) -> the export is complete.
+            if once or pending.get(name) == sig:
+                ready.append((name, sig))
+            else:
+                pending[name] = sig
+        for name in list(pending):
+            if name not in current:
+                del pending[name]
+
+        for name, sig in sorted(ready, key=lambda x: x[1].mtime_ns):
+            rec = process_file(directory / name, extract, show)
+            with open(out_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            state.mark(name, sig)
+            pending.pop(name, None)
+            processed += 1
+            if on_record:
+                on_record(rec)
+
+        if once:
+            return processed
+        time.sleep(interval_s)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Optional, TypeVar
+
+# Hedged requests for idempotent GETs (token refresh, HoYoLAB info).
+#
+#   CHECKIN_HEDGE=1              enable
+#   CHECKIN_HEDGE_PCT=95         send a second copy when no response arrived by this percentile
+#                                of the host's recent latency
+#   CHECKIN_HEDGE_MIN_SAMPLES=20 no hedging until this many latencies are known for the host
+#   CHECKIN_HEDGE_BUDGET=0.1     at most this fraction of requests may be hedged
+#
+# Whichever copy finishes first wins; the other one is left to finish in the background and its
+# response is dropped. Callers must only hedge requests that are safe to send twice.
+
+DEFAULT_PCT = 95.0
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_BUDGET = 0.1
+WINDOW_SIZE = 256
+
+T = TypeVar("T")
+
+
+def hedging_enabled() -> bool:
+    return os.getenv("CHECKIN_HEDGE", "").strip() == "1"
+
+
+class LatencyWindow:
+    def __init__(self, size: int = WINDOW_SIZE) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency_s: float) -> None:
+        with self._lock:
+            self._samples.append(latency_s)
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            s = sorted(self._samples)
+        return s[min(len(s) - 1, int(round(pct / 100 * (len(s) - 1))))]
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_won = 0
+        self._lock = threading.Lock()
+
+    def count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def take_hedge(self, budget: float) -> bool:
+        with self._lock:
+            if self.hedged + 1 > budget * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def won(self) -> None:
+        with self._lock:
+            self.hedge_won += 1
+
+
+_windows: dict[str, LatencyWindow] = {}
+_stats = _Stats()
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _window(key: str) -> LatencyWindow:
+    with _lock:
+        w = _windows.get(key)
+        if w is None:
+            w = _windows[key] = LatencyWindow()
+        return w
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+        return _executor
+
+
+def _submit(fn: Callable[[], T]) -> "Future[T]":
+    # Copy the context so the account's egress (egress.account_context) follows the request.
+    return _pool().submit(contextvars.copy_context().run, fn)
+
+
+def stats() -> dict:
+    return {"requests": _stats.requests, "hedged": _stats.hedged, "hedge_won": _stats.hedge_won}
+
+
+def run_hedged(key: str, send: Callable[[], T]) -> T:
+    # key groups latencies (the request's host); send performs one complete request.
+    if not hedging_enabled():
+        return send()
+    win = _window(key)
+    _stats.count()
+
+    def attempt() -> T:
+        started = time.monotonic()
+        out = send()
+        win.add(time.monotonic() - started)
+        return out
+
+    delay = win.percentile(
+        float(os.getenv("CHECKIN_HEDGE_PCT", "") or DEFAULT_PCT),
+        int(os.getenv("CHECKIN_HEDGE_MIN_SAMPLES", "") or DEFAULT_MIN_SAMPLES),
+    )
+    if delay is None:
+        return attempt()
+
+    first = _submit(attempt)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+    if not _stats.take_hedge(float(os.getenv("CHECKIN_HEDGE_BUDGET", "") or DEFAULT_BUDGET)):
+        return first.result()
+
+    second = _submit(attempt)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                if f is second:
+                    _stats.won()
+                return f.result()
+    # Both copies failed: surface the original request's error.
+    return first.result()
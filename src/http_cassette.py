@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Optional
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+# Request/response recording for offline regression and profiling runs.
+#
+#   HTTP_CASSETTE=path/to/file.jsonl   cassette file (one interaction per line)
+#   HTTP_CASSETTE_MODE=record|replay   default: replay if the file exists, else record
+#   HTTP_CASSETTE_LATENCY=1.0          replay latency scale (0 = no sleep)
+#
+# Secrets (cookies, cred, token, signatures, account ids in URLs) are masked before anything is
+# written. Replay matches requests by the masked URL.
+
+MASKED = "<masked>"
+
+SECRET_HEADERS = {
+    "cookie",
+    "set-cookie",
+    "authorization",
+    "cred",
+    "token",
+    "sign",
+    "ds",
+    "sk-game-role",
+    "x-rpc-device_id",
+}
+SECRET_JSON_KEYS = {"token", "cred", "ltoken", "ltoken_v2", "cookie_token", "cookie_token_v2", "ltuid", "ltuid_v2"}
+# "uid" is the ltuid in the game record card query.
+SECRET_QUERY_KEYS = SECRET_JSON_KEYS | {"uid", "account_id", "account_id_v2"}
+
+
+class CassetteMiss(RuntimeError):
+    pass
+
+
+def _mask_cookie_header(v: str) -> str:
+    parts = []
+    for part in (v or "").split(";"):
+        p = part.strip()
+        if not p:
+            continue
+        k, _sep, _val = p.partition("=")
+        parts.append(f"{k.strip()}={MASKED}")
+    return "; ".join(parts)
+
+
+def mask_headers(headers: dict[str, str]) -> dict[str, str]:
+    out: dict[str, str] = {}
+    for k, v in headers.items():
+        kl = k.lower()
+        if kl in ("cookie", "set-cookie"):
+            out[k] = _mask_cookie_header(str(v))
+        elif kl in SECRET_HEADERS:
+            out[k] = MASKED
+        else:
+            out[k] = str(v)
+    return out
+
+
+def mask_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    out = []
+    for pair in parts.query.split("&"):
+        k, sep, v = pair.partition("=")
+        if sep and v and unquote_plus(k).lower() in SECRET_QUERY_KEYS:
+            pair = f"{k}={MASKED}"
+        out.append(pair)
+    return urlunsplit(parts._replace(query="&".join(out)))
+
+
+def _mask_json(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: (MASKED if str(k).lower() in SECRET_JSON_KEYS and v else _mask_json(v)) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_mask_json(v) for v in obj]
+    return obj
+
+
+def mask_body(text: str) -> str:
+    if not text:
+        return text
+    try:
+        j = json.loads(text)
+    except (json.JSONDecodeError, ValueError):
+        return text
+    return json.dumps(_mask_json(j), ensure_ascii=False, separators=(",", ":"))
+
+
+class Cassette:
+    def __init__(
+        self,
+        path: Path,
+        mode: str,
+        latency_scale: float = 1.0,
+        sink: Optional[Callable[[dict], None]] = None,
+    ) -> None:
+        # sink: in record mode, hand interactions to it instead of writing the file (the
+        # process_runner workers send them to the parent, which owns the file).
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._recorded: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        self._cursor: dict[tuple[str, str], int] = defaultdict(int)
+        if mode == "replay":
+            self._load()
+        elif sink is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("", encoding="utf-8")
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with self.path.open("r", encoding="utf-8") as f:
+            for raw in f:
+                line = raw.strip()
+                if not line:
+                    continue
+                it = json.loads(line)
+                # Older cassettes may hold unmasked URLs.
+                self._recorded[(it["method"], mask_url(it["url"]))].append(it)
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str],
+        body: Optional[str],
+        live: Callable[[], tuple[int, dict[str, str], str, float]],
+    ) -> tuple[int, dict[str, str], str, float]:
+        # Returns (status, response headers, text, elapsed seconds).
+        key = (method.upper(), mask_url(url))
+        if self.mode == "replay":
+            return self._replay(key)
+
+        status, resp_headers, text, elapsed = live()
+        it = {
+            "method": key[0],
+            "url": key[1],
+            "request_headers": mask_headers(headers),
+            "request_body": mask_body(body or ""),
+            "status": status,
+            "response_headers": mask_headers(resp_headers),
+            "response_body": mask_body(text),
+            "elapsed_s": round(elapsed, 6),
+        }
+        if self.sink is not None:
+            self.sink(it)
+        else:
+            self.append(it)
+        return status, resp_headers, text, elapsed
+
+    def append(self, it: dict) -> None:
+        with self._lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(it, ensure_ascii=False) + "\n")
+
+    def _replay(self, key: tuple[str, str]) -> tuple[int, dict[str, str], str, float]:
+        with self._lock:
+            items = self._recorded.get(key)
+            if not items:
+                raise CassetteMiss(f"cassette: no recorded response for {key[0]} {key[1]}")
+            # Exhausted keys cycle, so a small cassette can drive a large account list.
+            i = self._cursor[key]
+            self._cursor[key] = i + 1
+            it = items[i % len(items)]
+        elapsed = float(it.get("elapsed_s", 0.0))
+        if self.latency_scale > 0 and elapsed > 0:
+            time.sleep(elapsed * self.latency_scale)
+        return int(it["status"]), dict(it.get("response_headers") or {}), str(it.get("response_body", "")), elapsed
+
+
+_active: Optional[Cassette] = None
+_active_loaded = False
+_active_lock = threading.Lock()
+
+
+def use_cassette(cassette: Optional[Cassette]) -> None:
+    # Replaces the HTTP_CASSETTE lookup for this process (process_runner workers get the
+    # parent's cassette, whose mode was resolved once).
+    global _active, _active_loaded
+    with _active_lock:
+        _active = cassette
+        _active_loaded = True
+
+
+def active_cassette() -> Optional[Cassette]:
+    global _active, _active_loaded
+    with _active_lock:
+        if not _active_loaded:
+            _active_loaded = True
+            path = os.getenv("HTTP_CASSETTE", "").strip()
+            if path:
+                p = Path(path).expanduser()
+                mode = os.getenv("HTTP_CASSETTE_MODE", "").strip().lower() or ("replay" if p.exists() else "record")
+                scale = float(os.getenv("HTTP_CASSETTE_LATENCY", "") or 1.0)
+                _active = Cassette(p, mode, scale)
+        return _active
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import server_clock
+from concurrency import host_slot
+from egress import Egress, current_egress
+from hedging import run_hedged
+from http_cassette import active_cassette
+
+# HTTP_TRANSPORT=http2 multiplexes requests over one HTTP/2 connection per host (needs the
+# optional "httpx[http2]" package). Hosts that do not negotiate HTTP/2 fall back to the pooled
+# HTTP/1.1 requests session.
+#
+# With CHECKIN_EGRESS set (see egress.py) each request leaves through the egress of the current
+# account, after that egress's rate limiter admits it. With CHECKIN_AIMD=1 (see concurrency.py)
+# the number of requests in flight per host is capped by an adaptive limit.
+
+# Statuses that count against the egress health (throttled, or the proxy itself failing).
+_EGRESS_FAIL_STATUSES = {429, 502, 503, 504}
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    text: str
+    headers: dict[str, str] = field(default_factory=dict)
+    elapsed_s: float = 0.0
+    http_version: str = "HTTP/1.1"
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_egress_sessions: dict[str, requests.Session] = {}
+
+_h2_clients: dict[tuple[str, str], Any] = {}
+_h1_only_hosts: set[str] = set()
+_h2_lock = threading.Lock()
+_h2_unavailable = False
+
+
+class _SourceAddressAdapter(HTTPAdapter):
+    def __init__(self, source_address: str, **kwargs: Any) -> None:
+        self._source = (source_address, 0)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        kwargs["source_address"] = self._source
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy: str, **kwargs: Any) -> Any:
+        kwargs["source_address"] = self._source
+        return super().proxy_manager_for(proxy, **kwargs)
+
+
+def _get_session(egress: Optional[Egress] = None) -> requests.Session:
+    global _session
+    with _session_lock:
+        if egress is None:
+            if _session is None:
+                _session = requests.Session()
+            return _session
+        s = _egress_sessions.get(egress.name)
+        if s is None:
+            s = requests.Session()
+            if egress.source_address:
+                a = _SourceAddressAdapter(egress.source_address)
+                s.mount("http://", a)
+                s.mount("https://", a)
+            _egress_sessions[egress.name] = s
+        return s
+
+
+def _http2_enabled() -> bool:
+    return os.getenv("HTTP_TRANSPORT", "").strip().lower() == "http2"
+
+
+def _get_h2_client(origin: str, egress: Optional[Egress] = None) -> Any:
+    # One client (= one multiplexed connection) per origin and egress; None means "use HTTP/1.1".
+    global _h2_unavailable
+    key = (egress.name if egress else "", origin)
+    with _h2_lock:
+        if _h2_unavailable or origin in _h1_only_hosts:
+            return None
+        c = _h2_clients.get(key)
+        if c is not None:
+            return c
+        try:
+            import httpx
+            import h2  # noqa: F401  (httpx needs it for http2=True)
+        except ImportError:
+            _h2_unavailable = True
+            print("WARN: HTTP_TRANSPORT=http2 needs 'httpx[http2]'; using HTTP/1.1.", file=sys.stderr)
+            return None
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        if egress is not None and (egress.proxy or egress.source_address):
+            transport = httpx.HTTPTransport(
+                http2=True, limits=limits, proxy=egress.proxy, local_address=egress.source_address
+            )
+            c = httpx.Client(http2=True, transport=transport)
+        else:
+            c = httpx.Client(http2=True, limits=limits)
+        _h2_clients[key] = c
+        return c
+
+
+def _mark_h1_only(origin: str) -> None:
+    with _h2_lock:
+        _h1_only_hosts.add(origin)
+        clients = [_h2_clients.pop(k) for k in list(_h2_clients) if k[1] == origin]
+    for c in clients:
+        c.close()
+
+
+def _send_h2(client: Any, method: str, url: str, headers: dict[str, str], params: Any, json_body: Any, data: Any, timeout: float):
+    import httpx
+
+    started = time.monotonic()
+    try:
+        r = client.request(method, url, headers=headers, params=params, json=json_body, content=data, timeout=timeout)
+    except httpx.TimeoutException as e:
+        raise requests.Timeout(str(e))
+    except httpx.HTTPError as e:
+        raise requests.ConnectionError(str(e))
+    return r.status_code, dict(r.headers), r.text, time.monotonic() - started, r.http_version
+
+
+def request(
+    method: str,
+    url: str,
+    *,
+    headers: dict[str, str],
+    params: Optional[dict[str, str]] = None,
+    json_body: Any = None,
+    data: Optional[bytes] = None,
+    timeout: float = 20,
+    hedge: bool = False,
+) -> HttpResponse:
+    # All check-in HTTP traffic goes through here (pooled session + optional cassette).
+    # Transport errors surface as requests exceptions regardless of the backend.
+    # hedge=True lets an idempotent GET be sent twice when slow (CHECKIN_HEDGE, see hedging.py).
+    if hedge and method.upper() not in ("GET", "HEAD"):
+        raise RuntimeError(f"hedging is only allowed for idempotent requests, not {method}")
+    prep = _get_session().prepare_request(
+        requests.Request(method.upper(), url, headers=headers, params=params, json=json_body, data=data)
+    )
+    version = "HTTP/1.1"
+
+    def _send(egress: Optional[Egress]) -> tuple[int, dict[str, str], str, float]:
+        nonlocal version
+        if _http2_enabled():
+            parts = urlsplit(url)
+            origin = f"{parts.scheme}://{parts.netloc}"
+            client = _get_h2_client(origin, egress)
+            if client is not None:
+                status, resp_headers, text, elapsed, version = _send_h2(
+                    client, method.upper(), url, headers, params, json_body, data, timeout
+                )
+                if version != "HTTP/2":
+                    # Not negotiated (no ALPN h2): later calls use the pooled HTTP/1.1 session.
+                    _mark_h1_only(origin)
+                return status, resp_headers, text, elapsed
+
+        proxies = {"http": egress.proxy, "https": egress.proxy} if egress is not None and egress.proxy else None
+        started = time.monotonic()
+        r = _get_session(egress).send(prep, timeout=timeout, proxies=proxies)
+        return r.status_code, dict(r.headers), r.text, time.monotonic() - started
+
+    def _limited(egress: Optional[Egress]) -> tuple[int, dict[str, str], str, float]:
+        with host_slot(url, timeout) as slot:
+            sent_at = time.time()
+            out = _send(egress)
+            slot.status = out[0]
+        server_clock.observe(url, out[1], sent_at, time.time())
+        return out
+
+    def _live() -> tuple[int, dict[str, str], str, float]:
+        egress = current_egress()
+        if egress is None:
+            return _limited(None)
+        if not egress.limiter.acquire(timeout):
+            raise requests.Timeout(f"egress {egress.name}: rate limit wait exceeds the request timeout")
+        try:
+            out = _limited(egress)
+        except requests.RequestException:
+            egress.report(False)
+            raise
+        egress.report(out[0] not in _EGRESS_FAIL_STATUSES)
+        return out
+
+    def _hedged() -> tuple[int, dict[str, str], str, float]:
+        return run_hedged(urlsplit(url).netloc, _live)
+
+    live = _hedged if hedge else _live
+
+    cassette = active_cassette()
+    if cassette is None:
+        status, resp_headers, text, elapsed = live()
+    else:
+        body = prep.body.decode("utf-8", errors="replace") if isinstance(prep.body, bytes) else prep.body
+        status, resp_headers, text, elapsed = cassette.send(prep.method or method, prep.url or url, dict(prep.headers), body, live)
+    return HttpResponse(status=status, text=text, headers=resp_headers, elapsed_s=elapsed, http_version=version)
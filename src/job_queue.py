@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Generic, Optional, TypeVar
+
+from concurrency import aimd_enabled, aimd_max
+from run_deadline import Deadline
+
+# In-run job scheduler with a deferred retry queue.
+#
+# Jobs start in order; a job whose result is transient goes to the back of a delay queue with
+# a not-before time, and workers keep taking fresh jobs meanwhile instead of sleeping.
+#
+#   CHECKIN_WORKERS=1          concurrent jobs
+#   CHECKIN_MAX_ATTEMPTS=3     attempts per job (1 = no retry)
+#   CHECKIN_RETRY_DELAY_S=2    first retry delay; doubled per attempt, with jitter
+
+T = TypeVar("T")
+
+
+@dataclass(order=True)
+class _Pending:
+    not_before: float
+    seq: int
+    index: int = field(compare=False)
+    attempt: int = field(compare=False)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    delay_s: float = 2.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=max(1, int(os.getenv("CHECKIN_MAX_ATTEMPTS", "") or 3)),
+            delay_s=float(os.getenv("CHECKIN_RETRY_DELAY_S", "") or 2.0),
+        )
+
+    def delay_for(self, attempt: int) -> float:
+        # attempt is 1-based (the attempt that just failed)
+        d = self.delay_s * (2 ** (attempt - 1))
+        return d * random.uniform(0.8, 1.2)
+
+
+def is_transient_result(res: dict) -> bool:
+    # Network errors, throttling and server errors are worth another attempt.
+    if res.get("ok"):
+        return False
+    if "transient" in res:
+        return bool(res["transient"])
+    http = res.get("http")
+    return http is not None and (http == 429 or http >= 500)
+
+
+def workers_from_env(default: int = 1) -> int:
+    # With CHECKIN_AIMD=1 the per-host limiter bounds concurrency, so the pool only needs to be big enough.
+    if aimd_enabled():
+        default = max(default, aimd_max())
+    return max(1, int(os.getenv("CHECKIN_WORKERS", "") or default))
+
+
+class JobQueue(Generic[T]):
+    def __init__(
+        self,
+        jobs: list[T],
+        run: Callable[[T, int], dict],
+        *,
+        is_transient: Callable[[dict], bool],
+        on_skip: Callable[[T], dict],
+        deadline: Optional[Deadline] = None,
+        policy: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.jobs = jobs
+        self.run_fn = run
+        self.is_transient = is_transient
+        self.on_skip = on_skip
+        self.deadline = deadline or Deadline()
+        self.policy = policy or RetryPolicy()
+        self.results: list[Optional[dict]] = [None] * len(jobs)
+        self._seq = itertools.count()
+        self._heap: list[_Pending] = [_Pending(0.0, next(self._seq), i, 1) for i in range(len(jobs))]
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def _next(self) -> Optional[_Pending]:
+        with self._cond:
+            while True:
+                if not self._heap:
+                    if self._in_flight == 0:
+                        self._cond.notify_all()
+                        return None
+                    self._cond.wait()
+                    continue
+                wait_s = self._heap[0].not_before - time.monotonic()
+                if wait_s <= 0:
+                    self._in_flight += 1
+                    return heapq.heappop(self._heap)
+                self._cond.wait(wait_s)
+
+    def _done(self, p: _Pending, res: dict, final: bool = False) -> None:
+        retry_at = None
+        if not final and self.is_transient(res) and p.attempt < self.policy.max_attempts:
+            delay = self.policy.delay_for(p.attempt)
+            # Only requeue if the retry can still start before the run deadline.
+            if self.deadline.remaining() > delay:
+                retry_at = time.monotonic() + delay
+
+        with self._cond:
+            self._in_flight -= 1
+            if not final:
+                res["attempts"] = p.attempt
+            self.results[p.index] = res
+            if retry_at is not None:
+                heapq.heappush(self._heap, _Pending(retry_at, next(self._seq), p.index, p.attempt + 1))
+            self._cond.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            p = self._next()
+            if p is None:
+                return
+            job = self.jobs[p.index]
+            if not self.deadline.can_start():
+                prev = self.results[p.index]
+                # A retry that no longer fits keeps the last real result.
+                self._done(p, prev if prev is not None else self.on_skip(job), final=True)
+                continue
+            started = time.monotonic()
+            try:
+                res = self.run_fn(job, p.attempt)
+            except Exception as e:
+                res = {"ok": False, "error": str(e)}
+            self.deadline.record_job(time.monotonic() - started)
+            self._done(p, res)
+
+    def run(self, workers: int) -> list[dict]:
+        threads = [threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True) for i in range(max(1, workers))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return [r if r is not None else {} for r in self.results]
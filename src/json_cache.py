@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# On-disk JSON caches shared by threads and processes: game ownership, Endfield roles and the
+# reward catalog. The file holds one object, either {key: entry} or {section: {key: entry}}.
+#
+# A write re-reads the file under the cache's lock, merges the new entries and replaces the file
+# atomically through a per-process temp name, so writers in one process never drop each other's
+# entries. process_runner workers do not write at all: forward_writes() hands their updates to
+# the parent, which is the only writer of each file in a multi-process run.
+
+# (section or None, key, value)
+Update = tuple[Optional[str], str, Any]
+
+_forward: Optional[Callable[[str, list[Update]], None]] = None
+
+
+def forward_writes(fn: Optional[Callable[[str, list[Update]], None]]) -> None:
+    # fn(path, updates) replaces the disk write in this process; None restores it.
+    global _forward
+    _forward = fn
+
+
+def _apply(data: dict, updates: list[Update]) -> None:
+    for section, key, value in updates:
+        target = data
+        if section is not None:
+            target = data.get(section)
+            if not isinstance(target, dict):
+                target = data[section] = {}
+        target[key] = value
+
+
+class JsonCache:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._read()
+
+    def _read(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key: str, section: Optional[str] = None) -> Any:
+        with self._lock:
+            d = self._data.get(section) if section is not None else self._data
+            return d.get(key) if isinstance(d, dict) else None
+
+    def put(self, key: str, value: Any, section: Optional[str] = None) -> None:
+        self.put_many([(section, key, value)])
+
+    def put_many(self, updates: list[Update]) -> None:
+        if not updates:
+            return
+        with self._lock:
+            _apply(self._data, updates)
+        fwd = _forward
+        if fwd is not None:
+            fwd(str(self.path), updates)
+            return
+        self.write(updates)
+
+    def write(self, updates: list[Update]) -> None:
+        # Merge into what is on disk now (other writers' entries included) and replace the file.
+        with self._lock:
+            data = self._read()
+            _apply(data, updates)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+
+_caches: dict[str, JsonCache] = {}
+_caches_lock = threading.Lock()
+
+
+def cache_at(path: Path) -> JsonCache:
+    # One instance per file, so every user in a process shares its lock and entries.
+    key = os.path.abspath(path)
+    with _caches_lock:
+        c = _caches.get(key)
+        if c is None:
+            c = _caches[key] = JsonCache(Path(key))
+        return c
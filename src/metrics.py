@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import os
+import sys
+from typing import Optional
+
+import concurrency
+import server_clock
+
+# End-of-run metrics: AIMD concurrency limits (concurrency.py) and server clock skew
+# (server_clock.py). Printed to stderr; CHECKIN_METRICS_OUT=path.prom also writes them in the
+# Prometheus textfile format (node_exporter textfile collector).
+
+
+def emit_metrics(limits: Optional[list[dict]] = None, skew: Optional[list[dict]] = None) -> None:
+    # Called by the CLIs at the end of a run; rows default to this process's (process_runner
+    # passes the rows merged from its workers).
+    limits = concurrency.metrics() if limits is None else limits
+    skew = server_clock.metrics() if skew is None else skew
+    for r in limits:
+        print(
+            f"[aimd] {r['host']}: limit={r['limit']} baseline={r['baseline_ms']}ms "
+            f"ok={r['ok']} throttled={r['throttled']} errors={r['errors']} slow={r['slow']}",
+            file=sys.stderr,
+        )
+    for r in skew:
+        if abs(r["offset_s"]) >= 1:
+            print(f"[clock] {r['site']}: server is {r['offset_s']:+.1f}s from the local clock ({r['samples']} samples)", file=sys.stderr)
+
+    path = os.getenv("CHECKIN_METRICS_OUT", "").strip()
+    if not path or not (limits or skew):
+        return
+    text = (concurrency.prometheus_text(limits) if limits else "") + (server_clock.prometheus_text(skew) if skew else "")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
@@ -0,0 +1,434 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+import requests
+
+import concurrency
+import http_cassette
+import json_cache
+import profiling
+import server_clock
+from checkin import account_key, games, load_accounts, record_results
+from checkin_client import ATTEND_URL, AsyncEndfieldClient, AsyncHoyolabClient, EndfieldCredentials, HoyolabCredentials
+from egress import account_context
+from endfield_checkin import load_profiles, role_key
+from game_ownership import OwnershipCache, ownership_enabled
+from job_queue import RetryPolicy, is_transient_result, workers_from_env
+from metrics import emit_metrics
+from run_deadline import Deadline
+from run_history import HistoryStore
+
+# Multi-process runner for large account lists. One process is CPU-bound on TLS, JSON and
+# signing (DS / sign MD5 + HMAC) long before the upstream is, so accounts are spread over
+# worker processes.
+#
+#   CHECKIN_PROCS=1        worker processes (0 = one per CPU); checkin.py / endfield_checkin.py
+#                          use this runner when it is above 1 (or with --procs N)
+#   CHECKIN_BATCH_SIZE=64  accounts per batch handed to a worker
+#   CHECKIN_WORKERS=16     concurrent requests per worker process
+#
+# Each worker runs its own asyncio loop over the async client API, with its own HTTP sessions,
+# AIMD limiters and clock estimates, and takes account batches from a shared queue, so a slow
+# batch does not hold the others back. Accounts with the same credentials go into the same
+# batch, so single-flight dedupe still applies. Results stream back to the parent, which is the
+# only writer of the run history and of the JSON caches (json_cache.py), and prints the metrics
+# merged across workers.
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_CONCURRENCY = 16
+CACHE_FLUSH_ENTRIES = 1000
+
+
+def process_count(arg: Optional[int] = None) -> int:
+    n = arg if arg is not None else int(os.getenv("CHECKIN_PROCS", "") or 1)
+    return n if n > 0 else (os.cpu_count() or 1)
+
+
+def batch_size_from_env() -> int:
+    return max(1, int(os.getenv("CHECKIN_BATCH_SIZE", "") or DEFAULT_BATCH_SIZE))
+
+
+@dataclass
+class _Batch:
+    index: int
+    # (profile, signgames); the game list is empty for Endfield (roles are found by the worker)
+    items: list[tuple[dict, list[str]]]
+
+
+def make_batches(items: list[tuple[dict, list[str]]], key: Callable[[dict], str], size: int) -> list[_Batch]:
+    # Duplicates (same key) are kept together so they share one sign call in one process.
+    groups: dict[str, list[tuple[dict, list[str]]]] = {}
+    for it in items:
+        groups.setdefault(key(it[0]), []).append(it)
+    batches: list[_Batch] = []
+    cur: list[tuple[dict, list[str]]] = []
+    for group in groups.values():
+        if cur and len(cur) + len(group) > size:
+            batches.append(_Batch(len(batches), cur))
+            cur = []
+        cur.extend(group)
+    if cur:
+        batches.append(_Batch(len(batches), cur))
+    return batches
+
+
+def _failed(source: str, profile: dict, signgames: list[str], error: str) -> list[dict]:
+    name = str(profile.get("accountName") or ("" if source == "hoyolab" else "account"))
+    if source == "hoyolab":
+        return [{"name": name, "game": g, "ok": False, "error": error} for g in signgames]
+    return [{"name": name, "account": EndfieldCredentials.from_profile(profile).key, "ok": False, "error": error}]
+
+
+# ---- worker process ---------------------------------------------------------------------------
+
+
+@dataclass
+class _Worker:
+    deadline: Deadline
+    policy: RetryPolicy
+    slots: asyncio.Semaphore
+    ownership: Optional[OwnershipCache]
+    done: set[str]
+
+
+async def _attempts(w: _Worker, base: dict, call: Callable[[int], Awaitable[dict]]) -> dict:
+    # Same rules as job_queue.JobQueue; the wait before a retry frees the slot for other accounts.
+    res: Optional[dict] = None
+    for attempt in range(1, w.policy.max_attempts + 1):
+        if not w.deadline.can_start():
+            break
+        async with w.slots:
+            started = time.monotonic()
+            try:
+                res = await call(attempt)
+            except Exception as e:
+                res = {**base, "ok": False, "error": str(e), "transient": isinstance(e, requests.RequestException)}
+            elapsed = time.monotonic() - started
+        w.deadline.record_job(elapsed)
+        res.update({"attempts": attempt, "latency_ms": round(elapsed * 1000, 1)})
+        if not is_transient_result(res) or attempt >= w.policy.max_attempts:
+            return res
+        delay = w.policy.delay_for(attempt)
+        if w.deadline.remaining() <= delay:
+            return res
+        await asyncio.sleep(delay)
+    return res if res is not None else {**base, "ok": False, "error": "skipped: run deadline reached"}
+
+
+async def _hoyolab_account(w: _Worker, profile: dict, signgames: list[str]) -> list[dict]:
+    creds = HoyolabCredentials.from_profile(profile)
+    client = AsyncHoyolabClient(creds, deadline=w.deadline)
+    urls = {g[3]: g[2] for g in games}
+    with account_context(creds.key):
+        if w.ownership:
+            async with w.slots:
+                have = await asyncio.to_thread(w.ownership.owned, creds, w.deadline)
+            if have is not None:
+                for g in signgames:
+                    if g not in have:
+                        print(f"== [{creds.key}] {g}: skipped (not owned)")
+                signgames = [g for g in signgames if g in have]
+
+        async def sign(game: str) -> dict:
+            async def call(_attempt: int) -> dict:
+                res = await client.sign(game)
+                res.pop("body", None)
+                res["endpoint"] = urls[game]
+                return res
+
+            return await _attempts(w, {"name": creds.account_name, "game": game}, call)
+
+        return list(await asyncio.gather(*(sign(g) for g in signgames)))
+
+
+async def _endfield_account(w: _Worker, profile: dict, _signgames: list[str]) -> list[dict]:
+    client = AsyncEndfieldClient(EndfieldCredentials.from_profile(profile), deadline=w.deadline)
+    name = client.creds.account_name
+    with account_context(client.creds.key):
+        try:
+            async with w.slots:
+                roles = await client.roles()
+        except Exception as e:
+            return [{"name": name, "account": client.creds.key, "ok": False, "error": f"role discovery: {e}"}]
+        if not roles:
+            return [{"name": name, "account": client.creds.key, "ok": False, "error": "role discovery: no Endfield role bound to this cred"}]
+
+        async def sign(k: int, role: str) -> dict:
+            # Role IDs stay out of the logs; several roles are numbered instead. Display names can
+            # repeat, so history and the skip set use role_key.
+            label = name if len(roles) == 1 else f"{name}#{k + 1}"
+            key = role_key(client.creds, k)
+            if key in w.done:
+                return {"name": label, "account": key, "ok": True, "status": "already-claimed", "note": "skipped: claimed earlier today"}
+            # The retry forces a new token, as in endfield_checkin.
+            base = {"name": label, "account": key}
+            res = await _attempts(w, base, lambda attempt: client.sign(role, name=label, refresh=attempt > 1))
+            res["account"] = key
+            return res
+
+        return list(await asyncio.gather(*(sign(k, r) for k, r in enumerate(roles))))
+
+
+async def _serve(wid: int, source: str, tasks, out, deadline: Deadline, done: set[str]) -> None:
+    loop = asyncio.get_running_loop()
+    limit = workers_from_env(DEFAULT_CONCURRENCY)
+    # asyncio.to_thread runs the blocking transport in the default executor; size it to the slots.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"proc{wid}"))
+    feeder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-feeder")
+    ownership = OwnershipCache() if source == "hoyolab" and ownership_enabled() else None
+    w = _Worker(deadline, RetryPolicy.from_env(), asyncio.Semaphore(limit), ownership, done)
+    run_account = _hoyolab_account if source == "hoyolab" else _endfield_account
+
+    async def account(index: int, pos: int, profile: dict, signgames: list[str]) -> None:
+        try:
+            results = await run_account(w, profile, signgames)
+        except Exception as e:
+            results = _failed(source, profile, signgames, str(e))
+        out.put(("result", index, pos, results))
+
+    pending: set[asyncio.Task] = set()
+    while True:
+        # Take the next batch once the current accounts no longer fill the slots.
+        while len(pending) >= limit:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        batch = await loop.run_in_executor(feeder, tasks.get)
+        if batch is None:
+            break
+        out.put(("take", wid, batch.index))
+        for pos, (profile, signgames) in enumerate(batch.items):
+            pending.add(asyncio.create_task(account(batch.index, pos, profile, signgames)))
+    if pending:
+        await asyncio.wait(pending)
+    if ownership:
+        await asyncio.to_thread(ownership.wait, min(5.0, max(deadline.remaining(), 0)))
+    feeder.shutdown()
+
+
+def _worker_main(
+    wid: int,
+    source: str,
+    tasks,
+    out,
+    deadline: Deadline,
+    done: set[str],
+    cassette: Optional[tuple[str, str, float]],
+    profile_prefix: Optional[str],
+) -> None:
+    # Cache entries (ownership, roles, reward names) and recorded interactions go to the parent,
+    # the only writer of those files.
+    json_cache.forward_writes(lambda path, updates: out.put(("cache", path, updates)))
+    if cassette is None:
+        http_cassette.use_cassette(None)
+    else:
+        path, mode, scale = cassette
+        sink = (lambda it: out.put(("cassette", it))) if mode == "record" else None
+        http_cassette.use_cassette(http_cassette.Cassette(Path(path), mode, scale, sink=sink))
+    try:
+        # A profiled parent (--cprofile) merges this worker's <prefix>.pstats into its own.
+        with profiling.profile_threads(profile_prefix):
+            asyncio.run(_serve(wid, source, tasks, out, deadline, done))
+    finally:
+        out.put(("metrics", wid, concurrency.metrics(), server_clock.metrics()))
+
+
+# ---- parent -----------------------------------------------------------------------------------
+
+
+def _merge_limits(rows: list[dict]) -> list[dict]:
+    # Per host across workers: limits and counters add up (the host sees their sum).
+    merged: dict[str, dict] = {}
+    for r in rows:
+        m = merged.get(r["host"])
+        if m is None:
+            merged[r["host"]] = dict(r)
+            continue
+        for k in ("limit", "inflight", "ok", "throttled", "errors", "slow", "decreases"):
+            m[k] += r[k]
+        if r["baseline_ms"] is not None:
+            m["baseline_ms"] = r["baseline_ms"] if m["baseline_ms"] is None else min(m["baseline_ms"], r["baseline_ms"])
+    for m in merged.values():
+        m["limit"] = round(m["limit"], 2)
+    return [merged[h] for h in sorted(merged)]
+
+
+def _merge_skew(rows: list[dict]) -> list[dict]:
+    # Per site across workers: offsets weighted by sample count.
+    merged: dict[str, dict] = {}
+    for r in rows:
+        m = merged.setdefault(r["site"], {"site": r["site"], "offset_s": 0.0, "samples": 0})
+        m["offset_s"] += r["offset_s"] * r["samples"]
+        m["samples"] += r["samples"]
+    for m in merged.values():
+        m["offset_s"] = round(m["offset_s"] / m["samples"], 3) if m["samples"] else 0.0
+    return [merged[s] for s in sorted(merged)]
+
+
+def _dispatch(
+    source: str,
+    batches: list[_Batch],
+    procs: int,
+    deadline: Deadline,
+    done: set[str],
+    sink: Callable[[dict, list[str], list[dict]], None],
+) -> None:
+    # spawn, not fork: the parent may already hold pooled connections and background threads.
+    ctx = multiprocessing.get_context("spawn")
+    tasks = ctx.Queue()
+    out = ctx.Queue()
+    # The cassette mode (HTTP_CASSETTE) is resolved here once; a record cassette is written by
+    # the parent only.
+    cas = http_cassette.active_cassette()
+    cassette = (str(cas.path), cas.mode, cas.latency_scale) if cas is not None else None
+    # If every worker dies, batches left in the queue must not block the parent's exit.
+    tasks.cancel_join_thread()
+    for b in batches:
+        tasks.put(b)
+    procs = max(1, min(procs, len(batches)))
+    for _ in range(procs):
+        tasks.put(None)
+    prefixes = [profiling.child_prefix(f"{source}-w{i}") for i in range(procs)]
+    workers = [
+        ctx.Process(target=_worker_main, args=(i, source, tasks, out, deadline, done, cassette, prefixes[i]), name=f"checkin-proc-{i}", daemon=True)
+        for i in range(procs)
+    ]
+    for p in workers:
+        p.start()
+
+    by_index = {b.index: b for b in batches}
+    taken: dict[int, int] = {}
+    seen: set[tuple[int, int]] = set()
+    limits: list[dict] = []
+    skew: list[dict] = []
+    cache_writes: dict[str, list] = {}
+
+    def flush_cache_writes() -> None:
+        for path, updates in cache_writes.items():
+            json_cache.cache_at(Path(path)).put_many(updates)
+        cache_writes.clear()
+
+    def handle(msg: tuple) -> None:
+        if msg[0] == "cassette":
+            cas.append(msg[1])
+        elif msg[0] == "cache":
+            cache_writes.setdefault(msg[1], []).extend(msg[2])
+            # Each write rewrites the whole file: batch them.
+            if sum(len(u) for u in cache_writes.values()) >= CACHE_FLUSH_ENTRIES:
+                flush_cache_writes()
+        elif msg[0] == "take":
+            taken[msg[2]] = msg[1]
+        elif msg[0] == "result":
+            _, index, pos, results = msg
+            seen.add((index, pos))
+            profile, signgames = by_index[index].items[pos]
+            sink(profile, signgames, results)
+        elif msg[0] == "metrics":
+            limits.extend(msg[2])
+            skew.extend(msg[3])
+
+    try:
+        while any(p.is_alive() for p in workers):
+            try:
+                handle(out.get(timeout=0.5))
+            except queue.Empty:
+                pass
+        while True:
+            try:
+                handle(out.get(timeout=0.1))
+            except queue.Empty:
+                break
+        for p in workers:
+            p.join()
+    finally:
+        flush_cache_writes()
+        for prefix in prefixes:
+            if prefix is not None:
+                profiling.add_child_stats(prefix + ".pstats")
+
+    # Accounts of a worker that died, or that no worker was left to take, still get a result.
+    for b in batches:
+        for pos, (profile, signgames) in enumerate(b.items):
+            if (b.index, pos) in seen:
+                continue
+            wid = taken.get(b.index)
+            error = f"worker process exited with code {workers[wid].exitcode}" if wid is not None else "not run: no worker process left"
+            sink(profile, signgames, _failed(source, profile, signgames, error))
+
+    emit_metrics(_merge_limits(limits), _merge_skew(skew))
+
+
+def _report(source: str, res: dict) -> None:
+    what = " ".join(x for x in (str(res.get("name") or ""), str(res.get("game") or "")) if x) or "-"
+    outcome = res.get("status") or f"ERROR: {res.get('error')}"
+    print(f"== [{source}] {what}: {outcome}{' (shared)' if res.get('shared') else ''}")
+
+
+def run_hoyolab(procs: int, batch_size: Optional[int] = None) -> list[dict]:
+    # Same planning as checkin.run_all (skip done, failed first); ownership is checked by the workers.
+    deadline = Deadline.from_env()
+    by_game = {g[3]: g for g in games}
+    history = HistoryStore.from_env()
+    run_id = history.start_run("hoyolab") if history else ""
+    done = history.done_today() if history and os.getenv("CHECKIN_SKIP_DONE", "").strip() == "1" else set()
+    failed = history.failed_last_time() if history else set()
+
+    items: list[tuple[dict, list[str]]] = []
+    for acc in load_accounts():
+        key = account_key(acc)
+        todo = [g[3] for g in games if (key, g[3]) not in done]
+        if len(todo) < len(games):
+            print(f"== [hoyolab] {key}: {len(games) - len(todo)} game(s) skipped, claimed earlier today")
+        if todo:
+            items.append((acc, todo))
+    items.sort(key=lambda it: not any((account_key(it[0]), g) in failed for g in it[1]))
+
+    results: list[dict] = []
+
+    def sink(acc: dict, _signgames: list[str], res_list: list[dict]) -> None:
+        for res in res_list:
+            if history:
+                record_results(history, run_id, [(acc, by_game[res["game"]], res)], deadline)
+            _report("hoyolab", res)
+            results.append(res)
+
+    batches = make_batches(items, lambda acc: HoyolabCredentials.from_profile(acc).ltuid, batch_size or batch_size_from_env())
+    try:
+        if batches:
+            _dispatch("hoyolab", batches, procs, deadline, set(), sink)
+    finally:
+        if history:
+            history.close()
+    return results
+
+
+def run_endfield(procs: int, batch_size: Optional[int] = None) -> list[dict]:
+    deadline = Deadline.from_env()
+    history = HistoryStore.from_env()
+    run_id = history.start_run("endfield") if history else ""
+    done = {key for key, game in history.done_today() if game == "endfield"} if history and os.getenv("CHECKIN_SKIP_DONE", "").strip() == "1" else set()
+
+    results: list[dict] = []
+
+    def sink(_profile: dict, _signgames: list[str], res_list: list[dict]) -> None:
+        for res in res_list:
+            if history:
+                history.record(run_id, res["account"], "endfield", {**res, "endpoint": ATTEND_URL})
+            _report("endfield", res)
+            results.append(res)
+
+    items: list[tuple[dict, list[str]]] = [(p, []) for p in load_profiles()]
+    batches = make_batches(items, lambda p: EndfieldCredentials.from_profile(p).cred, batch_size or batch_size_from_env())
+    try:
+        _dispatch("endfield", batches, procs, deadline, done, sink)
+    finally:
+        if history:
+            history.close()
+    return results
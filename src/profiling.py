@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+
+SAMPLE_INTERVAL_S = 0.005
+
+
+def default_prefix(entry: str) -> str:
+    return f"{entry}-profile-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def add_profile_args(ap) -> None:
+    # Not "--profile": argparse would take it as an abbreviation of an existing option
+    # (cookiegrab's --profile-directory) and change what old command lines mean.
+    ap.add_argument("--cprofile", dest="profile", action="store_true", help="Write cProfile, collapsed-stack and memory profiles for this run.")
+    ap.add_argument("--cprofile-out", dest="profile_out", default=None, help="Output path prefix for --cprofile (default: <tool>-profile-<timestamp>).")
+
+
+class _ThreadProfiles:
+    # cProfile only sees the thread that enabled it. threading.setprofile starts another profile
+    # in every thread started while profiling is on (job queue workers, asyncio executors, the
+    # hedging pool); stop() merges them all.
+    def __init__(self) -> None:
+        self.main = cProfile.Profile()
+        self._threads: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _start_in_thread(self, *_args) -> None:
+        sys.setprofile(None)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Python 3.12+: the main profile (sys.monitoring) already covers every thread.
+            return
+        with self._lock:
+            self._threads.append(prof)
+
+    def start(self) -> None:
+        threading.setprofile(self._start_in_thread)
+        self.main.enable()
+
+    def stop(self) -> pstats.Stats:
+        self.main.disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(self.main)
+        with self._lock:
+            for prof in self._threads:
+                stats.add(prof)
+        return stats
+
+
+_active_prefix: Optional[Path] = None
+_child_stats: list[str] = []
+
+
+def child_prefix(name: str) -> Optional[str]:
+    # Output prefix for a child process's profile, or None when this run is not profiled.
+    return f"{_active_prefix}.{name}" if _active_prefix is not None else None
+
+
+def add_child_stats(path: str) -> None:
+    # A child's .pstats to merge into this run's profile when it is written.
+    _child_stats.append(path)
+
+
+@contextmanager
+def profile_threads(prefix: Optional[str]) -> Iterator[None]:
+    # For child processes (process_runner workers): all threads, written to <prefix>.pstats.
+    if not prefix:
+        yield
+        return
+    profiles = _ThreadProfiles()
+    profiles.start()
+    try:
+        yield
+    finally:
+        try:
+            profiles.stop().dump_stats(prefix + ".pstats")
+        except OSError as e:
+            print(f"[profile] failed to write {prefix}.pstats: {e}", file=sys.stderr)
+
+
+class _StackSampler(threading.Thread):
+    # Wall-clock stack sampler producing "collapsed" stacks for flamegraph.pl / speedscope.
+    def __init__(self, interval_s: float) -> None:
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval_s = interval_s
+        self.counts: Counter[str] = Counter()
+        self._stop_evt = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop_evt.wait(self.interval_s):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack: list[str] = []
+                f = frame
+                while f is not None:
+                    co = f.f_code
+                    stack.append(f"{os.path.basename(co.co_filename)}:{co.co_name}")
+                    f = f.f_back
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join()
+
+
+def _write_outputs(prefix: Path, stats: pstats.Stats, sampler: _StackSampler, peak: int, snapshot: tracemalloc.Snapshot, wall_s: float) -> None:
+    prefix.parent.mkdir(parents=True, exist_ok=True)
+    merged = 0
+    for path in _child_stats:
+        if os.path.exists(path):
+            stats.add(path)
+            merged += 1
+    stats.dump_stats(str(prefix) + ".pstats")
+
+    with open(str(prefix) + ".collapsed", "w", encoding="utf-8") as f:
+        for stack, n in sorted(sampler.counts.items()):
+            f.write(f"{stack} {n}\n")
+
+    buf = io.StringIO()
+    buf.write(f"wall time: {wall_s:.3f}s\n")
+    buf.write(f"tracemalloc peak: {peak / (1024 * 1024):.1f} MiB\n\n")
+    buf.write("largest live allocations at exit:\n")
+    for st in snapshot.statistics("lineno")[:15]:
+        buf.write(f"  {st}\n")
+    buf.write("\n")
+    stats.stream = buf
+    stats.sort_stats("cumulative").print_stats(30)
+    Path(str(prefix) + ".txt").write_text(buf.getvalue(), encoding="utf-8")
+
+    print(f"\n[profile] wall {wall_s:.3f}s, peak memory {peak / (1024 * 1024):.1f} MiB", file=sys.stderr)
+    print(f"[profile] wrote {prefix}.pstats / .collapsed / .txt", file=sys.stderr)
+    if merged:
+        print(f"[profile] .pstats includes {merged} worker process profile(s)", file=sys.stderr)
+
+
+@contextmanager
+def profile_run(entry: Optional[str], out_prefix: Optional[str] = None) -> Iterator[None]:
+    # entry=None disables profiling so callers can wrap unconditionally.
+    if not entry:
+        yield
+        return
+
+    global _active_prefix
+    prefix = Path(out_prefix or default_prefix(entry)).expanduser()
+    sampler = _StackSampler(SAMPLE_INTERVAL_S)
+    profiles = _ThreadProfiles()
+    tracemalloc.start()
+    started = time.perf_counter()
+    sampler.start()
+    _active_prefix = prefix
+    _child_stats.clear()
+    profiles.start()
+    try:
+        yield
+    finally:
+        stats = profiles.stop()
+        _active_prefix = None
+        sampler.stop()
+        wall_s = time.perf_counter() - started
+        _cur, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        try:
+            _write_outputs(prefix, stats, sampler, peak, snapshot, wall_s)
+        except OSError as e:
+            print(f"[profile] failed to write profile output: {e}", file=sys.stderr)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import http_transport
+from json_cache import cache_at
+from run_deadline import Deadline, request_timeout
+from run_history import RESET_TZ
+
+# Monthly reward catalog shared by all accounts.
+#
+# HoYoLAB: each game's "home" endpoint lists the month's rewards in day order. It is fetched once
+# per month and cached on disk; the reward of a claim is catalog[claimed day - 1].
+# Endfield: attendance responses carry a resourceInfoMap; entries are remembered so award ids can
+# be resolved even when a response omits the map.
+
+HOME_URLS = {
+    "hk4e": "https://sg-hk4e-api.hoyolab.com/event/sol/home",
+    "hkrpg": "https://sg-public-api.hoyolab.com/event/luna/hkrpg/os/home",
+    "bh3": "https://sg-public-api.hoyolab.com/event/mani/home",
+    "zzz": "https://sg-public-api.hoyolab.com/event/luna/zzz/os/home",
+}
+
+
+def cache_dir() -> Path:
+    override = os.getenv("CHECKIN_CACHE_DIR", "").strip()
+    if override:
+        return Path(override).expanduser()
+    base = os.getenv("XDG_CACHE_HOME", "").strip() or str(Path.home() / ".cache")
+    return Path(base) / "hoyolab-checkin"
+
+
+def current_month() -> str:
+    return datetime.now(RESET_TZ).strftime("%Y-%m")
+
+
+class RewardCatalog:
+    def __init__(self, month: Optional[str] = None, path: Optional[Path] = None) -> None:
+        self.month = month or current_month()
+        self.path = path or (cache_dir() / f"reward_catalog_{self.month}.json")
+        # {"hoyolab": {signgame: [awards]}, "endfield": {award id: {"name", "count"}}}
+        self._cache = cache_at(self.path)
+        self._lock = threading.Lock()
+        self._fetch_locks: dict[str, threading.Lock] = {}
+        self._failed: set[str] = set()
+
+    def hoyolab_awards(self, signgame: str, act_id: str, deadline: Optional[Deadline] = None) -> list[dict]:
+        cached = self._cache.get(signgame, "hoyolab")
+        if cached is not None:
+            return cached
+        with self._lock:
+            if signgame in self._failed:
+                return []
+            fetch_lock = self._fetch_locks.setdefault(signgame, threading.Lock())
+
+        # One fetch per game even when many accounts ask at once.
+        with fetch_lock:
+            cached = self._cache.get(signgame, "hoyolab")
+            with self._lock:
+                if cached is None and signgame in self._failed:
+                    cached = []
+            if cached is not None:
+                return cached
+            awards = self._fetch_hoyolab(signgame, act_id, deadline)
+            if awards:
+                self._cache.put(signgame, awards, "hoyolab")
+            else:
+                with self._lock:
+                    # Do not retry for every account in this run.
+                    self._failed.add(signgame)
+            return awards
+
+    def _fetch_hoyolab(self, signgame: str, act_id: str, deadline: Optional[Deadline]) -> list[dict]:
+        url = HOME_URLS.get(signgame)
+        if not url:
+            return []
+        headers = {
+            "User-Agent": "okhttp/4.8.0",
+            "Referer": "https://act.hoyolab.com",
+            "Origin": "https://act.hoyolab.com",
+            "x-rpc-signgame": signgame,
+        }
+        # The catalog is for display only: any failure (cassette miss, unexpected body) means "no catalog".
+        try:
+            r = http_transport.request(
+                "GET", url, headers=headers, params={"act_id": act_id, "lang": "ja-jp"}, timeout=request_timeout(deadline)
+            )
+            j = r.json()
+        except Exception as e:
+            print(f"WARN: reward catalog fetch failed for {signgame}: {e}", file=sys.stderr)
+            return []
+        data = j.get("data") if isinstance(j, dict) else None
+        awards = data.get("awards") if isinstance(data, dict) else None
+        if not isinstance(awards, list):
+            return []
+        return [{"name": str(a.get("name", "")), "cnt": a.get("cnt")} for a in awards if isinstance(a, dict)]
+
+    def resolve_hoyolab(self, signgame: str, act_id: str, day: int, deadline: Optional[Deadline] = None) -> str:
+        # day is the 1-based sign-in count of the month. Never raises: "" when unknown.
+        try:
+            awards = self.hoyolab_awards(signgame, act_id, deadline)
+            if not 1 <= day <= len(awards):
+                return ""
+            a = awards[day - 1]
+            return f'{a["name"]} x{a["cnt"]}'
+        except Exception as e:
+            print(f"WARN: reward lookup failed for {signgame}: {e}", file=sys.stderr)
+            return ""
+
+    def learn_endfield(self, resource_info_map: dict) -> None:
+        new = {
+            str(k): {"name": v.get("name"), "count": v.get("count")}
+            for k, v in (resource_info_map or {}).items()
+            if isinstance(v, dict) and v.get("name") is not None
+        }
+        self._cache.put_many([("endfield", k, v) for k, v in new.items() if self._cache.get(k, "endfield") != v])
+
+    def resolve_endfield(self, award_id) -> str:
+        r = self._cache.get(str(award_id), "endfield")
+        if not r:
+            return ""
+        return f'{r.get("name")} x{r.get("count")}'
+
+
+_shared: Optional[RewardCatalog] = None
+_shared_lock = threading.Lock()
+
+
+def shared_catalog() -> RewardCatalog:
+    global _shared
+    with _shared_lock:
+        if _shared is None or _shared.month != current_month():
+            _shared = RewardCatalog()
+        return _shared
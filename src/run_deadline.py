@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import math
+import os
+import time
+from typing import Optional
+
+
+DEFAULT_REQUEST_TIMEOUT_S = 20.0
+# Floor for the "can this job still finish?" estimate before any job has completed.
+MIN_JOB_ESTIMATE_S = 1.0
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+class Deadline:
+    """Run-wide wall-clock budget shared by every job, request and retry."""
+
+    def __init__(self, at: Optional[float] = None, request_cap_s: float = DEFAULT_REQUEST_TIMEOUT_S) -> None:
+        # `at` is an absolute unix time so that several workflow steps can share one budget.
+        self.at = at
+        self.request_cap_s = request_cap_s
+        self._slowest_job_s = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Deadline":
+        # CHECKIN_DEADLINE_AT: absolute unix time (set once per workflow run)
+        # CHECKIN_DEADLINE_S: seconds from now (used when *_AT is not set)
+        cap = float(os.getenv("CHECKIN_REQUEST_TIMEOUT_S", "") or DEFAULT_REQUEST_TIMEOUT_S)
+        at_s = os.getenv("CHECKIN_DEADLINE_AT", "").strip()
+        if at_s:
+            return cls(float(at_s), cap)
+        rel_s = os.getenv("CHECKIN_DEADLINE_S", "").strip()
+        if rel_s:
+            return cls(time.time() + float(rel_s), cap)
+        return cls(None, cap)
+
+    def remaining(self) -> float:
+        if self.at is None:
+            return math.inf
+        return self.at - time.time()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        # Per-request timeout: never longer than the request cap or the remaining budget.
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded("run deadline reached")
+        return min(self.request_cap_s if cap is None else cap, left)
+
+    def record_job(self, elapsed_s: float) -> None:
+        self._slowest_job_s = max(self._slowest_job_s, elapsed_s)
+
+    def can_start(self, estimate_s: Optional[float] = None) -> bool:
+        # Do not start work that is unlikely to finish before the deadline.
+        est = estimate_s if estimate_s is not None else max(self._slowest_job_s, MIN_JOB_ESTIMATE_S)
+        return self.remaining() > est
+
+
+def request_timeout(deadline: Optional[Deadline], cap: Optional[float] = None) -> float:
+    if deadline is None:
+        return DEFAULT_REQUEST_TIMEOUT_S if cap is None else cap
+    return deadline.timeout(cap)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+# Embedded run history: one row per (run, account, game).
+#
+# Enabled by CHECKIN_HISTORY_DB=path/to/history.db. `day` is the check-in day at the
+# UTC+8 daily reset used by HoYoLAB / SKPort.
+
+RESET_TZ = timezone(timedelta(hours=8))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    game TEXT NOT NULL,
+    day TEXT NOT NULL,
+    ts REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    status TEXT,
+    retcode INTEGER,
+    http INTEGER,
+    latency_ms REAL,
+    endpoint TEXT,
+    awards TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_account_day ON results (account, day);
+CREATE INDEX IF NOT EXISTS idx_results_game_day ON results (game, day);
+CREATE INDEX IF NOT EXISTS idx_results_day ON results (day);
+CREATE INDEX IF NOT EXISTS idx_results_endpoint_day ON results (endpoint, day);
+"""
+
+DONE_STATUSES = ("claimed", "already-claimed")
+
+
+def checkin_day(ts: Optional[float] = None) -> str:
+    return datetime.fromtimestamp(time.time() if ts is None else ts, RESET_TZ).strftime("%Y-%m-%d")
+
+
+class HistoryStore:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(str(path), check_same_thread=False)
+        self._con.executescript(SCHEMA)
+        self._con.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["HistoryStore"]:
+        p = os.getenv("CHECKIN_HISTORY_DB", "").strip()
+        return cls(Path(p).expanduser()) if p else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+
+    def start_run(self, source: str) -> str:
+        run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._con.execute("INSERT INTO runs (run_id, source, started_at) VALUES (?, ?, ?)", (run_id, source, time.time()))
+            self._con.commit()
+        return run_id
+
+    def record(self, run_id: str, account: str, game: str, res: dict) -> None:
+        ts = time.time()
+        awards = res.get("awards")
+        row = (
+            run_id,
+            account,
+            game,
+            checkin_day(ts),
+            ts,
+            1 if res.get("ok") else 0,
+            res.get("status"),
+            res.get("code", res.get("retcode")),
+            res.get("http"),
+            res.get("latency_ms"),
+            res.get("endpoint"),
+            json.dumps(awards, ensure_ascii=False) if awards else None,
+            res.get("error"),
+        )
+        with self._lock:
+            self._con.execute(
+                "INSERT INTO results (run_id, account, game, day, ts, ok, status, retcode, http, latency_ms, endpoint, awards, error)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._con.commit()
+
+    def done_today(self) -> set[tuple[str, str]]:
+        # (account, game) pairs already claimed in the current check-in day.
+        q = f"SELECT DISTINCT account, game FROM results WHERE day = ? AND status IN ({','.join('?' * len(DONE_STATUSES))})"
+        with self._lock:
+            rows = self._con.execute(q, (checkin_day(), *DONE_STATUSES)).fetchall()
+        return {(a, g) for a, g in rows}
+
+    def done_days_this_month(self, account: str, game: str) -> int:
+        # Number of check-in days this month with a successful claim (today included if recorded).
+        month = checkin_day()[:7]
+        q = f"SELECT COUNT(DISTINCT day) FROM results WHERE account = ? AND game = ? AND day LIKE ? AND status IN ({','.join('?' * len(DONE_STATUSES))})"
+        with self._lock:
+            row = self._con.execute(q, (account, game, f"{month}-%", *DONE_STATUSES)).fetchone()
+        return int(row[0] or 0)
+
+    def covers_month(self, account: str, game: str) -> bool:
+        # True when every earlier check-in day of this month has a row, i.e. a claim made
+        # elsewhere (app, another tool) could not have been missed by done_days_this_month.
+        today = checkin_day()
+        q = "SELECT COUNT(DISTINCT day) FROM results WHERE account = ? AND game = ? AND day LIKE ? AND day < ?"
+        with self._lock:
+            row = self._con.execute(q, (account, game, f"{today[:7]}-%", today)).fetchone()
+        return int(row[0] or 0) >= int(today[8:]) - 1
+
+    def day_results(self, day: Optional[str] = None) -> list[tuple]:
+        q = "SELECT account, game, status, retcode, error FROM results WHERE day = ? ORDER BY ts"
+        with self._lock:
+            return self._con.execute(q, (day or checkin_day(),)).fetchall()
+
+    def failed_last_time(self) -> set[tuple[str, str]]:
+        q = """
+            SELECT r.account, r.game, r.ok FROM results r
+            JOIN (SELECT account, game, MAX(ts) AS ts FROM results GROUP BY account, game) last
+              ON r.account = last.account AND r.game = last.game AND r.ts = last.ts
+        """
+        with self._lock:
+            rows = self._con.execute(q).fetchall()
+        return {(a, g) for a, g, ok in rows if not ok}
+
+    def failing_streaks(self, days: int) -> list[tuple[str, str, int]]:
+        # (account, game, days) with runs but no success on each of the last `days` check-in days.
+        since = (datetime.now(RESET_TZ) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        q = """
+            SELECT account, game, day, MAX(ok) FROM results
+            WHERE day >= ?
+            GROUP BY account, game, day
+            ORDER BY account, game, day
+        """
+        with self._lock:
+            rows = self._con.execute(q, (since,)).fetchall()
+        per: dict[tuple[str, str], list[tuple[str, int]]] = {}
+        for a, g, day, ok in rows:
+            per.setdefault((a, g), []).append((day, ok))
+        out = []
+        for (a, g), days_ok in per.items():
+            if len(days_ok) >= days and not any(ok for _d, ok in days_ok[-days:]):
+                out.append((a, g, len(days_ok)))
+        return out
+
+    def latency_percentiles(self, since_days: int, pct: float) -> list[tuple[str, int, float]]:
+        # (endpoint, samples, percentile latency in ms) since N days ago.
+        since = (datetime.now(RESET_TZ) - timedelta(days=since_days - 1)).strftime("%Y-%m-%d")
+        q = "SELECT endpoint, latency_ms FROM results WHERE day >= ? AND latency_ms IS NOT NULL ORDER BY endpoint, latency_ms"
+        with self._lock:
+            rows = self._con.execute(q, (since,)).fetchall()
+        per: dict[str, list[float]] = {}
+        for ep, ms in rows:
+            per.setdefault(ep or "(unknown)", []).append(ms)
+        out = []
+        for ep, vals in sorted(per.items()):
+            # nearest-rank percentile
+            i = min(len(vals) - 1, max(0, math.ceil(pct / 100.0 * len(vals)) - 1))
+            out.append((ep, len(vals), vals[i]))
+        return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Query the check-in run history (CHECKIN_HISTORY_DB).")
+    ap.add_argument("--db", default=os.getenv("CHECKIN_HISTORY_DB"), help="History DB path (default: $CHECKIN_HISTORY_DB).")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    f = sub.add_parser("failing", help="Accounts failing N days in a row.")
+    f.add_argument("--days", type=int, default=3)
+    lat = sub.add_parser("latency", help="Latency percentile per endpoint.")
+    lat.add_argument("--since-days", type=int, default=7)
+    lat.add_argument("--pct", type=float, default=95.0)
+    sub.add_parser("today", help="Results of the current check-in day.")
+    args = ap.parse_args()
+
+    if not args.db or not Path(args.db).expanduser().exists():
+        print("ERROR: history DB not found (use --db or CHECKIN_HISTORY_DB).")
+        return 1
+    store = HistoryStore(Path(args.db).expanduser())
+
+    if args.cmd == "failing":
+        rows = store.failing_streaks(args.days)
+        print(f"Failing {args.days}+ days in a row:")
+        for a, g, n in rows:
+            print(f"- {a} / {g} ({n} days)")
+        if not rows:
+            print("(none)")
+    elif args.cmd == "latency":
+        print(f"p{args.pct:g} latency per endpoint (last {args.since_days} days):")
+        for ep, n, ms in store.latency_percentiles(args.since_days, args.pct):
+            print(f"- {ep}: {ms:.0f} ms (n={n})")
+    else:
+        for a, g, st, rc, err in store.day_results():
+            print(f"- {a} / {g}: {st or 'failed'} (retcode={rc}){' ' + err if err else ''}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlsplit
+
+# Server clock offset, learned from the Date header of every live response.
+#
+# Signature timestamps (HoYoLAB DS "t=", Endfield "timestamp") use server_time(url) instead of
+# time.time(), so a runner with a drifting clock does not get its signatures rejected.
+# CHECKIN_CLOCK_SYNC=0 turns the correction off (skew is still measured).
+#
+# Offsets are kept per site (last two labels of the host: hoyolab.com, skport.com), since the
+# sign, info and record hosts of one service share a clock. Date has one-second resolution, so
+# each sample is (Date + 0.5) minus the midpoint of the request, smoothed with an EWMA.
+
+ALPHA = 0.2
+MAX_RTT_S = 5.0
+
+
+def clock_sync_enabled() -> bool:
+    return os.getenv("CHECKIN_CLOCK_SYNC", "").strip() != "0"
+
+
+def site_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "") if "//" in url else url
+    return ".".join(host.split(".")[-2:])
+
+
+class OffsetEstimator:
+    def __init__(self) -> None:
+        self.offset_s: Optional[float] = None
+        self.samples = 0
+
+    def add(self, sample_s: float) -> None:
+        self.offset_s = sample_s if self.offset_s is None else self.offset_s + ALPHA * (sample_s - self.offset_s)
+        self.samples += 1
+
+
+_estimators: dict[str, OffsetEstimator] = {}
+_lock = threading.Lock()
+
+
+def observe(url: str, headers: dict[str, str], sent_at: float, received_at: float) -> None:
+    # sent_at / received_at are local time.time() values around the request.
+    date = headers.get("Date") or headers.get("date")
+    if not date or received_at - sent_at > MAX_RTT_S:
+        return
+    try:
+        server = parsedate_to_datetime(date).timestamp() + 0.5
+    except (TypeError, ValueError):
+        return
+    sample = server - (sent_at + received_at) / 2
+    with _lock:
+        for key in (site_of(url), ""):
+            _estimators.setdefault(key, OffsetEstimator()).add(sample)
+
+
+def offset(url: str = "") -> float:
+    # Seconds to add to the local clock; unknown sites use the offset seen across all sites.
+    with _lock:
+        est = _estimators.get(site_of(url)) if url else None
+        if est is None or est.offset_s is None:
+            est = _estimators.get("")
+        return est.offset_s if est is not None and est.offset_s is not None else 0.0
+
+
+def server_time(url: str = "") -> float:
+    if not clock_sync_enabled():
+        return time.time()
+    return time.time() + offset(url)
+
+
+def metrics() -> list[dict]:
+    with _lock:
+        return [
+            {"site": k, "offset_s": round(e.offset_s or 0.0, 3), "samples": e.samples}
+            for k, e in sorted(_estimators.items())
+            if k
+        ]
+
+
+def prometheus_text(rows: list[dict]) -> str:
+    out = [
+        "# HELP checkin_clock_skew_seconds Server clock minus local clock, smoothed.",
+        "# TYPE checkin_clock_skew_seconds gauge",
+    ]
+    out += [f'checkin_clock_skew_seconds{{site="{r["site"]}"}} {r["offset_s"]}' for r in rows]
+    return "\n".join(out) + "\n"
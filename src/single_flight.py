@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+# Single-flight: concurrent calls with the same key share one execution and its result.
+#
+# Accounts often appear more than once (env vars, profile JSON, grabbed HARs); keying refresh /
+# info / sign calls by credential identity means duplicates cost one upstream call, and the
+# duplicate gets the original result instead of an "already claimed".
+#
+# A finished result is remembered for later callers when keep(result) is true (for ttl_s seconds,
+# or for the life of the instance when ttl_s is None). Exceptions are shared with the callers
+# that were waiting, never remembered.
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.at = 0.0
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self, ttl_s: Optional[float] = None) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call[T]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T], keep: Optional[Callable[[T], bool]] = None) -> tuple[T, bool]:
+        # Returns (result, shared); shared is True when another caller's execution was reused.
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done.is_set() and self.ttl_s is not None and time.monotonic() - call.at > self.ttl_s:
+                call = None
+            leader = call is None
+            if leader:
+                self._prune()
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            self._drop(key, call)
+            call.done.set()
+            raise
+        call.at = time.monotonic()
+        if keep is None or not keep(call.result):
+            self._drop(key, call)
+        call.done.set()
+        return call.result, False
+
+    def forget(self, key: Hashable) -> None:
+        # Drop a remembered result; an execution still in flight is left to finish.
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done.is_set():
+                del self._calls[key]
+
+    def _prune(self) -> None:
+        # Expired results of keys nobody asks for again (e.g. yesterday's signs); lock held.
+        if self.ttl_s is None:
+            return
+        now = time.monotonic()
+        for k in [k for k, c in self._calls.items() if c.done.is_set() and now - c.at > self.ttl_s]:
+            del self._calls[k]
+
+    def _drop(self, key: Hashable, call: _Call[T]) -> None:
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "src"), str(ROOT / "bench")]
+
+_ENV_PREFIXES = ("CHECKIN_", "HTTP_CASSETTE", "HTTP_TRANSPORT", "HOYOLAB_", "ENDFIELD_", "COOKIEGRAB_")
+_ENV_NAMES = ("LTUID", "LTOKEN", "COOKIE_TOKEN_V2", "CHROMIUM_V11_PASSWORD")
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(monkeypatch, tmp_path):
+    # No test sees the developer's accounts, caches or cassettes.
+    for k in list(os.environ):
+        if k.startswith(_ENV_PREFIXES) or k in _ENV_NAMES:
+            monkeypatch.delenv(k)
+    monkeypatch.setenv("CHECKIN_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("COOKIEGRAB_CACHE_DIR", str(tmp_path / "cookiegrab"))
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import sqlite3
+
+import pytest
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from browser_cookies_linux import LinuxCookieKeys, _decrypt_linux_cookie, _linux_batch_decrypt, derive_linux_key, export_cookies_from_profile
+from browser_profile_common import BrowserProfile
+
+HOST = ".hoyolab.com"
+
+
+def _v11(key: bytes, value: str, host: str = "") -> bytes:
+    prefix = hashlib.sha256(host.encode()).digest() if host else b""
+    p = padding.PKCS7(128).padder()
+    pt = p.update(prefix + value.encode("utf-8")) + p.finalize()
+    enc = Cipher(algorithms.AES(key), modes.CBC(b" " * 16)).encryptor()
+    return b"v11" + enc.update(pt) + enc.finalize()
+
+
+def _values(n: int) -> list[str]:
+    rng = random.Random(7)
+    return [rng.randbytes(rng.randrange(4, 48)).hex() for _ in range(n)]
+
+
+@pytest.fixture(scope="module")
+def keys() -> LinuxCookieKeys:
+    # The keyring password is tried first, then "peanuts": both are wrong for rows under "".
+    return LinuxCookieKeys.from_password("keyring-secret")
+
+
+def test_wrong_candidate_keys_are_skipped_with_host_hash(keys):
+    empty = derive_linux_key(b"")
+    values = _values(3000)
+    blobs = [_v11(empty, v, HOST) for v in values]
+    assert [_decrypt_linux_cookie(b, keys, True, HOST) for b in blobs] == values
+    assert _linux_batch_decrypt(keys, True)([(HOST, b) for b in blobs]) == values
+
+
+def test_wrong_candidate_keys_are_skipped_without_host_hash(keys):
+    empty = derive_linux_key(b"")
+    values = _values(3000)
+    blobs = [_v11(empty, v) for v in values]
+    assert [_decrypt_linux_cookie(b, keys, False, HOST) for b in blobs] == values
+    assert _linux_batch_decrypt(keys, False)([(HOST, b) for b in blobs]) == values
+
+
+def test_keyring_password_decrypts_first(keys):
+    blob = _v11(derive_linux_key(b"keyring-secret"), "v2_TOKEN", HOST)
+    assert _decrypt_linux_cookie(blob, keys, True, HOST) == "v2_TOKEN"
+
+
+def test_undecryptable_row(keys):
+    blob = _v11(derive_linux_key(b"another-password"), "v2_TOKEN", HOST)
+    assert _decrypt_linux_cookie(blob, keys, True, HOST) == ""
+    assert _linux_batch_decrypt(keys, True)([(HOST, blob)]) == [None]
+
+
+def test_wrong_key_with_valid_padding_fails_the_host_hash_check(keys):
+    # Decrypts cleanly under a candidate key (padding and printable text pass), but the first
+    # 32 bytes are not SHA256(host): rejected instead of stripped.
+    blob = _v11(derive_linux_key(b"peanuts"), "x" * 32 + "v2_TOKEN")
+    assert _decrypt_linux_cookie(blob, keys, True, HOST) == ""
+    assert _linux_batch_decrypt(keys, True)([(HOST, blob)]) == [None]
+    # Before DB version 24 there is no prefix to check.
+    assert _decrypt_linux_cookie(blob, keys, False, HOST) == "x" * 32 + "v2_TOKEN"
+
+
+@pytest.mark.parametrize("version", [23, 24])
+def test_export_reads_the_db_version(tmp_path, keys, version):
+    profile = BrowserProfile("test", tmp_path, "Default")
+    db = tmp_path / "Default" / "Cookies"
+    db.parent.mkdir()
+    con = sqlite3.connect(db)
+    con.executescript(
+        """
+        CREATE TABLE meta (key TEXT NOT NULL UNIQUE PRIMARY KEY, value TEXT);
+        CREATE TABLE cookies (
+            host_key TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, path TEXT NOT NULL,
+            expires_utc INTEGER NOT NULL, is_secure INTEGER NOT NULL, is_httponly INTEGER NOT NULL,
+            samesite INTEGER NOT NULL DEFAULT -1, encrypted_value BLOB DEFAULT ''
+        );
+        """
+    )
+    con.execute("INSERT INTO meta VALUES ('version', ?)", (str(version),))
+    key = derive_linux_key(b"keyring-secret")
+    rows = [
+        ("ltoken_v2", _v11(key, "v2_TOKEN", HOST if version >= 24 else "")),
+        # A v24 row without the prefix only decrypts by accident: dropped in a v24 DB.
+        ("ltuid_v2", _v11(key, "x" * 32 + "123")),
+    ]
+    con.executemany("INSERT INTO cookies VALUES (?, ?, '', '/', 0, 1, 1, -1, ?)", [(HOST, n, b) for n, b in rows])
+    con.commit()
+    con.close()
+
+    cookies, failed = export_cookies_from_profile(profile, domains=["hoyolab.com"], keys=keys)
+    got = {c.name: c.value for c in cookies}
+    assert got["ltoken_v2"] == "v2_TOKEN"
+    if version >= 24:
+        assert "ltuid_v2" not in got and failed == 1
+    else:
+        assert got["ltuid_v2"] == "x" * 32 + "123" and failed == 0
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from checkin_client import ATTEND_URL, BINDING_URL, GAME_RECORD_CARD_URL, REFRESH_URL, EndfieldCredentials, hoyolab_games
+from http_cassette import MASKED
+from reward_catalog import HOME_URLS
+from run_history import checkin_day
+
+# End-to-end runs of the check-in CLIs against a replayed cassette (no network), single-process
+# and with process_runner workers. Results are checked in the history DB and the shared caches.
+
+ROOT = Path(__file__).resolve().parents[1]
+ACCOUNTS = 12
+AWARDS = [{"name": f"報酬{i}", "cnt": i} for i in range(1, 32)]
+
+
+def _it(method: str, url: str, body: dict, status: int = 200) -> dict:
+    return {
+        "method": method,
+        "url": url,
+        "status": status,
+        "response_headers": {"Content-Type": "application/json"},
+        "response_body": json.dumps(body, ensure_ascii=False),
+        "elapsed_s": 0.01,
+    }
+
+
+def _write_cassette(path: Path, interactions: list[dict]) -> None:
+    path.write_text("".join(json.dumps(it, ensure_ascii=False) + "\n" for it in interactions), encoding="utf-8")
+
+
+def _hoyolab_cassette(path: Path, *, catalog: bool) -> None:
+    urls = {g.signgame: g for g in hoyolab_games()}
+    its = [
+        # Every account owns Genshin and Star Rail only.
+        _it("GET", f"{GAME_RECORD_CARD_URL}?uid={MASKED}", {"retcode": 0, "data": {"list": [{"game_id": 2}, {"game_id": 6}]}}),
+        _it("POST", urls["hk4e"].url, {"retcode": 0, "message": "OK"}),
+        _it("POST", urls["hkrpg"].url, {"retcode": -5003, "message": "already signed in"}),
+        _it("POST", urls["bh3"].url, {"retcode": 0, "message": "OK"}),
+        _it("POST", urls["zzz"].url, {"retcode": 0, "message": "OK"}),
+    ]
+    if catalog:
+        g = urls["hk4e"]
+        its.append(_it("GET", f"{HOME_URLS['hk4e']}?act_id={g.act_id}&lang=ja-jp", {"retcode": 0, "data": {"awards": AWARDS}}))
+    _write_cassette(path, its)
+
+
+def _endfield_cassette(path: Path) -> None:
+    roles = [{"roleId": "11", "serverId": "1"}, {"roleId": "12", "serverId": "2"}]
+    _write_cassette(path, [
+        _it("GET", REFRESH_URL, {"code": 0, "data": {"token": MASKED}}),
+        _it("GET", BINDING_URL, {"code": 0, "data": {"list": [{"appCode": "endfield", "bindingList": [{"roles": roles}]}]}}),
+        _it("POST", ATTEND_URL, {"code": 0, "data": {"awardIds": [{"id": "1"}], "resourceInfoMap": {"1": {"name": "Gold", "count": 5}}}}),
+    ])
+
+
+def _run(script: str, procs: int, tmp_path: Path, monkeypatch, cassette: Path, env: dict[str, str]) -> subprocess.CompletedProcess:
+    monkeypatch.setenv("HTTP_CASSETTE", str(cassette))
+    monkeypatch.setenv("HTTP_CASSETTE_MODE", "replay")
+    monkeypatch.setenv("HTTP_CASSETTE_LATENCY", "0")
+    monkeypatch.setenv("CHECKIN_HISTORY_DB", str(tmp_path / "history.db"))
+    monkeypatch.setenv("CHECKIN_WORKERS", "4")
+    monkeypatch.setenv("CHECKIN_BATCH_SIZE", "2")
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    proc = subprocess.run(
+        [sys.executable, str(ROOT / "src" / script), "--procs", str(procs)],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert "Traceback" not in proc.stderr
+    # Only process_runner reports results as "== [hoyolab] ..." / "== [endfield] ...".
+    assert any(f"== [{source}] " in proc.stdout for source in ("hoyolab", "endfield")) == (procs > 1)
+    return proc
+
+
+def _rows(tmp_path: Path) -> list[tuple]:
+    con = sqlite3.connect(tmp_path / "history.db")
+    try:
+        return con.execute("SELECT account, game, ok, status, awards, error FROM results ORDER BY account, game").fetchall()
+    finally:
+        con.close()
+
+
+def _cache(tmp_path: Path, name: str) -> dict:
+    return json.loads((tmp_path / "cache" / name).read_text(encoding="utf-8"))
+
+
+def _cred_key(profile: dict) -> str:
+    return EndfieldCredentials.from_profile(profile).key
+
+
+def _hoyolab_env() -> dict[str, str]:
+    accounts = [{"accountName": f"acc{i:02d}", "ltuid": str(1000 + i), "ltoken": "t", "cookieToken": "c"} for i in range(ACCOUNTS)]
+    return {"HOYOLAB_PROFILES_JSON": json.dumps(accounts)}
+
+
+@pytest.mark.parametrize("procs", [1, 3])
+def test_hoyolab_run(tmp_path, monkeypatch, procs):
+    cassette = tmp_path / "hoyolab.jsonl"
+    _hoyolab_cassette(cassette, catalog=True)
+    _run("checkin.py", procs, tmp_path, monkeypatch, cassette, _hoyolab_env())
+
+    rows = _rows(tmp_path)
+    # Games the record card does not list are never signed.
+    assert {(game, ok, status) for _acc, game, ok, status, _aw, _err in rows} == {("hk4e", 1, "claimed"), ("hkrpg", 1, "already-claimed")}
+    assert len(rows) == 2 * ACCOUNTS
+    # First claim of the month in a fresh history: day 1 of the catalog, an estimate unless today is the 1st.
+    suffix = "" if checkin_day().endswith("-01") else " (推定)"
+    assert {aw for _acc, game, _ok, _st, aw, _err in rows if game == "hk4e"} == {json.dumps([f"報酬1 x1{suffix}"], ensure_ascii=False)}
+    assert len(_cache(tmp_path, "game_ownership.json")) == ACCOUNTS
+    assert len(_cache(tmp_path, f"reward_catalog_{checkin_day()[:7]}.json")["hoyolab"]["hk4e"]) == len(AWARDS)
+
+
+@pytest.mark.parametrize("procs", [1, 3])
+def test_hoyolab_run_without_catalog(tmp_path, monkeypatch, procs):
+    # No reward "home" responses in the cassette: the lookup misses, the run and its history do not.
+    cassette = tmp_path / "hoyolab.jsonl"
+    _hoyolab_cassette(cassette, catalog=False)
+    proc = _run("checkin.py", procs, tmp_path, monkeypatch, cassette, _hoyolab_env())
+
+    rows = _rows(tmp_path)
+    assert len(rows) == 2 * ACCOUNTS
+    assert all(ok == 1 and aw is None for _acc, _game, ok, _st, aw, _err in rows)
+    assert "reward catalog fetch failed for hk4e" in proc.stderr
+
+
+@pytest.mark.parametrize("procs", [1, 3])
+def test_endfield_run(tmp_path, monkeypatch, procs):
+    cassette = tmp_path / "endfield.jsonl"
+    _endfield_cassette(cassette)
+    profiles = [{"accountName": f"ef{i:02d}", "cred": f"CRED{i}", "skGameRole": "auto"} for i in range(ACCOUNTS)]
+    _run("endfield_checkin.py", procs, tmp_path, monkeypatch, cassette, {"ENDFIELD_PROFILES_JSON": json.dumps(profiles)})
+
+    rows = _rows(tmp_path)
+    # Two roles per cred, recorded by cred hash and role number.
+    assert sorted(acc for acc, *_ in rows) == sorted(f"{_cred_key(p)}#{k}" for p in profiles for k in (1, 2))
+    assert {(game, ok, status, aw) for _acc, game, ok, status, aw, _err in rows} == {("endfield", 1, "claimed", '["Gold x5"]')}
+    roles = _cache(tmp_path, "endfield_roles.json")
+    assert len(roles) == ACCOUNTS
+    assert all(ent["roles"] == ["3_11_1", "3_12_2"] for ent in roles.values())
+
+
+@pytest.mark.parametrize("procs", [1, 3])
+def test_endfield_skip_done_is_per_cred(tmp_path, monkeypatch, procs):
+    # Profiles that keep the default name must not skip each other as "claimed earlier today".
+    cassette = tmp_path / "endfield.jsonl"
+    _endfield_cassette(cassette)
+    first, second = {"cred": "CRED_A", "skGameRole": "auto"}, {"cred": "CRED_B", "skGameRole": "auto"}
+    monkeypatch.setenv("CHECKIN_SKIP_DONE", "1")
+    _run("endfield_checkin.py", procs, tmp_path, monkeypatch, cassette, {"ENDFIELD_PROFILES_JSON": json.dumps([first])})
+    _run("endfield_checkin.py", procs, tmp_path, monkeypatch, cassette, {"ENDFIELD_PROFILES_JSON": json.dumps([first, second])})
+
+    claimed = sorted(acc for acc, _game, _ok, status, _aw, _err in _rows(tmp_path) if status == "claimed")
+    assert claimed == sorted(f"{_cred_key(p)}#{k}" for p in (first, second) for k in (1, 2))
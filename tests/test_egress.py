@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import socket
+import threading
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import egress
+import http_cassette
+import http_transport
+from checkin_client import EndfieldCredentials
+from egress import Egress, EgressPool, TokenBucket, account_context, parse_egress
+
+
+def _pool() -> EgressPool:
+    return EgressPool([parse_egress(f"http://10.0.0.{i}:3128") for i in range(1, 5)])
+
+
+def test_unnamed_endfield_profiles_spread_over_egresses():
+    pool = _pool()
+    keys = [EndfieldCredentials.from_profile({"cred": f"CRED{i}"}).key for i in range(200)]
+    used = Counter(pool.pick(k).name for k in keys)
+    assert len(used) == 4
+    assert min(used.values()) > 20
+
+
+def test_endfield_key_is_stable_and_hides_the_cred():
+    a = EndfieldCredentials.from_profile({"cred": "SECRETCRED", "accountName": "main"})
+    b = EndfieldCredentials.from_profile({"cred": "SECRETCRED"})
+    assert a.key == b.key
+    assert "SECRETCRED" not in a.key
+    assert _pool().pick(a.key) is not None
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, s: float) -> None:
+        self.slept.append(s)
+        self.now += s
+
+
+def test_token_bucket_rate_limit():
+    clock = _Clock()
+    bucket = TokenBucket(2, 2, clock, clock.sleep)
+    assert bucket.acquire() and bucket.acquire()
+    assert clock.slept == []
+    # Burst used up: the next token comes 1 / rate later.
+    assert not bucket.acquire(timeout=0.1)
+    assert bucket.acquire(timeout=1)
+    assert clock.slept == [pytest.approx(0.5)]
+    clock.now += 10
+    assert bucket.acquire() and bucket.acquire()
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def _account_on(pool: EgressPool, name: str) -> str:
+    return next(a for a in (f"acc{i}" for i in range(1000)) if pool.pick(a).name == name)
+
+
+def test_failover_after_max_fails_and_recovery_after_cooldown(monkeypatch):
+    monkeypatch.setenv("CHECKIN_EGRESS", "http://10.0.0.1:3128,http://10.0.0.2:3128,http://10.0.0.3:3128")
+    monkeypatch.setenv("CHECKIN_EGRESS_MAX_FAILS", "2")
+    monkeypatch.setenv("CHECKIN_EGRESS_COOLDOWN_S", "30")
+    monkeypatch.setenv("CHECKIN_EGRESS_RPS", "0")
+    clock = _Clock()
+    pool = EgressPool.from_env(clock)
+    first = pool.egresses[0]
+    account = _account_on(pool, first.name)
+
+    first.report(False)
+    first.report(True)
+    first.report(False)
+    # Failures must be consecutive.
+    assert pool.pick(account) is first
+    first.report(False)
+    moved = pool.pick(account)
+    assert moved is not first
+    # Other accounts keep their egress.
+    other = _account_on(pool, moved.name)
+    assert pool.pick(other) is moved
+
+    clock.now += 29
+    assert pool.pick(account) is moved
+    clock.now += 2
+    assert pool.pick(account) is first
+
+
+def test_all_down_picks_the_one_back_soonest():
+    clock = _Clock()
+    pool = EgressPool([Egress(f"e{i}", max_fails=1, cooldown_s=10 + i, clock=clock) for i in range(3)])
+    for e in pool.egresses:
+        e.report(False)
+    assert pool.pick("any").name == "e0"
+
+
+# ---- through the transport, with local stand-in servers --------------------------------------
+
+
+class _Origin(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.seen.append(self.client_address[0])
+        body = b"origin:" + self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Proxy(BaseHTTPRequestHandler):
+    # Plain HTTP forward proxy: the request line carries the absolute URL.
+    def do_GET(self):
+        self.server.seen.append(self.path)
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        with opener.open(self.path, timeout=5) as r:
+            body = r.read()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Via", "1.1 test-proxy")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(handler) -> ThreadingHTTPServer:
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        srv.seen = []
+        threading.Thread(target=srv.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(srv)
+        return srv
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _use_pool(monkeypatch, pool: EgressPool) -> None:
+    monkeypatch.setattr(egress, "_pool", pool)
+    monkeypatch.setattr(egress, "_pool_loaded", True)
+    monkeypatch.setattr(http_cassette, "_active", None)
+    monkeypatch.setattr(http_cassette, "_active_loaded", True)
+    monkeypatch.setattr(http_transport, "_egress_sessions", {})
+
+
+def _get(url: str, account: str):
+    with account_context(account):
+        return http_transport.request("GET", url, headers={}, timeout=5)
+
+
+def test_requests_go_through_the_proxy(monkeypatch, serve):
+    origin, proxy = serve(_Origin), serve(_Proxy)
+    e = parse_egress(f"http://127.0.0.1:{proxy.server_port}")
+    _use_pool(monkeypatch, EgressPool([e]))
+    url = f"http://127.0.0.1:{origin.server_port}/sign?x=1"
+    r = _get(url, "acc")
+    assert (r.status, r.text, r.headers.get("Via")) == (200, "origin:/sign?x=1", "1.1 test-proxy")
+    assert proxy.seen == [url]
+    assert e.requests == 1
+
+
+def test_source_egress_binds_the_local_address(monkeypatch, serve):
+    origin = serve(_Origin)
+    _use_pool(monkeypatch, EgressPool([parse_egress("source:127.0.0.2")]))
+    r = _get(f"http://127.0.0.1:{origin.server_port}/x", "acc")
+    assert r.text == "origin:/x"
+    assert origin.seen == ["127.0.0.2"]
+
+
+def test_unreachable_proxy_fails_over(monkeypatch, serve):
+    origin, proxy = serve(_Origin), serve(_Proxy)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead_port = s.getsockname()[1]
+    dead = Egress(f"http://127.0.0.1:{dead_port}", proxy=f"http://127.0.0.1:{dead_port}", max_fails=2, cooldown_s=60)
+    live = Egress(f"http://127.0.0.1:{proxy.server_port}", proxy=f"http://127.0.0.1:{proxy.server_port}", max_fails=2, cooldown_s=60)
+    pool = EgressPool([dead, live])
+    _use_pool(monkeypatch, pool)
+    account = _account_on(pool, dead.name)
+    url = f"http://127.0.0.1:{origin.server_port}/a"
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            _get(url, account)
+    assert _get(url, account).text == "origin:/a"
+    assert proxy.seen == [url]
+    assert (dead.requests, live.requests) == (2, 1)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+import fixtures
+from cookiegrab import extract_all_from_har
+from har_stream import PREFILTER_NEEDLES, load_har_requests
+
+
+def _relevant(entry: dict) -> bool:
+    # What the prefilter keeps: requests whose JSON contains one of its needles.
+    raw = json.dumps(entry["request"], ensure_ascii=False).encode("utf-8")
+    return any(n in raw for n in PREFILTER_NEEDLES)
+
+
+def _assert_prefilter_matches_full_parse(path: Path) -> None:
+    fast = load_har_requests(path, prefilter=True)["log"]["entries"]
+    full = load_har_requests(path, prefilter=False)["log"]["entries"]
+    assert fast == [e for e in full if _relevant(e)]
+    assert extract_all_from_har({"log": {"entries": fast}}) == extract_all_from_har({"log": {"entries": full}})
+
+
+def _entry(url: str, headers: dict[str, str], body: str = "", **extra) -> dict:
+    return {
+        "request": {"method": "GET", "url": url, "headers": [{"name": k, "value": v} for k, v in headers.items()], "queryString": []},
+        "response": {"status": 200, "content": {"text": body, "mimeType": "application/json"}},
+        **extra,
+    }
+
+
+def _tricky_har() -> dict:
+    sign = "https://sg-public-api.hoyolab.com/event/luna/os/sign"
+    return {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "テスト", "version": "1"},
+            "entries": [
+                # Non-ASCII before the requests: byte offsets must not drift.
+                _entry("https://example.com/日本語?q=ü", {"Accept": "*/*", "X-Name": "名前"}),
+                # "request" / cookie inside response bodies is escaped text, not a key.
+                _entry("https://example.com/api", {"Accept": "*/*"}, body=json.dumps({"request": {"url": sign, "headers": [{"name": "cookie", "value": "ltuid_v2=9"}]}})),
+                _entry(sign, {"Cookie": "ltuid_v2=1; ltoken_v2=v2_TOKEN; cookie_token_v2=v2_CT", "Accept": "*/*"}),
+                _entry("https://zonai.skport.com/web/v1/game/endfield/attendance", {"cred": "CRED", "sk-game-role": "3_1_1", "platform": "3", "vname": "1.0.0"}),
+                _entry("https://cdn.example.com/a.js", {"cookie": "session=1"}),
+                # Large request object: decoded past the first read window.
+                _entry("https://example.com/big", {f"x-{i}": "v" * 100 for i in range(200)} | {"Cookie": "a=b"}),
+                # An entry whose request is not an object.
+                {"request": "broken", "response": {}},
+            ],
+        }
+    }
+
+
+def test_bench_fixture(tmp_path):
+    p = tmp_path / "bench.har"
+    fixtures.write_har(p, 256 * 1024)
+    _assert_prefilter_matches_full_parse(p)
+    fast = load_har_requests(p)
+    found = extract_all_from_har(fast)
+    assert found["hoyolab"]["LTOKEN"] == fixtures.HOYOLAB_COOKIES["ltoken_v2"]
+    assert found["endfield"]["ENDFIELD_CRED"] == fixtures.ENDFIELD_HEADERS["cred"]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_tricky_har(tmp_path, indent):
+    p = tmp_path / "tricky.har"
+    p.write_text(json.dumps(_tricky_har(), ensure_ascii=False, indent=indent), encoding="utf-8")
+    _assert_prefilter_matches_full_parse(p)
+    urls = [e["request"]["url"] for e in load_har_requests(p)["log"]["entries"]]
+    assert "https://example.com/api" not in urls
+    assert "https://example.com/big" in urls
+
+
+def test_without_needles_falls_back_to_full_parse(tmp_path):
+    p = tmp_path / "plain.har"
+    p.write_text(json.dumps({"log": {"entries": [_entry("https://example.com/", {"Accept": "*/*"})]}}), encoding="utf-8")
+    assert load_har_requests(p, prefilter=True) == load_har_requests(p, prefilter=False)
+    assert len(load_har_requests(p)["log"]["entries"]) == 1
+
+
+def test_compressed_har_is_parsed_in_full(tmp_path):
+    plain = tmp_path / "a.har"
+    plain.write_text(json.dumps(_tricky_har(), ensure_ascii=False), encoding="utf-8")
+    gz = tmp_path / "a.har.gz"
+    gz.write_bytes(gzip.compress(plain.read_bytes()))
+    assert load_har_requests(gz) == load_har_requests(plain, prefilter=False)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import json
+import zipfile
+
+from cookiegrab import extract_all_from_har
+from har_watch import is_har_name, watch_dir
+
+HAR = {
+    "log": {
+        "entries": [
+            {
+                "request": {
+                    "url": "https://sg-public-api.hoyolab.com/event/luna/os/sign",
+                    "headers": [{"name": "Cookie", "value": "ltuid_v2=1; ltoken_v2=v2_TOKEN; cookie_token_v2=v2_CT"}],
+                }
+            }
+        ]
+    }
+}
+
+
+def test_watched_suffixes():
+    for name in ("a.har", "A.HAR", "a.har.gz", "a.har.zst", "export.zip"):
+        assert is_har_name(name)
+    for name in ("a.json", "a.txt", "a.gz"):
+        assert not is_har_name(name)
+
+
+def test_zipped_har_is_processed(tmp_path):
+    inbox = tmp_path / "Downloads"
+    inbox.mkdir()
+    with zipfile.ZipFile(inbox / "export.zip", "w") as zf:
+        zf.writestr("hoyolab.har", json.dumps(HAR))
+    (inbox / "notes.txt").write_text("not a har", encoding="utf-8")
+    out = tmp_path / "hars.jsonl"
+
+    assert watch_dir(inbox, out, extract=extract_all_from_har, show=str, once=True) == 1
+    rec = json.loads(out.read_text(encoding="utf-8"))
+    assert rec["file"].endswith("export.zip")
+    assert rec["hoyolab"]["LTOKEN"] == "v2_TOKEN"
+    # Already seen: not processed again.
+    assert watch_dir(inbox, out, extract=extract_all_from_har, show=str, once=True) == 0
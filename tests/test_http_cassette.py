@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import json
+
+from http_cassette import MASKED, Cassette, mask_url
+
+CARD = "https://bbs-api-os.hoyolab.com/game_record/card/wapi/getGameRecordCard"
+
+
+def _live(text: str = '{"retcode":0}'):
+    return lambda: (200, {"Content-Type": "application/json"}, text, 0.01)
+
+
+def test_mask_url_masks_account_ids_only():
+    assert mask_url(f"{CARD}?uid=123456789&lang=ja-jp") == f"{CARD}?uid={MASKED}&lang=ja-jp"
+    assert mask_url(f"{CARD}?lang=ja-jp") == f"{CARD}?lang=ja-jp"
+    assert mask_url(CARD) == CARD
+
+
+def test_recorded_cassette_has_no_ltuid(tmp_path):
+    path = tmp_path / "c.jsonl"
+    rec = Cassette(path, "record")
+    rec.send("GET", f"{CARD}?uid=123456789", {"Cookie": "ltuid_v2=123456789; ltoken_v2=x"}, None, _live())
+    text = path.read_text(encoding="utf-8")
+    assert "123456789" not in text
+    assert json.loads(text)["url"] == f"{CARD}?uid={MASKED}"
+
+
+def test_replay_matches_the_masked_url(tmp_path):
+    path = tmp_path / "c.jsonl"
+    Cassette(path, "record").send("GET", f"{CARD}?uid=111", {}, None, _live('{"retcode":0,"data":{}}'))
+    rep = Cassette(path, "replay", latency_scale=0)
+    status, _headers, text, _elapsed = rep.send("GET", f"{CARD}?uid=222", {}, None, _live("unused"))
+    assert (status, text) == (200, '{"retcode":0,"data":{}}')
+
+
+def test_replay_masks_urls_of_older_cassettes(tmp_path):
+    path = tmp_path / "c.jsonl"
+    it = {"method": "GET", "url": f"{CARD}?uid=111", "status": 200, "response_body": "ok", "elapsed_s": 0}
+    path.write_text(json.dumps(it) + "\n", encoding="utf-8")
+    rep = Cassette(path, "replay", latency_scale=0)
+    assert rep.send("GET", f"{CARD}?uid=999", {}, None, _live("unused"))[2] == "ok"
+
+
+def test_record_with_sink_leaves_the_file_to_its_owner(tmp_path):
+    path = tmp_path / "c.jsonl"
+    owner = Cassette(path, "record")
+    owner.send("GET", f"{CARD}?uid=1", {}, None, _live())
+    worker = Cassette(path, "record", sink=owner.append)
+    worker.send("GET", f"{CARD}?uid=2", {}, None, _live())
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 2
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+import time
+
+from job_queue import JobQueue, RetryPolicy, is_transient_result
+from run_deadline import Deadline
+
+
+def _skip(job) -> dict:
+    return {"ok": False, "skipped": True, "job": job}
+
+
+def _queue(jobs, run, deadline=None, max_attempts=3, delay_s=0.01) -> JobQueue:
+    return JobQueue(jobs, run, is_transient=is_transient_result, on_skip=_skip, deadline=deadline, policy=RetryPolicy(max_attempts, delay_s))
+
+
+def test_transient_results_are_retried_until_ok():
+    calls: dict[str, list[int]] = {}
+    lock = threading.Lock()
+
+    def run(job, attempt):
+        with lock:
+            calls.setdefault(job, []).append(attempt)
+        if job == "flaky" and attempt < 3:
+            return {"ok": False, "http": 503}
+        return {"ok": True}
+
+    res = _queue(["a", "flaky", "b"], run).run(2)
+    assert [r["ok"] for r in res] == [True, True, True]
+    assert res[1]["attempts"] == 3
+    assert calls["flaky"] == [1, 2, 3]
+    assert calls["a"] == [1] and calls["b"] == [1]
+
+
+def test_permanent_errors_and_attempt_limit():
+    attempts: list[tuple[str, int]] = []
+
+    def run(job, attempt):
+        attempts.append((job, attempt))
+        if job == "denied":
+            return {"ok": False, "http": 403}
+        if job == "raises":
+            raise RuntimeError("boom")
+        return {"ok": False, "http": 429}
+
+    res = _queue(["denied", "raises", "throttled"], run, max_attempts=2).run(1)
+    assert res[0]["attempts"] == 1
+    # An exception carries no transient marker or status: not retried.
+    assert res[1] == {"ok": False, "error": "boom", "attempts": 1}
+    assert res[2]["attempts"] == 2
+    assert sorted(attempts) == [("denied", 1), ("raises", 1), ("throttled", 1), ("throttled", 2)]
+
+
+def test_retries_do_not_block_fresh_jobs():
+    order: list[str] = []
+
+    def run(job, attempt):
+        order.append(f"{job}{attempt}")
+        if job == "slow" and attempt == 1:
+            return {"ok": False, "transient": True}
+        return {"ok": True}
+
+    _queue(["slow", "x", "y"], run, delay_s=0.2).run(1)
+    # The retry waits in the delay queue while the single worker takes the other jobs.
+    assert order == ["slow1", "x1", "y1", "slow2"]
+
+
+def test_expired_deadline_skips_jobs():
+    ran: list[str] = []
+
+    def run(job, attempt):
+        ran.append(job)
+        return {"ok": True}
+
+    res = _queue(["a", "b"], run, deadline=Deadline(time.time() - 1)).run(2)
+    assert ran == []
+    assert res == [_skip("a"), _skip("b")]
+
+
+def test_retry_that_does_not_fit_the_deadline_keeps_the_last_result():
+    def run(job, attempt):
+        return {"ok": False, "http": 500, "attempt": attempt}
+
+    # Enough budget to start the first attempt, not to wait for a 10 s retry delay.
+    res = _queue(["a"], run, deadline=Deadline(time.time() + 5), delay_s=10).run(1)
+    assert res == [{"ok": False, "http": 500, "attempt": 1, "attempts": 1}]
+
+
+def test_deadline_reached_while_a_retry_waits():
+    deadline = Deadline(time.time() + 1.3)
+    calls: list[int] = []
+
+    def run(job, attempt):
+        calls.append(attempt)
+        return {"ok": False, "http": 502}
+
+    # The retry is queued (1.3 s left > ~0.5 s delay) but cannot start: can_start needs
+    # more than MIN_JOB_ESTIMATE_S (1 s) left when it comes up.
+    res = _queue(["a"], run, deadline=deadline, delay_s=0.5).run(1)
+    assert calls == [1]
+    assert res[0]["attempts"] == 1 and res[0]["http"] == 502
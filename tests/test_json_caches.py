@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import checkin_client
+import game_ownership
+import json_cache
+from checkin_client import HoyolabCredentials, cached_roles
+from game_ownership import OwnershipCache
+from reward_catalog import cache_dir
+
+ACCOUNTS = 12
+
+
+def _run_together(fn, args: list) -> list:
+    # Start every call at once so the cache writes overlap.
+    gate = threading.Barrier(len(args))
+
+    def call(a):
+        gate.wait()
+        return fn(a)
+
+    with ThreadPoolExecutor(max_workers=len(args)) as ex:
+        return list(ex.map(call, args))
+
+
+def test_ownership_cache_keeps_every_account(monkeypatch):
+    monkeypatch.setattr(game_ownership.HoyolabClient, "owned_games", lambda self: {"hk4e", "hkrpg"})
+    cache = OwnershipCache()
+    creds = [HoyolabCredentials(ltuid=str(1000 + i), ltoken="t") for i in range(ACCOUNTS)]
+    assert _run_together(cache.owned, creds) == [{"hk4e", "hkrpg"}] * ACCOUNTS
+    assert len(json.loads((cache_dir() / "game_ownership.json").read_text(encoding="utf-8"))) == ACCOUNTS
+
+
+def test_cached_roles_keeps_every_cred(monkeypatch):
+    monkeypatch.setattr(checkin_client, "discover_roles", lambda cred, *a, **kw: [f"3_{cred}_1"])
+    creds = [f"CRED{i}" for i in range(ACCOUNTS)]
+    assert _run_together(lambda c: cached_roles(c, "3", "1.0.0"), creds) == [[f"3_{c}_1"] for c in creds]
+    data = json.loads((cache_dir() / "endfield_roles.json").read_text(encoding="utf-8"))
+    assert sorted(e["roles"][0] for e in data.values()) == sorted(f"3_{c}_1" for c in creds)
+    assert not list(cache_dir().glob("*.tmp"))
+
+
+def test_write_merges_entries_of_other_writers(tmp_path):
+    path = tmp_path / "c.json"
+    a = json_cache.JsonCache(path)
+    b = json_cache.JsonCache(path)
+    a.put("x", 1)
+    b.put("y", 2)
+    b.put("n", {"k": 1}, section="s")
+    a.put("m", {"k": 2}, section="s")
+    assert json.loads(path.read_text(encoding="utf-8")) == {"x": 1, "y": 2, "s": {"n": {"k": 1}, "m": {"k": 2}}}
+
+
+def test_forwarded_writes_do_not_touch_the_file(tmp_path):
+    path = tmp_path / "c.json"
+    sent: list = []
+    json_cache.forward_writes(lambda p, updates: sent.append((p, updates)))
+    try:
+        c = json_cache.JsonCache(path)
+        c.put("x", 1)
+        assert c.get("x") == 1
+    finally:
+        json_cache.forward_writes(None)
+    assert not path.exists()
+    json_cache.JsonCache(path).put_many(sent[0][1])
+    assert json.loads(path.read_text(encoding="utf-8")) == {"x": 1}
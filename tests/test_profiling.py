@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import argparse
+import pstats
+import threading
+
+import profiling
+
+
+def _busy() -> int:
+    return sum(range(10000))
+
+
+def test_profile_covers_worker_threads(tmp_path):
+    prefix = tmp_path / "run"
+    with profiling.profile_run("test", str(prefix)):
+        threads = [threading.Thread(target=_busy) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    stats = pstats.Stats(str(prefix) + ".pstats")
+    calls = [v[1] for k, v in stats.stats.items() if k[2] == "_busy"]
+    assert calls == [3]
+
+
+def test_child_profiles_are_merged(tmp_path):
+    # Stands in for a process_runner worker, which writes <child_prefix>.pstats before exiting.
+    child = str(tmp_path / "run.w0")
+    with profiling.profile_threads(child):
+        _busy()
+    prefix = tmp_path / "run"
+    assert profiling.child_prefix("w0") is None
+    with profiling.profile_run("test", str(prefix)):
+        assert profiling.child_prefix("w0") == child
+        profiling.add_child_stats(child + ".pstats")
+    stats = pstats.Stats(str(prefix) + ".pstats")
+    assert any(k[2] == "_busy" for k in stats.stats)
+
+
+def test_flag_does_not_shadow_profile_directory():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profile-directory", default=None)
+    profiling.add_profile_args(ap)
+    args = ap.parse_args(["--profile", "Profile 1"])
+    assert args.profile_directory == "Profile 1"
+    assert not args.profile
+    assert ap.parse_args(["--cprofile"]).profile
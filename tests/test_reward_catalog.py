@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import uuid
+
+import pytest
+
+import checkin
+import reward_catalog
+from http_cassette import CassetteMiss
+from http_transport import HttpResponse
+from reward_catalog import RewardCatalog
+from run_history import HistoryStore, checkin_day
+
+AWARDS = json.dumps({"retcode": 0, "data": {"awards": [{"name": f"Item{d}", "cnt": d} for d in range(1, 32)]}})
+GENSHIN = next(g for g in checkin.games if g[3] == "hk4e")
+
+
+def _respond(monkeypatch, fn):
+    monkeypatch.setattr(reward_catalog.http_transport, "request", lambda *a, **kw: fn())
+
+
+def _raise(exc: Exception):
+    def fn():
+        raise exc
+
+    return fn
+
+
+@pytest.mark.parametrize(
+    "fetch",
+    [
+        _raise(CassetteMiss("cassette: no recorded response for GET /home")),
+        _raise(RuntimeError("boom")),
+        lambda: HttpResponse(200, "[]"),
+        lambda: HttpResponse(200, "null"),
+        lambda: HttpResponse(200, '{"data":"x"}'),
+        lambda: HttpResponse(200, '{"data":{"awards":{"0":1}}}'),
+        lambda: HttpResponse(502, "<html>bad gateway</html>"),
+    ],
+)
+def test_resolve_never_raises(monkeypatch, tmp_path, fetch):
+    _respond(monkeypatch, fetch)
+    cat = RewardCatalog(path=tmp_path / "catalog.json")
+    assert cat.resolve_hoyolab("hk4e", GENSHIN[1], 1) == ""
+
+
+def test_resolve_by_day(monkeypatch, tmp_path):
+    _respond(monkeypatch, lambda: HttpResponse(200, AWARDS))
+    cat = RewardCatalog(path=tmp_path / "catalog.json")
+    assert cat.resolve_hoyolab("hk4e", GENSHIN[1], 2) == "Item2 x2"
+    assert cat.resolve_hoyolab("hk4e", GENSHIN[1], 32) == ""
+
+
+def _history(tmp_path) -> HistoryStore:
+    return HistoryStore(tmp_path / "history.db")
+
+
+def _claimed_on(history: HistoryStore, account: str, day: str) -> None:
+    con = sqlite3.connect(str(history.path))
+    con.execute(
+        "INSERT INTO results (run_id, account, game, day, ts, ok, status) VALUES (?, ?, 'hk4e', ?, 0, 1, 'claimed')",
+        (uuid.uuid4().hex, account, day),
+    )
+    con.commit()
+    con.close()
+
+
+@pytest.fixture
+def catalog(monkeypatch, tmp_path):
+    _respond(monkeypatch, lambda: HttpResponse(200, AWARDS))
+    cat = RewardCatalog(path=tmp_path / "catalog.json")
+    monkeypatch.setattr(checkin, "shared_catalog", lambda: cat)
+    return cat
+
+
+def test_award_is_an_estimate_without_full_month_history(catalog, tmp_path):
+    today = checkin_day()
+    if today.endswith("-01"):
+        pytest.skip("every history covers the month on its first day")
+    history = _history(tmp_path)
+    res = {"ok": True, "status": "claimed"}
+    checkin.record_results(history, "run", [({"accountName": "a"}, GENSHIN, res)], None)
+    assert res["awards"] == ["Item1 x1 (推定)"]
+
+
+def test_award_is_exact_with_full_month_history(catalog, tmp_path):
+    today = checkin_day()
+    history = _history(tmp_path)
+    for d in range(1, int(today[8:])):
+        _claimed_on(history, "a", f"{today[:8]}{d:02d}")
+    res = {"ok": True, "status": "claimed"}
+    checkin.record_results(history, "run", [({"accountName": "a"}, GENSHIN, res)], None)
+    day = int(today[8:])
+    assert res["awards"] == [f"Item{day} x{day}"]
+
+
+def test_catalog_failure_does_not_fail_record_results(monkeypatch, tmp_path):
+    _respond(monkeypatch, _raise(CassetteMiss("no /home")))
+    monkeypatch.setattr(checkin, "shared_catalog", lambda: RewardCatalog(path=tmp_path / "catalog.json"))
+    history = _history(tmp_path)
+    res = {"ok": True, "status": "claimed"}
+    checkin.record_results(history, "run", [({"accountName": "a"}, GENSHIN, res)], None)
+    assert "awards" not in res
+    assert history.day_results()[0][:3] == ("a", "hk4e", "claimed")
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import checkin_client
+from single_flight import SingleFlight
+
+
+def _concurrent(n, fn):
+    # Start n callers together so they overlap with the leader's execution.
+    start = threading.Barrier(n)
+
+    def call():
+        start.wait()
+        return fn()
+
+    with ThreadPoolExecutor(n) as ex:
+        return [f.result() for f in [ex.submit(call) for _ in range(n)]]
+
+
+def test_concurrent_calls_share_one_execution():
+    sf: SingleFlight[int] = SingleFlight()
+    runs = []
+
+    def fetch():
+        runs.append(1)
+        time.sleep(0.2)
+        return 42
+
+    out = _concurrent(8, lambda: sf.do("k", fetch))
+    assert len(runs) == 1
+    assert [r for r, _ in out] == [42] * 8
+    assert sorted(shared for _, shared in out) == [False] + [True] * 7
+
+
+def test_different_keys_run_separately():
+    sf: SingleFlight[str] = SingleFlight()
+    keys = iter(range(4))
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            k = next(keys)
+        return sf.do(k, lambda: f"v{k}")
+
+    out = _concurrent(4, call)
+    assert sorted(out) == [(f"v{k}", False) for k in range(4)]
+
+
+def test_results_are_kept_only_when_asked():
+    sf: SingleFlight[str] = SingleFlight()
+    assert sf.do("k", lambda: "first") == ("first", False)
+    # Not kept: the next call runs again.
+    assert sf.do("k", lambda: "second", keep=bool) == ("second", False)
+    assert sf.do("k", lambda: "third") == ("second", True)
+    sf.forget("k")
+    assert sf.do("k", lambda: "fourth") == ("fourth", False)
+
+
+def test_kept_results_expire_after_ttl():
+    sf: SingleFlight[str] = SingleFlight(ttl_s=0.05)
+    sf.do("k", lambda: "old", keep=bool)
+    assert sf.do("k", lambda: "new") == ("old", True)
+    time.sleep(0.1)
+    assert sf.do("k", lambda: "new") == ("new", False)
+
+
+def test_errors_reach_waiters_but_are_not_remembered():
+    sf: SingleFlight[str] = SingleFlight()
+    runs = []
+
+    def fail():
+        runs.append(1)
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    def call():
+        try:
+            return sf.do("k", fail, keep=lambda r: True)
+        except RuntimeError as e:
+            return str(e)
+
+    assert _concurrent(4, call) == ["upstream down"] * 4
+    assert len(runs) == 1
+    assert sf.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_duplicate_accounts_share_a_successful_sign(monkeypatch):
+    monkeypatch.setattr(checkin_client, "_sign_flights", SingleFlight(ttl_s=60))
+    calls = []
+
+    def sign():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"ok": True, "name": "main", "message": "OK"}
+
+    out = _concurrent(3, lambda: checkin_client._shared_sign(("ltuid:1", "gi"), "alt", sign))
+    assert len(calls) == 1
+    assert sum(1 for r in out if r.get("shared")) == 2
+    assert all(r["ok"] for r in out)
+    assert {r["name"] for r in out if r.get("shared")} == {"alt"}
+    # A later duplicate on the same day still gets the result without signing.
+    assert checkin_client._shared_sign(("ltuid:1", "gi"), "late", sign)["shared"]
+    assert len(calls) == 1
+
+
+def test_failed_signs_are_retried(monkeypatch):
+    monkeypatch.setattr(checkin_client, "_sign_flights", SingleFlight(ttl_s=60))
+    results = iter([{"ok": False, "message": "503"}, {"ok": True, "message": "OK"}])
+    first = checkin_client._shared_sign(("ltuid:2", "hsr"), "main", lambda: next(results))
+    second = checkin_client._shared_sign(("ltuid:2", "hsr"), "main", lambda: next(results))
+    assert not first["ok"] and second["ok"]
+    assert "shared" not in second
+
+
+@pytest.mark.parametrize("n", [2, 16])
+def test_leader_result_is_not_mutated_by_callers(monkeypatch, n):
+    monkeypatch.setattr(checkin_client, "_sign_flights", SingleFlight(ttl_s=60))
+    out = _concurrent(n, lambda: checkin_client._shared_sign(("cred:x", "role"), "a", lambda: {"ok": True, "name": "a"}))
+    for r in out:
+        r["name"] = "changed"
+    assert checkin_client._shared_sign(("cred:x", "role"), "b", lambda: {"ok": True})["name"] == "b"
+
+
+def _fake_endfield(monkeypatch, ttl_s=None):
+    # Tokens come out as tok1, tok2, ...; the server accepts only the newest one.
+    monkeypatch.setattr(checkin_client, "_sign_flights", SingleFlight(ttl_s=60))
+    monkeypatch.setattr(checkin_client, "_tokens", checkin_client._TokenCache(ttl_s=ttl_s))
+    issued = []
+
+    def refresh(cred, platform, vname, deadline=None):
+        issued.append(f"tok{len(issued) + 1}")
+        return issued[-1]
+
+    def claim(*, name, token, **_kw):
+        if token != issued[-1]:
+            return {"name": name, "ok": False, "http": 200, "code": 10002, "error": "token expired"}
+        return {"name": name, "ok": True, "http": 200, "code": 0, "status": "claimed", "awards": []}
+
+    monkeypatch.setattr(checkin_client, "refresh_token", refresh)
+    monkeypatch.setattr(checkin_client, "claim_once", claim)
+    return issued
+
+
+def test_endfield_token_expires_after_ttl(monkeypatch):
+    issued = _fake_endfield(monkeypatch, ttl_s=0.05)
+    client = checkin_client.EndfieldClient(checkin_client.EndfieldCredentials("CRED", roles=("3_1_1",)))
+    assert client.token() == client.token() == "tok1"
+    time.sleep(0.1)
+    assert client.token() == "tok2"
+    assert issued == ["tok1", "tok2"]
+
+
+def test_rejected_sign_refreshes_the_token_once(monkeypatch):
+    # A resident client holds a token the server has since expired (tok2 was issued elsewhere).
+    issued = _fake_endfield(monkeypatch, ttl_s=3600)
+    client = checkin_client.EndfieldClient(checkin_client.EndfieldCredentials("CRED", roles=("3_1_1",)))
+    assert client.token() == "tok1"
+    issued.append("tok2")
+    res = client.sign("3_1_1")
+    assert res["ok"] and res["status"] == "claimed"
+    assert issued == ["tok1", "tok2", "tok3"]
+    assert client.token() == "tok3"
+
+
+def test_rejected_sign_is_not_retried_forever(monkeypatch):
+    _fake_endfield(monkeypatch)
+    monkeypatch.setattr(checkin_client, "claim_once", lambda *, name, **_kw: {"name": name, "ok": False, "code": 10003, "error": "banned"})
+    calls = []
+    monkeypatch.setattr(checkin_client, "refresh_token", lambda *a, **k: calls.append(1) or "tok")
+    res = checkin_client.EndfieldClient(checkin_client.EndfieldCredentials("CRED", roles=("3_1_1",))).sign("3_1_1")
+    assert not res["ok"] and res["code"] == 10003
+    assert len(calls) == 2